@@ -0,0 +1,54 @@
+"""
+Agent hot path: FileDatasource.read and the marshmallow serialization done by
+publish() for every sample, without the MQTT client.
+Run from the repository root:
+
+    python benchmarks/agent_publish.py
+"""
+import os
+import sys
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lab1", "lab1")
+sys.path.insert(0, AGENT_DIR)
+
+from src.file_datasource import FileDatasource
+from src.schema.aggregated_data_schema import AggregatedDataSchema
+from timing import best_of, report
+
+SAMPLES = 10_000
+
+
+def run(samples: int = SAMPLES) -> dict:
+    datasource = FileDatasource(
+        os.path.join(AGENT_DIR, "src", "data", "accelerometer.csv"),
+        os.path.join(AGENT_DIR, "src", "data", "gps.csv"),
+        user_id=1,
+    )
+    datasource.startReading()
+    data = [datasource.read() for _ in range(samples)]
+    schema = AggregatedDataSchema()
+
+    def read():
+        for _ in range(samples):
+            datasource.read()
+
+    def dumps_new_schema():
+        # What publish() does: a new schema for every sample
+        for item in data:
+            AggregatedDataSchema().dumps(item)
+
+    def dumps_shared_schema():
+        for item in data:
+            schema.dumps(item)
+
+    return {
+        f"samples_{samples}": {
+            "read_s": best_of(read),
+            "dumps_new_schema_s": best_of(dumps_new_schema),
+            "dumps_shared_schema_s": best_of(dumps_shared_schema),
+        }
+    }
+
+
+if __name__ == "__main__":
+    report(run())
@@ -0,0 +1,74 @@
+"""
+Edge hot path: AgentData validation of the MQTT payload and
+process_agent_data, without the MQTT clients.
+Run from the repository root:
+
+    python benchmarks/edge_processing.py
+"""
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lab4", "lab4"))
+
+from app.entities.agent_data import AgentData
+from app.usecases.data_processing import process_agent_data
+from timing import best_of, report
+
+SAMPLES = 100_000
+
+
+def create_payloads(samples: int) -> list:
+    """Agent messages as lab1 publishes them"""
+    start = datetime(2024, 5, 4, 10, 0, 0)
+    return [
+        json.dumps(
+            {
+                "accelerometer": {
+                    "x": random.randint(-500, 500),
+                    "y": random.randint(-500, 500),
+                    "z": random.randint(12000, 20000),
+                },
+                "gps": {
+                    "longitude": 50.45 + random.uniform(-0.01, 0.01),
+                    "latitude": 30.52 + random.uniform(-0.01, 0.01),
+                },
+                "timestamp": (start + timedelta(milliseconds=100 * i)).isoformat(),
+                "user_id": 1,
+            }
+        )
+        for i in range(samples)
+    ]
+
+
+def run(samples: int = SAMPLES) -> dict:
+    random.seed(0)
+    payloads = create_payloads(samples)
+    agent_data = [AgentData.model_validate_json(payload, strict=True) for payload in payloads]
+
+    def validate():
+        for payload in payloads:
+            AgentData.model_validate_json(payload, strict=True)
+
+    def process():
+        for item in agent_data:
+            process_agent_data(item)
+
+    def dump():
+        # What HubMqttAdapter sends for every sample
+        for item in agent_data:
+            process_agent_data(item).model_dump_json()
+
+    return {
+        f"samples_{samples}": {
+            "validate_s": best_of(validate),
+            "process_s": best_of(process),
+            "process_dump_s": best_of(dump),
+        }
+    }
+
+
+if __name__ == "__main__":
+    report(run())
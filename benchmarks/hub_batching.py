@@ -0,0 +1,113 @@
+"""
+Hub hot path: enqueueing processed agent data in Redis and draining it in
+batches of BATCH_SIZE, as the MQTT and HTTP handlers of lab3 do.
+Uses the Redis at REDIS_HOST:REDIS_PORT if it answers, fakeredis otherwise,
+so the numbers without a server cover serialization and the client only.
+Run from the repository root:
+
+    python benchmarks/hub_batching.py
+"""
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lab3", "lab3"))
+
+from redis import Redis, RedisError
+from app.adapters.redis_queue_adapter import RedisQueueAdapter
+from app.adapters.store_memory_adapter import StoreMemoryAdapter
+from app.entities.processed_agent_data import ProcessedAgentData
+from app.usecases.batching import queue_processed_agent_data
+from config import REDIS_HOST, REDIS_PORT, BATCH_SIZE
+from timing import best_of, report
+
+SAMPLES = 5_000
+# Own key, so a real hub's queue is not touched
+QUEUE_KEY = "benchmark_processed_agent_data"
+
+
+def connect():
+    """Redis client and its name, or (None, reason) if there is none"""
+    client = Redis(host=REDIS_HOST, port=REDIS_PORT, socket_connect_timeout=1)
+    try:
+        client.ping()
+        return client, "redis"
+    except RedisError:
+        pass
+    try:
+        import fakeredis
+    except ImportError:
+        return None, f"no Redis at {REDIS_HOST}:{REDIS_PORT} and fakeredis is not installed"
+    return fakeredis.FakeRedis(), "fakeredis"
+
+
+def create_data(samples: int) -> list:
+    start = datetime(2024, 5, 4, 10, 0, 0)
+    return [
+        ProcessedAgentData.model_validate(
+            {
+                "road_state": random.choice(["normal", "small pits", "large pits"]),
+                "agent_data": {
+                    "user_id": 1,
+                    "accelerometer": {
+                        "x": random.uniform(-500, 500),
+                        "y": random.uniform(-500, 500),
+                        "z": random.uniform(12000, 20000),
+                    },
+                    "gps": {
+                        "latitude": 50.45 + random.uniform(-0.01, 0.01),
+                        "longitude": 30.52 + random.uniform(-0.01, 0.01),
+                    },
+                    "timestamp": start + timedelta(milliseconds=100 * i),
+                },
+            }
+        )
+        for i in range(samples)
+    ]
+
+
+def run(samples: int = SAMPLES) -> dict:
+    client, backend = connect()
+    if client is None:
+        return {"skipped": backend}
+    random.seed(0)
+    data = create_data(samples)
+    queue = RedisQueueAdapter(client, QUEUE_KEY)
+    # Batches are kept in memory, the Store API is not part of the numbers
+    store = StoreMemoryAdapter()
+
+    def enqueue():
+        client.delete(QUEUE_KEY)
+        for item in data:
+            queue.push(item)
+
+    def enqueue_and_drain():
+        # What the hub does per message
+        store.batches.clear()
+        for item in data:
+            queue_processed_agent_data(item, queue, store, BATCH_SIZE)
+
+    def drain_all():
+        enqueue()
+        while queue.pop(BATCH_SIZE):
+            pass
+
+    try:
+        enqueue_s = best_of(enqueue)
+        client.delete(QUEUE_KEY)
+        # Numbers of a real server and of fakeredis are not comparable
+        return {
+            f"{backend}_samples_{samples}_batch_{BATCH_SIZE}": {
+                "enqueue_s": enqueue_s,
+                "enqueue_drain_s": best_of(enqueue_and_drain),
+                # Includes filling the queue again
+                "enqueue_then_drain_all_s": best_of(drain_all),
+            }
+        }
+    finally:
+        client.delete(QUEUE_KEY)
+
+
+if __name__ == "__main__":
+    report(run())
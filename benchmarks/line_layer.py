@@ -0,0 +1,79 @@
+"""
+Dashboard track drawing: LineMapLayer projecting, chunking, simplifying and
+drawing tracks of 1k, 10k and 100k points. Runs with Kivy's mock GL backend,
+so the numbers cover the Python side of drawing, not the GPU.
+Run from the repository root:
+
+    python benchmarks/line_layer.py
+"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lab5", "lab5"))
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+os.environ.setdefault("KIVY_NO_CONSOLELOG", "1")
+os.environ.setdefault("KIVY_GL_BACKEND", "mock")
+
+from timing import best_of, report
+
+SIZES = (1_000, 10_000, 100_000)
+# Points per add_points call on the live path
+FRAME_POINTS = 100
+
+
+def create_points(size: int) -> list:
+    """Random drive around Kyiv, (lat, lon, road_state) like the datasource"""
+    lat, lon = 50.45, 30.52
+    points = []
+    for _ in range(size):
+        lat += random.uniform(-1e-5, 1e-5)
+        lon += random.uniform(-1e-5, 1e-5)
+        points.append((lat, lon, random.choice(("normal",) * 18 + ("small pits", "large pits"))))
+    return points
+
+
+def run(sizes=SIZES) -> dict:
+    try:
+        from kivy_garden.mapview import MapView
+        from lineMapLayer import LineMapLayer
+    except Exception as e:
+        return {"skipped": f"Kivy is not available: {e}"}
+
+    random.seed(0)
+    results = {}
+    for size in sizes:
+        points = create_points(size)
+        map_view = MapView(zoom=15, lat=50.45, lon=30.52, size=(800, 600))
+
+        def new_layer():
+            layer = LineMapLayer()
+            map_view.add_layer(layer, mode="scatter")
+            layer.reposition()
+            return layer
+
+        def add_live():
+            layer = new_layer()
+            for i in range(0, size, FRAME_POINTS):
+                layer.add_points(points[i : i + FRAME_POINTS])
+            map_view.remove_layer(layer)
+
+        def add_at_once():
+            layer = new_layer()
+            layer.add_points(points)
+            map_view.remove_layer(layer)
+
+        layer = new_layer()
+        layer.add_points(points)
+        results[f"points_{size}"] = {
+            f"add_by_{FRAME_POINTS}_s": best_of(add_live),
+            "add_at_once_s": best_of(add_at_once),
+            # Zoom change: every chunk simplified and drawn again
+            "redraw_s": best_of(layer.clear_and_redraw),
+        }
+        map_view.remove_layer(layer)
+    return results
+
+
+if __name__ == "__main__":
+    report(run())
@@ -0,0 +1,234 @@
+"""
+Whole agent -> edge -> hub -> store pipeline in one process, with in-memory
+transports instead of MQTT, Redis and the Store API:
+
+    lab1 publish_sample -> lab4 AgentMemoryAdapter -> HubMemoryAdapter
+    -> lab3 MemoryQueueAdapter batching -> StoreMemoryAdapter
+    -> lab2 request validation (no database)
+
+--reduction and --delta-encoding turn on the edge's EdgeReducer and
+DeltaEncoder, the hub decodes with its DeltaDecoder either way.
+The agent reads its CSV files as fast as it can. Samples move through the
+stages in rounds of ROUND_SIZE, so the CPU time of every stage is measured
+on its own. Reports sustained samples per second and CPU per stage.
+Run from the repository root:
+
+    python benchmarks/pipeline.py --samples 100000
+"""
+import argparse
+import importlib
+import os
+import sys
+import time
+from typing import List
+from pydantic import TypeAdapter
+from timing import report
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+SAMPLES = 20_000
+ROUND_SIZE = 1_000
+STAGES = ("agent", "edge", "hub", "store")
+
+
+def load(lab_dir: str, *names: str) -> list:
+    """
+    Import modules of a lab. The labs use the same top level names
+    (app, config, tracing), so the lab's modules are removed from
+    sys.modules again and only the returned module objects keep them.
+    """
+    lab_dir = os.path.abspath(os.path.join(ROOT, lab_dir))
+    before = set(sys.modules)
+    sys.path.insert(0, lab_dir)
+    try:
+        return [importlib.import_module(name) for name in names]
+    finally:
+        sys.path.remove(lab_dir)
+        for name in set(sys.modules) - before:
+            path = getattr(sys.modules[name], "__file__", None) or ""
+            if os.path.abspath(path).startswith(lab_dir + os.sep):
+                del sys.modules[name]
+
+
+class Pipeline:
+    def __init__(self, batch_size: int = None, reduction: bool = False, delta_encoding: bool = False):
+        agent_main, agent_datasource = load("lab1/lab1", "src.main", "src.file_datasource")
+        edge_config, edge_agent, edge_hub, edge_reduction, edge_encoding = load(
+            "lab4/lab4",
+            "config",
+            "app.adapters.agent_memory_adapter",
+            "app.adapters.hub_memory_adapter",
+            "app.usecases.reduction",
+            "app.usecases.delta_encoding",
+        )
+        hub_config, hub_decoding, hub_queue, hub_store, hub_batching, hub_tracing = load(
+            "lab3/lab3",
+            "config",
+            "app.usecases.delta_decoding",
+            "app.adapters.memory_queue_adapter",
+            "app.adapters.store_memory_adapter",
+            "app.usecases.batching",
+            "tracing",
+        )
+        store_schemas, store_tracing = load("lab2/lab2", "schemas", "tracing")
+
+        self.publish_sample = agent_main.publish_sample
+        self.datasource = agent_datasource.FileDatasource(
+            os.path.join(ROOT, "lab1", "lab1", "src", "data", "accelerometer.csv"),
+            os.path.join(ROOT, "lab1", "lab1", "src", "data", "gps.csv"),
+            user_id=1,
+        )
+        self.datasource.startReading()
+        reducer = None
+        if reduction:
+            reducer = edge_reduction.EdgeReducer(
+                edge_config.REDUCTION_NORMAL_EVERY, edge_config.REDUCTION_DISTANCE_M
+            )
+        encoder = edge_encoding.DeltaEncoder(edge_config.DELTA_KEYFRAME_EVERY) if delta_encoding else None
+        self.hub_gateway = edge_hub.HubMemoryAdapter(encoder)
+        self.edge = edge_agent.AgentMemoryAdapter(self.hub_gateway, reducer=reducer)
+        self.edge.connect()
+        self.edge.start()
+        self.hub_decoder = hub_decoding.DeltaDecoder()
+        self.hub_queue = hub_queue.MemoryQueueAdapter()
+        self.store_gateway = hub_store.StoreMemoryAdapter()
+        self.queue_processed_agent_data = hub_batching.queue_processed_agent_data
+        self.hub_record = hub_tracing.record
+        self.batch_size = batch_size or hub_config.BATCH_SIZE
+        self.store_data = TypeAdapter(List[store_schemas.ProcessedAgentData])
+        self.store_record = store_tracing.record
+        # Bytes of the messages from the edge to the hub
+        self.hub_bytes = 0
+        # Samples validated by the store
+        self.stored = 0
+
+    def agent(self, count: int):
+        for _ in range(count):
+            self.publish_sample(self.edge, self.edge.topic, self.datasource)
+
+    def edge_stage(self):
+        self.edge.drain()
+
+    def hub(self):
+        # What the hub's on_message does with every MQTT message
+        messages = self.hub_gateway.messages
+        while messages:
+            received = time.monotonic_ns()
+            payload = messages.popleft()
+            self.hub_bytes += len(payload)
+            processed_agent_data = self.hub_decoder.decode(payload)
+            if processed_agent_data is None:
+                continue
+            self.hub_record(processed_agent_data.agent_data.trace, "hub.receive", received)
+            self.queue_processed_agent_data(
+                processed_agent_data, self.hub_queue, self.store_gateway, self.batch_size
+            )
+
+    def store(self):
+        # Request validation and row values of create_processed_agent_data
+        batches = self.store_gateway.batches
+        while batches:
+            received = time.monotonic_ns()
+            data = self.store_data.validate_python(batches.popleft())
+            rows = [
+                dict(
+                    road_state=item.road_state,
+                    user_id=item.agent_data.user_id,
+                    x=item.agent_data.accelerometer.x,
+                    y=item.agent_data.accelerometer.y,
+                    z=item.agent_data.accelerometer.z,
+                    latitude=item.agent_data.gps.latitude,
+                    longitude=item.agent_data.gps.longitude,
+                    timestamp=item.agent_data.timestamp,
+                )
+                for item in data
+            ]
+            for item in data:
+                self.store_record(item.agent_data.trace, "store.receive", received)
+            self.stored += len(rows)
+
+    def run(self, samples: int, round_size: int = ROUND_SIZE) -> dict:
+        """CPU seconds per stage and wall seconds of the whole run"""
+        cpu = dict.fromkeys(STAGES, 0)
+        stages = (
+            ("edge", self.edge_stage),
+            ("hub", self.hub),
+            ("store", self.store),
+        )
+        started = time.perf_counter()
+        sent = 0
+        while sent < samples:
+            count = min(round_size, samples - sent)
+            stage_started = time.process_time_ns()
+            self.agent(count)
+            cpu["agent"] += time.process_time_ns() - stage_started
+            for name, stage in stages:
+                stage_started = time.process_time_ns()
+                stage()
+                cpu[name] += time.process_time_ns() - stage_started
+            sent += count
+        wall = time.perf_counter() - started
+        return {
+            **{f"{name}_cpu_s": nanoseconds / 1e9 for name, nanoseconds in cpu.items()},
+            "wall_s": wall,
+        }
+
+
+def run(
+    samples: int = SAMPLES,
+    round_size: int = ROUND_SIZE,
+    batch_size: int = None,
+    reduction: bool = False,
+    delta_encoding: bool = False,
+) -> dict:
+    pipeline = Pipeline(batch_size, reduction, delta_encoding)
+    results = pipeline.run(samples, round_size)
+    name = f"samples_{samples}_batch_{pipeline.batch_size}"
+    if reduction:
+        name += "_reduction"
+    if delta_encoding:
+        name += "_delta"
+    if reduction or delta_encoding:
+        # Not seconds, so not part of the results
+        print(
+            f"{pipeline.stored} of {samples} samples stored, "
+            f"{pipeline.hub_bytes / samples:.0f} bytes per sample from edge to hub",
+            file=sys.stderr,
+        )
+    return {name: results}
+
+
+def print_capacity(results: dict):
+    for name, metrics in results.items():
+        samples = int(name.split("_")[1])
+        wall = metrics["wall_s"]
+        cpu_total = sum(metrics[f"{stage}_cpu_s"] for stage in STAGES)
+        print(name)
+        print(f"  {samples} samples in {wall:.2f} s, {samples / wall:,.0f} samples/s sustained\n")
+        print(f"  {'stage':<8} {'cpu s':>9} {'us/sample':>10} {'share':>7} {'max samples/s':>14}")
+        for stage in STAGES:
+            cpu = metrics[f"{stage}_cpu_s"]
+            print(
+                f"  {stage:<8} {cpu:9.2f} {cpu / samples * 1e6:10.1f} {cpu / cpu_total:7.1%}"
+                f" {samples / cpu if cpu else float('inf'):14,.0f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=SAMPLES)
+    parser.add_argument("--round-size", type=int, default=ROUND_SIZE, help="samples moved through the stages at once")
+    parser.add_argument("--batch-size", type=int, help="hub batch size, BATCH_SIZE of lab3 by default")
+    parser.add_argument("--reduction", action="store_true", help="drop normal samples at the edge")
+    parser.add_argument("--delta-encoding", action="store_true", help="send deltas to keyframes to the hub")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+    results = run(args.samples, args.round_size, args.batch_size, args.reduction, args.delta_encoding)
+    if args.json:
+        report(results)
+    else:
+        print_capacity(results)
+
+
+if __name__ == "__main__":
+    main()
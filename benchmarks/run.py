@@ -0,0 +1,132 @@
+"""
+Runs the benchmark suite, saves the results as a baseline or compares them
+with one. Every benchmark runs in its own Python process, the labs have
+modules with the same names (config, main, ...) and must not share sys.path.
+Run from the repository root:
+
+    python benchmarks/run.py --save benchmarks/baseline.json
+    python benchmarks/run.py --compare benchmarks/baseline.json --threshold 0.1
+    python benchmarks/run.py line_layer hub_batching
+
+Compare mode exits with 1 if a metric got slower than the baseline by more
+than the threshold (0.1 = 10 %).
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+# In the order the samples pass the services
+BENCHMARKS = (
+    "agent_publish",
+    "edge_processing",
+    "hub_batching",
+    "store_ingest",
+    "store_serialization",
+    "line_layer",
+    "pipeline",
+)
+# Seconds a single benchmark may take
+TIMEOUT = 1800
+
+
+def run_benchmark(name: str) -> dict:
+    """Results of one benchmark, {"skipped": reason} if it could not run"""
+    try:
+        process = subprocess.run(
+            [sys.executable, os.path.join(BENCHMARKS_DIR, f"{name}.py"), "--json"],
+            capture_output=True,
+            text=True,
+            timeout=TIMEOUT,
+        )
+    except subprocess.TimeoutExpired:
+        return {"skipped": f"timed out after {TIMEOUT} s"}
+    if process.returncode != 0:
+        error = process.stderr.strip().splitlines()
+        return {"skipped": f"failed: {error[-1] if error else process.returncode}"}
+    # Libraries may print to stdout, the results are the last line
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def flatten(results: dict) -> dict:
+    """{"benchmark/case/metric": seconds} of the benchmarks that ran"""
+    return {
+        f"{name}/{case}/{metric}": seconds
+        for name, cases in results.items()
+        if "skipped" not in cases
+        for case, metrics in cases.items()
+        for metric, seconds in metrics.items()
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Print the metrics of both runs, return the regressed ones"""
+    regressions = []
+    print(f"{'metric':<72} {'baseline ms':>12} {'current ms':>12} {'change':>8}")
+    for key in sorted(current.keys() | baseline.keys()):
+        if key not in current or key not in baseline:
+            value = current.get(key, baseline.get(key))
+            print(f"{key:<72} {'only in ' + ('current' if key in current else 'baseline'):>25} {value * 1000:8.1f}")
+            continue
+        change = current[key] / baseline[key] - 1 if baseline[key] else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print(f"{key:<72} {baseline[key] * 1000:12.1f} {current[key] * 1000:12.1f} {change:+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("benchmarks", nargs="*", help=f"benchmarks to run, all by default: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--save", metavar="FILE", help="write the results as a baseline")
+    parser.add_argument("--compare", metavar="FILE", help="compare the results with a baseline")
+    parser.add_argument("--threshold", type=float, default=0.1, help="slowdown flagged as a regression")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    results = {}
+    for name in args.benchmarks or BENCHMARKS:
+        print(f"running {name}...", file=sys.stderr)
+        results[name] = run_benchmark(name)
+        if "skipped" in results[name]:
+            print(f"  skipped: {results[name]['skipped']}", file=sys.stderr)
+    current = flatten(results)
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(
+                {
+                    "created": datetime.now().isoformat(timespec="seconds"),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "results": current,
+                },
+                file,
+                indent=2,
+                sort_keys=True,
+            )
+            file.write("\n")
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["results"]
+        if args.benchmarks:
+            baseline = {key: value for key, value in baseline.items() if key.split("/")[0] in args.benchmarks}
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metrics slower than the baseline by more than {args.threshold:.0%}")
+            sys.exit(1)
+    elif not args.save:
+        for key, seconds in sorted(current.items()):
+            print(f"{key:<72} {seconds * 1000:10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
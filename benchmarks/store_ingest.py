@@ -0,0 +1,104 @@
+"""
+Store write and read path against a local PostgreSQL: create_processed_agent_data
+with batches as the hub posts them, and the list endpoint, through the FastAPI app.
+Uses the database of lab2's POSTGRES_* settings, rows are written under
+USER_ID and deleted afterwards. Skipped when the database is not reachable.
+Run from the repository root:
+
+    python benchmarks/store_ingest.py
+"""
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lab2", "lab2"))
+# Repeated reads would be served by the read-through cache
+os.environ.setdefault("CACHE_BACKEND", "none")
+
+from sqlalchemy.exc import OperationalError
+from database import engine
+from timing import best_of, report
+
+SAMPLES = 2_000
+# Samples per POST, BATCH_SIZE of the hub
+BATCH_SIZE = 20
+# Owner of the benchmark rows, not used by real agents
+USER_ID = 999_999
+
+
+def create_batches(samples: int, batch_size: int) -> list:
+    start = datetime.now()
+    items = [
+        {
+            "road_state": random.choice(["normal", "small pits", "large pits"]),
+            "agent_data": {
+                "user_id": USER_ID,
+                "accelerometer": {
+                    "x": random.uniform(-500, 500),
+                    "y": random.uniform(-500, 500),
+                    "z": random.uniform(12000, 20000),
+                },
+                "gps": {
+                    "latitude": 50.45 + random.uniform(-0.01, 0.01),
+                    "longitude": 30.52 + random.uniform(-0.01, 0.01),
+                },
+                "timestamp": (start + timedelta(milliseconds=i)).isoformat(),
+            },
+        }
+        for i in range(samples)
+    ]
+    return [items[i : i + batch_size] for i in range(0, samples, batch_size)]
+
+
+def run(samples: int = SAMPLES) -> dict:
+    try:
+        with engine.connect():
+            pass
+    except OperationalError:
+        return {"skipped": f"PostgreSQL at {engine.url.host}:{engine.url.port} is not reachable"}
+    # Importing the app creates the tables
+    from fastapi.testclient import TestClient
+    from main import app
+
+    random.seed(0)
+    batches = create_batches(samples, BATCH_SIZE)
+    with TestClient(app) as client:
+
+        def delete_rows():
+            client.request("DELETE", "/processed_agent_data/", json={"user_id": USER_ID}).raise_for_status()
+
+        def insert():
+            delete_rows()
+            for batch in batches:
+                client.post("/processed_agent_data/", json=batch).raise_for_status()
+
+        def list_all():
+            client.get("/processed_agent_data/", params={"user_id": USER_ID}).raise_for_status()
+
+        def list_pages():
+            # Keyset pages like the dashboard history loader
+            after_id = 0
+            while True:
+                rows = client.get(
+                    "/processed_agent_data/",
+                    params={"user_id": USER_ID, "after_id": after_id, "limit": 500},
+                ).json()
+                if not rows:
+                    break
+                after_id = rows[-1]["id"]
+
+        try:
+            return {
+                f"samples_{samples}_batch_{BATCH_SIZE}": {
+                    "insert_s": best_of(insert),
+                    "list_all_s": best_of(list_all),
+                    "list_pages_500_s": best_of(list_pages),
+                }
+            }
+        finally:
+            delete_rows()
+
+
+if __name__ == "__main__":
+    report(run())
@@ -0,0 +1,112 @@
+"""
+Store read endpoints: pydantic response_model path vs orjson fast path.
+
+Rows live in an in-memory SQLite copy of the processed_agent_data table, so
+the numbers cover row fetching and response encoding without PostgreSQL.
+Run from the repository root:
+
+    python benchmarks/store_serialization.py
+"""
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lab2", "lab2"))
+
+from pydantic import TypeAdapter
+from sqlalchemy import MetaData, create_engine
+from sqlalchemy.sql import select
+import orjson
+
+from database import processed_agent_data
+from schemas import ProcessedAgentDataInDB
+from serialization import rows_to_dicts
+from timing import best_of, report
+
+SIZES = (10_000, 100_000)
+GET_REQUESTS = 1_000
+
+
+def create_table(size: int):
+    engine = create_engine("sqlite://")
+    table = processed_agent_data.to_metadata(MetaData())
+    # SQLite can't autoincrement the (id, timestamp) key, ids are set below
+    table.c.id.autoincrement = False
+    table.metadata.create_all(engine)
+    start = datetime(2024, 5, 4, 10, 0, 0)
+    with engine.begin() as connection:
+        connection.execute(
+            table.insert(),
+            [
+                dict(
+                    id=i,
+                    road_state=random.choice(["normal", "small pits", "large pits"]),
+                    user_id=1 + i % 10,
+                    x=random.uniform(-500, 500),
+                    y=random.uniform(-500, 500),
+                    z=random.uniform(12000, 20000),
+                    latitude=30.52 + random.uniform(-0.01, 0.01),
+                    longitude=50.45 + random.uniform(-0.01, 0.01),
+                    timestamp=start + timedelta(milliseconds=100 * i),
+                )
+                for i in range(1, size + 1)
+            ],
+        )
+    return engine, table
+
+
+def encode_pydantic(adapter: TypeAdapter, content) -> bytes:
+    # What FastAPI does for response_model: validate, dump, JSONResponse.render
+    validated = adapter.validate_python(content, from_attributes=True)
+    dumped = adapter.dump_python(validated, mode="json")
+    return json.dumps(dumped, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def encode_orjson(content) -> bytes:
+    return orjson.dumps(content)
+
+
+def bench_size(size: int) -> dict:
+    engine, table = create_table(size)
+    list_adapter = TypeAdapter(list[ProcessedAgentDataInDB])
+    item_adapter = TypeAdapter(ProcessedAgentDataInDB)
+    ids = [random.randint(1, size) for _ in range(GET_REQUESTS)]
+
+    with engine.connect() as connection:
+        list_query = select(table)
+
+        def list_pydantic():
+            return encode_pydantic(list_adapter, connection.execute(list_query).fetchall())
+
+        def list_orjson():
+            return encode_orjson(rows_to_dicts(connection.execute(list_query).fetchall()))
+
+        def get_pydantic():
+            for row_id in ids:
+                row = connection.execute(select(table).where(table.c.id == row_id)).first()
+                encode_pydantic(item_adapter, row)
+
+        def get_orjson():
+            for row_id in ids:
+                row = connection.execute(select(table).where(table.c.id == row_id)).first()
+                encode_orjson(rows_to_dicts([row])[0])
+
+        assert json.loads(list_pydantic()) == json.loads(list_orjson())
+        return {
+            "list_pydantic_s": best_of(list_pydantic),
+            "list_orjson_s": best_of(list_orjson),
+            f"get_x{GET_REQUESTS}_pydantic_s": best_of(get_pydantic),
+            f"get_x{GET_REQUESTS}_orjson_s": best_of(get_orjson),
+        }
+
+
+def run(sizes=SIZES) -> dict:
+    random.seed(0)
+    return {f"rows_{size}": bench_size(size) for size in sizes}
+
+
+if __name__ == "__main__":
+    report(run())
+
@@ -0,0 +1,39 @@
+"""
+Helpers shared by the benchmarks.
+
+A benchmark module has a run() returning {case: {metric: seconds}} and ends with
+
+    if __name__ == "__main__":
+        report(run())
+
+`--json` prints the results as one JSON line for benchmarks/run.py.
+A benchmark that can't run here (no database, no GUI libraries) returns
+{"skipped": "<reason>"} instead.
+"""
+import json
+import sys
+import time
+
+REPEAT = 3
+
+
+def best_of(function, repeat: int = REPEAT) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def report(results: dict):
+    if "--json" in sys.argv[1:]:
+        print(json.dumps(results))
+        return
+    if "skipped" in results:
+        print(f"skipped: {results['skipped']}")
+        return
+    for name, metrics in results.items():
+        print(name)
+        for metric, seconds in metrics.items():
+            print(f"  {metric:<28} {seconds * 1000:10.1f} ms")
@@ -0,0 +1,122 @@
+"""
+Per-stage latency of traced samples, from the trace files of one run.
+
+Every service appends the stages a traced sample has passed so far to its
+TRACE_FILE (enable with TRACE_ENABLED=true, the agent picks every
+TRACE_SAMPLE_EVERY-th sample). Stages of a sample are merged over all files,
+each stage is reported as the time since the previous stage the sample passed.
+Run from the repository root:
+
+    python benchmarks/trace_report.py lab1/lab1/trace.jsonl lab4/lab4/trace.jsonl ...
+"""
+import argparse
+import json
+import math
+from typing import Dict, List
+
+# Stages in the order samples pass them
+STAGES = (
+    "agent.publish",
+    "edge.receive",
+    "edge.send",
+    "hub.receive",
+    "hub.flush",
+    "store.receive",
+    "store.insert",
+    "dashboard.receive",
+    "dashboard.render",
+)
+PERCENTILES = (50, 95, 99)
+# Upper bounds of the histogram buckets in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+def load_samples(paths: List[str]) -> Dict[str, Dict[str, int]]:
+    """Stages of every sample id, merged over all trace files"""
+    samples: Dict[str, Dict[str, int]] = {}
+    for path in paths:
+        with open(path) as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # The last line may be cut if a service was killed
+                    continue
+                samples.setdefault(entry["sample_id"], {}).update(entry["stages"])
+    return samples
+
+
+def stage_latencies(samples: Dict[str, Dict[str, int]]) -> Dict[str, List[float]]:
+    """Milliseconds from the previous stage, per stage, plus the whole path as "total" """
+    latencies: Dict[str, List[float]] = {stage: [] for stage in STAGES + ("total",)}
+    for stages in samples.values():
+        passed = [stage for stage in STAGES if stage in stages]
+        for previous, stage in zip(passed, passed[1:]):
+            latencies[stage].append((stages[stage] - stages[previous]) / 1e6)
+        if len(passed) > 1:
+            latencies["total"].append((stages[passed[-1]] - stages[passed[0]]) / 1e6)
+    return {stage: values for stage, values in latencies.items() if values}
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    rank = max(0, math.ceil(p / 100 * len(values)) - 1)
+    return values[rank]
+
+
+def histogram(values: List[float]) -> List[int]:
+    counts = [0] * (len(BUCKETS_MS) + 1)
+    for value in values:
+        for i, bound in enumerate(BUCKETS_MS):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+    return counts
+
+
+def summarize(latencies: Dict[str, List[float]]) -> dict:
+    summary = {}
+    for stage, values in latencies.items():
+        values = sorted(values)
+        summary[stage] = {
+            "count": len(values),
+            **{f"p{p}": round(percentile(values, p), 3) for p in PERCENTILES},
+            "max": round(values[-1], 3),
+            "histogram": dict(zip([f"<={bound}ms" for bound in BUCKETS_MS] + ["inf"], histogram(values))),
+        }
+    return summary
+
+
+def print_summary(summary: dict):
+    header = f"{'stage':<18} {'count':>7}" + "".join(f" {f'p{p} ms':>10}" for p in PERCENTILES) + f" {'max ms':>10}"
+    print(header)
+    for stage, row in summary.items():
+        print(
+            f"{stage:<18} {row['count']:>7}"
+            + "".join(f" {row[f'p{p}']:>10.3f}" for p in PERCENTILES)
+            + f" {row['max']:>10.3f}"
+        )
+    print()
+    for stage, row in summary.items():
+        buckets = ", ".join(f"{bucket}: {count}" for bucket, count in row["histogram"].items() if count)
+        print(f"{stage:<18} {buckets}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+", help="trace files of the services")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+    samples = load_samples(args.files)
+    summary = summarize(stage_latencies(samples))
+    if args.json:
+        print(json.dumps({"samples": len(samples), "stages": summary}, indent=2))
+    else:
+        print(f"{len(samples)} traced samples\n")
+        print_summary(summary)
+
+
+if __name__ == "__main__":
+    main()
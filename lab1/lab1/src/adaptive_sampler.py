@@ -0,0 +1,94 @@
+import math
+from collections import deque
+from typing import List
+from src.domain.aggregated_data import AggregatedData
+
+
+class RollingVariance:
+    """Variance of the last `window` values, updated in O(1) per value"""
+
+    def __init__(self, window: int) -> None:
+        self.values = deque(maxlen=window)
+        # Values are summed relative to the first one, so the squares stay
+        # small and the variance does not lose precision to cancellation
+        self.shift = None
+        self.sum = 0.0
+        self.sum_squares = 0.0
+
+    def update(self, value: float) -> float:
+        if self.shift is None:
+            self.shift = value
+        value -= self.shift
+        if len(self.values) == self.values.maxlen:
+            oldest = self.values[0]
+            self.sum -= oldest
+            self.sum_squares -= oldest * oldest
+        self.values.append(value)
+        self.sum += value
+        self.sum_squares += value * value
+        mean = self.sum / len(self.values)
+        return max(0.0, self.sum_squares / len(self.values) - mean * mean)
+
+
+class AdaptiveSampler:
+    """
+    Decides which sensor samples the agent publishes. A sample is anomalous
+    while the standard deviation of z over the last `window` samples exceeds
+    `threshold`, or if z moved more than `threshold` from the last published
+    sample (e.g. the device was turned over). Around anomalies every sample
+    is published, including the `context` samples before and after. On
+    steady road the interval between published samples doubles up to
+    `max_interval` samples (the heartbeat).
+    """
+
+    def __init__(self, window: int, threshold: float, context: int, max_interval: int) -> None:
+        self.variance = RollingVariance(window)
+        self.threshold = threshold
+        self.threshold_variance = threshold * threshold
+        self.last_published_z = None
+        self.context = context
+        self.max_interval = max(1, max_interval)
+        # Unpublished samples kept to be sent if an anomaly follows
+        self.pending = deque(maxlen=context)
+        # Samples still published at the full rate after an anomaly
+        self.hold = 0
+        self.interval = 1
+        self.since_published = 0
+        self.read_count = 0
+        self.published_count = 0
+
+    def offer(self, data: AggregatedData) -> List[AggregatedData]:
+        """Samples to publish now, oldest first, after reading `data`"""
+        self.read_count += 1
+        z = data.accelerometer.z
+        anomalous = (
+            self.variance.update(z) > self.threshold_variance
+            or self.last_published_z is None
+            or abs(z - self.last_published_z) > self.threshold
+        )
+        if anomalous:
+            self.hold = self.context
+            self.interval = 1
+            selected = list(self.pending) + [data]
+            self.pending.clear()
+        elif self.hold > 0:
+            self.hold -= 1
+            selected = [data]
+        else:
+            self.since_published += 1
+            if self.since_published < self.interval:
+                self.pending.append(data)
+                return []
+            # Steady road, back off towards the heartbeat
+            self.interval = min(self.interval * 2, self.max_interval)
+            selected = [data]
+            self.pending.clear()
+        self.since_published = 0
+        self.last_published_z = z
+        self.published_count += len(selected)
+        return selected
+
+    @property
+    def reduction_ratio(self) -> float:
+        """Samples read per sample published"""
+        return self.read_count / self.published_count if self.published_count else math.inf
@@ -11,4 +11,26 @@ MQTT_BROKER_HOST = os.environ.get('MQTT_BROKER_HOST') or 'mqtt'
 MQTT_BROKER_PORT = try_parse(int, os.environ.get('MQTT_BROKER_PORT')) or 1883
 MQTT_TOPIC = os.environ.get('MQTT_TOPIC') or 'agent'
 # Delay for sending data to mqtt in seconds
-DELAY = try_parse(float, os.environ.get('DELAY')) or 1
\ No newline at end of file
+DELAY = try_parse(float, os.environ.get('DELAY')) or 1
+
+# Latency tracing
+# Traced samples carry an envelope with the time they passed every stage
+TRACE_ENABLED = (os.environ.get('TRACE_ENABLED') or 'false').lower() == 'true'
+TRACE_FILE = os.environ.get('TRACE_FILE') or 'trace.jsonl'
+# Every n-th sample is traced
+TRACE_SAMPLE_EVERY = try_parse(int, os.environ.get('TRACE_SAMPLE_EVERY')) or 1
+
+# Adaptive sampling
+# Reads the sensor every ADAPTIVE_MIN_DELAY seconds and publishes every sample around
+# road anomalies, backing off to one sample per ADAPTIVE_MAX_DELAY seconds on steady road
+ADAPTIVE_ENABLED = (os.environ.get('ADAPTIVE_ENABLED') or 'false').lower() == 'true'
+ADAPTIVE_MIN_DELAY = try_parse(float, os.environ.get('ADAPTIVE_MIN_DELAY')) or 0.1
+ADAPTIVE_MAX_DELAY = try_parse(float, os.environ.get('ADAPTIVE_MAX_DELAY')) or 5
+# Samples in the rolling z variance
+ADAPTIVE_WINDOW = try_parse(int, os.environ.get('ADAPTIVE_WINDOW')) or 10
+# Standard deviation of z (or change of z since the last published sample) that counts as an anomaly
+ADAPTIVE_THRESHOLD = try_parse(float, os.environ.get('ADAPTIVE_THRESHOLD')) or 500
+# Samples published before and after an anomaly
+ADAPTIVE_CONTEXT = try_parse(int, os.environ.get('ADAPTIVE_CONTEXT')) or 5
+# Seconds between reports of the data reduction ratio
+ADAPTIVE_REPORT_SECONDS = try_parse(float, os.environ.get('ADAPTIVE_REPORT_SECONDS')) or 60
\ No newline at end of file
@@ -1,11 +1,15 @@
 from dataclasses import dataclass
 from datetime import datetime
+from typing import Optional
 from src.domain.accelerometer import Accelerometer
 from src.domain.gps import Gps
+from src.domain.trace import Trace
 
 @dataclass
 class AggregatedData:
     accelerometer: Accelerometer
     gps: Gps
     timestamp: datetime
-    user_id: int
\ No newline at end of file
+    user_id: int
+    # Only set on samples picked for latency tracing
+    trace: Optional[Trace] = None
\ No newline at end of file
@@ -0,0 +1,8 @@
+from dataclasses import dataclass, field
+from typing import Dict
+
+@dataclass
+class Trace:
+    sample_id: str
+    # Stage name -> time.monotonic_ns() when the sample passed it
+    stages: Dict[str, int] = field(default_factory=dict)
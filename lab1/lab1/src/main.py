@@ -3,7 +3,9 @@ import json
 import time
 from src.schema.aggregated_data_schema import AggregatedDataSchema
 from src.file_datasource import FileDatasource
+from src.adaptive_sampler import AdaptiveSampler
 import src.config as config
+from src.tracing import start_trace, record
 
 
 def connect_mqtt(broker, port):
@@ -24,20 +26,47 @@ def connect_mqtt(broker, port):
     return client
 
 
+def publish_sample(client, topic, datasource):
+    """Read the next sample and publish it, returns True if it was sent"""
+    return send_data(client, topic, datasource.read())
+
+
+def send_data(client, topic, data):
+    """Publish a sample, returns True if it was sent"""
+    data.trace = start_trace()
+    record(data.trace, 'agent.publish')
+    msg = AggregatedDataSchema().dumps(data)
+    result = client.publish(topic, msg)
+    # result: [0, 1]
+    status = result[0]
+    if status != 0:
+        print(f"Failed to send message to topic {topic}")
+        return False
+    # print(f"Send `{msg}` to topic `{topic}`")
+    return True
+
+
 def publish(client, topic, datasource, delay):
     datasource.startReading()
     while True:
         time.sleep(delay)
-        data = datasource.read()
-        msg = AggregatedDataSchema().dumps(data)
-        result = client.publish(topic, msg)
-        # result: [0, 1]
-        status = result[0]
-        if status == 0:
-            pass
-            # print(f"Send `{msg}` to topic `{topic}`")
-        else:
-            print(f"Failed to send message to topic {topic}")
+        publish_sample(client, topic, datasource)
+
+
+def publish_adaptive(client, topic, datasource, sampler, delay, report_seconds):
+    """Read the sensor every `delay` seconds, publish the samples the sampler picks"""
+    datasource.startReading()
+    reported = time.monotonic()
+    while True:
+        time.sleep(delay)
+        for data in sampler.offer(datasource.read()):
+            send_data(client, topic, data)
+        if time.monotonic() - reported >= report_seconds:
+            reported = time.monotonic()
+            print(
+                f"Published {sampler.published_count} of {sampler.read_count} samples, "
+                f"data reduction ratio {sampler.reduction_ratio:.1f}"
+            )
 
 
 def run():
@@ -46,7 +75,18 @@ def run():
     # Prepare datasource
     datasource = FileDatasource("data/accelerometer.csv", "data/gps.csv", user_id=1)
     # Infinity publish data
-    publish(client, config.MQTT_TOPIC, datasource, config.DELAY)
+    if config.ADAPTIVE_ENABLED:
+        sampler = AdaptiveSampler(
+            window=config.ADAPTIVE_WINDOW,
+            threshold=config.ADAPTIVE_THRESHOLD,
+            context=config.ADAPTIVE_CONTEXT,
+            max_interval=round(config.ADAPTIVE_MAX_DELAY / config.ADAPTIVE_MIN_DELAY),
+        )
+        publish_adaptive(
+            client, config.MQTT_TOPIC, datasource, sampler, config.ADAPTIVE_MIN_DELAY, config.ADAPTIVE_REPORT_SECONDS
+        )
+    else:
+        publish(client, config.MQTT_TOPIC, datasource, config.DELAY)
 
 
 if __name__ == "__main__":
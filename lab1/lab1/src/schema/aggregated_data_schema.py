@@ -1,11 +1,20 @@
-from marshmallow import Schema, fields
+from marshmallow import Schema, fields, post_dump
 
 from src.schema.accelerometer_schema import AccelerometerSchema
 from src.schema.gps_schema import GpsSchema
+from src.schema.trace_schema import TraceSchema
 
 
 class AggregatedDataSchema(Schema):
     accelerometer = fields.Nested(AccelerometerSchema)
     gps = fields.Nested(GpsSchema)
     timestamp = fields.DateTime('iso')
-    user_id = fields.Int()
\ No newline at end of file
+    user_id = fields.Int()
+    trace = fields.Nested(TraceSchema, allow_none=True)
+
+    @post_dump
+    def remove_empty_trace(self, data, **kwargs):
+        # Untraced samples are sent without the field
+        if data.get('trace') is None:
+            data.pop('trace', None)
+        return data
\ No newline at end of file
@@ -0,0 +1,5 @@
+from marshmallow import Schema, fields
+
+class TraceSchema(Schema):
+    sample_id = fields.Str()
+    stages = fields.Dict(keys=fields.Str(), values=fields.Int())
@@ -0,0 +1,39 @@
+import json
+import threading
+import time
+import uuid
+from itertools import count
+from typing import Optional
+from src.domain.trace import Trace
+import src.config as config
+
+SERVICE = 'agent'
+
+_samples = count()
+_lock = threading.Lock()
+_file = None
+
+
+def start_trace() -> Optional[Trace]:
+    """Envelope for the next sample, None if it is not traced"""
+    if not config.TRACE_ENABLED or next(_samples) % config.TRACE_SAMPLE_EVERY:
+        return None
+    return Trace(sample_id=uuid.uuid4().hex)
+
+
+def record(trace: Optional[Trace], stage: str, t: int = None):
+    """
+    Stamp the stage on the envelope and append the stages so far to TRACE_FILE.
+    Stages are time.monotonic_ns(), so all services must run on one host.
+    """
+    global _file
+    if trace is None:
+        return
+    trace.stages[stage] = time.monotonic_ns() if t is None else t
+    if not config.TRACE_ENABLED:
+        return
+    line = json.dumps({'sample_id': trace.sample_id, 'service': SERVICE, 'stages': trace.stages})
+    with _lock:
+        if _file is None:
+            _file = open(config.TRACE_FILE, 'a', buffering=1)
+        _file.write(line + '\n')
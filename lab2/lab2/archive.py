@@ -0,0 +1,174 @@
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, date
+from typing import Dict, List, Optional, Tuple
+import pyarrow as pa
+import pyarrow.parquet as pq
+from export import EXPORT_SCHEMA
+from config import (
+    ARCHIVE_DIR,
+    ARCHIVE_FLUSH_ROWS,
+    ARCHIVE_FLUSH_SECONDS,
+    ARCHIVE_QUEUE_SIZE,
+    ROLLUP_ZOOM,
+)
+
+
+class ArchiveSink:
+    """
+    Appends ingested rows to Parquet files partitioned by day:
+    ARCHIVE_DIR/date=YYYY-MM-DD/part-<time>-<pid>.parquet
+    Writing happens in a background thread, ingestion only puts rows in a queue.
+    """
+
+    def __init__(self, directory: str = ARCHIVE_DIR):
+        self.directory = directory
+        self.queue: queue.Queue = queue.Queue(maxsize=ARCHIVE_QUEUE_SIZE)
+        self.dropped = 0
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+
+    def append(self, rows: List[dict]):
+        try:
+            self.queue.put_nowait(rows)
+        except queue.Full:
+            # The database still has the rows, only the archive misses them
+            self.dropped += len(rows)
+            logging.warning(f"Archive queue is full, {len(rows)} rows not archived")
+
+    def _run(self):
+        pending: List[dict] = []
+        last_flush = time.monotonic()
+        while self._running or not self.queue.empty():
+            try:
+                pending.extend(self.queue.get(timeout=0.5))
+            except queue.Empty:
+                pass
+            due = time.monotonic() - last_flush >= ARCHIVE_FLUSH_SECONDS
+            if pending and (len(pending) >= ARCHIVE_FLUSH_ROWS or due or not self._running):
+                try:
+                    self._flush(pending)
+                except Exception as e:
+                    logging.error(f"Failed to write archive: {e}")
+                pending = []
+                last_flush = time.monotonic()
+
+    def _flush(self, rows: List[dict]):
+        by_day: Dict[date, List[dict]] = {}
+        for row in rows:
+            by_day.setdefault(row["timestamp"].date(), []).append(row)
+        for day, day_rows in by_day.items():
+            directory = os.path.join(self.directory, f"date={day.isoformat()}")
+            os.makedirs(directory, exist_ok=True)
+            table = pa.Table.from_pylist(
+                [{field.name: row[field.name] for field in EXPORT_SCHEMA} for row in day_rows],
+                schema=EXPORT_SCHEMA,
+            )
+            name = f"part-{time.time_ns()}-{os.getpid()}.parquet"
+            # Write to a temporary name first, readers never see half a file
+            path = os.path.join(directory, name)
+            pq.write_table(table, path + ".tmp", compression="zstd")
+            os.replace(path + ".tmp", path)
+
+
+class ArchiveQuery:
+    """Analytical queries over the archive with embedded DuckDB"""
+
+    def __init__(self, directory: str = ARCHIVE_DIR):
+        self.directory = directory
+
+    def _source(self) -> str:
+        pattern = os.path.join(self.directory, "date=*", "*.parquet").replace("'", "''")
+        return f"read_parquet('{pattern}', hive_partitioning = true)"
+
+    def _execute(self, sql: str, parameters: list) -> Tuple[List[str], list]:
+        import duckdb
+
+        if not os.path.isdir(self.directory) or not any(
+            name.startswith("date=") for name in os.listdir(self.directory)
+        ):
+            return [], []
+        with duckdb.connect() as connection:
+            cursor = connection.execute(sql, parameters)
+            columns = [description[0] for description in cursor.description]
+            return columns, cursor.fetchall()
+
+    @staticmethod
+    def _where(
+        since: Optional[datetime],
+        until: Optional[datetime],
+        bbox: Optional[Tuple[float, float, float, float]],
+        user_id: Optional[int] = None,
+    ) -> Tuple[str, list]:
+        # Conditions on `date` prune whole day directories before reading files
+        conditions, parameters = ["TRUE"], []
+        if since is not None:
+            conditions.append("date >= ? AND timestamp >= ?")
+            parameters += [since.date(), since]
+        if until is not None:
+            conditions.append("date <= ? AND timestamp <= ?")
+            parameters += [until.date(), until]
+        if bbox is not None:
+            conditions.append("longitude BETWEEN ? AND ? AND latitude BETWEEN ? AND ?")
+            parameters += [bbox[0], bbox[2], bbox[1], bbox[3]]
+        if user_id is not None:
+            conditions.append("user_id = ?")
+            parameters.append(user_id)
+        return " AND ".join(conditions), parameters
+
+    def road_quality(self, zoom: int, since=None, until=None, bbox=None) -> dict:
+        """Road quality per map tile of the zoom level over the whole range"""
+        zoom = min(zoom, ROLLUP_ZOOM)
+        where, parameters = self._where(since, until, bbox)
+        sql = f"""
+            SELECT
+                floor((longitude + 180.0) / 360.0 * {1 << zoom})::INTEGER AS x,
+                floor((1.0 - ln(tan(radians(lat)) + 1.0 / cos(radians(lat))) / pi()) / 2.0 * {1 << zoom})::INTEGER AS y,
+                count(*) AS count,
+                count(*) FILTER (WHERE road_state = 'normal') AS normal,
+                count(*) FILTER (WHERE road_state = 'small pits') AS small_pits,
+                count(*) FILTER (WHERE road_state = 'large pits') AS large_pits,
+                round(avg(z), 3) AS z_mean,
+                round(coalesce(stddev_pop(z), 0), 3) AS z_std
+            FROM (
+                SELECT *, greatest(-85.0511, least(85.0511, latitude)) AS lat FROM {self._source()}
+                WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND {where}
+            )
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+        """
+        columns, rows = self._execute(sql, parameters)
+        return {"zoom": zoom, "columns": columns, "cells": [list(row) for row in rows]}
+
+    def daily(self, user_id=None, since=None, until=None, bbox=None) -> dict:
+        """Samples and road states per user and day"""
+        where, parameters = self._where(since, until, bbox, user_id)
+        sql = f"""
+            SELECT
+                CAST(date AS VARCHAR) AS date,
+                user_id,
+                count(*) AS count,
+                count(*) FILTER (WHERE road_state = 'normal') AS normal,
+                count(*) FILTER (WHERE road_state = 'small pits') AS small_pits,
+                count(*) FILTER (WHERE road_state = 'large pits') AS large_pits
+            FROM {self._source()}
+            WHERE {where}
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+        """
+        columns, rows = self._execute(sql, parameters)
+        return {"columns": columns, "rows": [list(row) for row in rows]}
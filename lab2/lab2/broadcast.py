@@ -0,0 +1,276 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, List, Optional, Set, Tuple
+from sqlalchemy import text
+from config import (
+    BROADCAST_BACKEND,
+    BROADCAST_CHANNEL_PREFIX,
+    REDIS_HOST,
+    REDIS_PORT,
+)
+
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes and more
+PG_NOTIFY_MAX_PAYLOAD = 7900
+# Seconds between reconnects of the LISTEN connection
+LISTEN_RETRY_SECONDS = 1
+
+
+class Broadcast(ABC):
+    """
+    Abstract class representing the broadcast backbone between store workers.
+    Every worker publishes its inserts and receives the frames of users that
+    have local WebSocket subscribers.
+    """
+
+    def __init__(self):
+        self.on_message: Optional[Callable[[int, str], None]] = None
+        self.channels: Set[int] = set()
+
+    async def start(self, on_message: Callable[[int, str], None]):
+        """
+        Method to start receiving frames.
+        Parameters:
+            on_message: Called with (user_id, encoded frame) in the event loop.
+        """
+        self.on_message = on_message
+
+    async def stop(self):
+        """
+        Method to stop receiving frames and release connections.
+        """
+        pass
+
+    @abstractmethod
+    async def publish(self, user_id: int, payloads: List[dict]):
+        """
+        Method to send the user's payloads to every worker.
+        Parameters:
+            user_id (int): Owner of the payloads, selects the channel.
+            payloads (List[dict]): Payloads to send as one frame.
+        """
+        pass
+
+    async def subscribe(self, user_id: int):
+        """
+        Method to start receiving frames of the user on this worker.
+        """
+        self.channels.add(user_id)
+
+    async def unsubscribe(self, user_id: int):
+        """
+        Method to stop receiving frames of the user on this worker.
+        """
+        self.channels.discard(user_id)
+
+    def channel(self, user_id: int) -> str:
+        return f"{BROADCAST_CHANNEL_PREFIX}_{user_id}"
+
+    def deliver(self, user_id: int, message: str):
+        if self.on_message is not None and user_id in self.channels:
+            self.on_message(user_id, message)
+
+
+class MemoryBroadcast(Broadcast):
+    """Single process backbone, also a stand-in for the others in tests"""
+
+    async def publish(self, user_id: int, payloads: List[dict]):
+        if user_id in self.channels:
+            self.deliver(user_id, json.dumps(payloads))
+
+
+class RedisBroadcast(Broadcast):
+    """Redis pub/sub backbone with one channel per user"""
+
+    def __init__(self, host: str, port: int):
+        super().__init__()
+        from redis import asyncio as aioredis
+
+        self.redis = aioredis.Redis(host=host, port=port)
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        self._reader: Optional[asyncio.Task] = None
+
+    async def start(self, on_message):
+        await super().start(on_message)
+        self._reader = asyncio.create_task(self._read())
+
+    async def stop(self):
+        if self._reader is not None:
+            self._reader.cancel()
+        await self.pubsub.close()
+        await self.redis.close()
+
+    async def publish(self, user_id: int, payloads: List[dict]):
+        await self.redis.publish(self.channel(user_id), json.dumps(payloads))
+
+    async def subscribe(self, user_id: int):
+        await super().subscribe(user_id)
+        await self.pubsub.subscribe(self.channel(user_id))
+
+    async def unsubscribe(self, user_id: int):
+        await super().unsubscribe(user_id)
+        await self.pubsub.unsubscribe(self.channel(user_id))
+
+    async def _read(self):
+        while True:
+            try:
+                if not self.pubsub.subscribed:
+                    await asyncio.sleep(0.1)
+                    continue
+                message = await self.pubsub.get_message(timeout=1.0)
+                if message is None or message["type"] != "message":
+                    continue
+                channel = message["channel"].decode("utf-8")
+                user_id = int(channel.rsplit("_", 1)[1])
+                self.deliver(user_id, message["data"].decode("utf-8"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Redis broadcast failed: {e}")
+                await asyncio.sleep(1)
+
+
+class PostgresBroadcast(Broadcast):
+    """
+    PostgreSQL LISTEN/NOTIFY backbone with one channel per user.
+    Notifications are read on a dedicated connection in a background thread,
+    which reconnects and listens to every subscribed channel again when the
+    connection is lost.
+    """
+
+    def __init__(self, engine):
+        super().__init__()
+        self.engine = engine
+        self._commands: List[Tuple[str, asyncio.Future]] = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self, on_message):
+        await super().start(on_message)
+        self._loop = asyncio.get_running_loop()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._listen, daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._thread.join)
+            self._thread = None
+
+    async def publish(self, user_id: int, payloads: List[dict]):
+        messages = self._split(payloads)
+        await asyncio.get_running_loop().run_in_executor(None, self._notify, user_id, messages)
+
+    async def subscribe(self, user_id: int):
+        await super().subscribe(user_id)
+        await self._execute(f'LISTEN "{self.channel(user_id)}"')
+
+    async def unsubscribe(self, user_id: int):
+        await super().unsubscribe(user_id)
+        await self._execute(f'UNLISTEN "{self.channel(user_id)}"')
+
+    async def _execute(self, command: str):
+        """
+        Run the command on the listener connection and wait until it is done.
+        Raises if the connection fails first, the listener then reconnects
+        and listens to self.channels again by itself.
+        """
+        if self._thread is None or self._stopped.is_set():
+            raise RuntimeError("PostgreSQL broadcast is not running")
+        done = asyncio.get_running_loop().create_future()
+        with self._lock:
+            self._commands.append((command, done))
+        await done
+
+    def _settle(self, done: asyncio.Future, error: Optional[Exception] = None):
+        """Resolve a command future from the listener thread"""
+
+        def settle():
+            if done.done():
+                return
+            if error is None:
+                done.set_result(None)
+            else:
+                done.set_exception(error)
+
+        try:
+            self._loop.call_soon_threadsafe(settle)
+        except RuntimeError:
+            # The event loop is already closed
+            pass
+
+    def _fail_pending(self, error: Exception):
+        with self._lock:
+            commands, self._commands = self._commands, []
+        for _, done in commands:
+            self._settle(done, error)
+
+    def _split(self, payloads: List[dict]) -> List[str]:
+        message = json.dumps(payloads)
+        if len(message) <= PG_NOTIFY_MAX_PAYLOAD or len(payloads) == 1:
+            return [message]
+        middle = len(payloads) // 2
+        return self._split(payloads[:middle]) + self._split(payloads[middle:])
+
+    def _notify(self, user_id: int, messages: List[str]):
+        with self.engine.begin() as connection:
+            for message in messages:
+                connection.execute(
+                    text("SELECT pg_notify(:channel, :payload)"),
+                    {"channel": self.channel(user_id), "payload": message},
+                )
+
+    def _listen(self):
+        while not self._stopped.is_set():
+            try:
+                self._listen_connection()
+            except Exception as e:
+                logging.error(f"PostgreSQL broadcast listener failed, reconnecting: {e}")
+                self._fail_pending(e)
+                self._stopped.wait(LISTEN_RETRY_SECONDS)
+        self._fail_pending(RuntimeError("PostgreSQL broadcast stopped"))
+
+    def _listen_connection(self):
+        """Listen on one connection until it fails or the broadcast stops"""
+        connection = self.engine.raw_connection()
+        try:
+            connection.driver_connection.autocommit = True
+            raw = connection.driver_connection
+            cursor = raw.cursor()
+            # Channels subscribed before a reconnect
+            for user_id in list(self.channels):
+                cursor.execute(f'LISTEN "{self.channel(user_id)}"')
+            while not self._stopped.is_set():
+                with self._lock:
+                    commands, self._commands = self._commands, []
+                try:
+                    while commands:
+                        cursor.execute(commands[0][0])
+                        self._settle(commands.pop(0)[1])
+                except Exception as e:
+                    for _, done in commands:
+                        self._settle(done, e)
+                    raise
+                if select.select([raw], [], [], 0.1) == ([], [], []):
+                    continue
+                raw.poll()
+                while raw.notifies:
+                    notify = raw.notifies.pop(0)
+                    user_id = int(notify.channel.rsplit("_", 1)[1])
+                    self._loop.call_soon_threadsafe(self.deliver, user_id, notify.payload)
+        finally:
+            connection.close()
+
+
+def create_broadcast(engine) -> Broadcast:
+    if BROADCAST_BACKEND == "redis":
+        return RedisBroadcast(REDIS_HOST, REDIS_PORT)
+    if BROADCAST_BACKEND == "postgres":
+        return PostgresBroadcast(engine)
+    return MemoryBroadcast()
@@ -0,0 +1,184 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Optional
+from config import (
+    CACHE_BACKEND,
+    CACHE_MAX_ENTRIES,
+    CACHE_TTL_SECONDS,
+    REDIS_HOST,
+    REDIS_PORT,
+)
+
+
+class Cache(ABC):
+    """
+    Abstract class representing the read-through cache of store queries.
+    Queries are grouped in scopes (a row, a user, all rows); a write bumps the
+    generation of its scopes, so keys built with the old generation are never
+    read again and age out of the cache. A generation is forgotten twice the
+    TTL after its last bump, when every key built with it has expired, so
+    scopes of single rows do not pile up.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Method to get a cached value.
+        Returns:
+            The value, or None if the key is missing or expired.
+        """
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Any):
+        """
+        Method to cache a JSON compatible value for CACHE_TTL_SECONDS.
+        """
+        pass
+
+    @abstractmethod
+    def generation(self, scope: str) -> int:
+        """
+        Method to get the current generation of the scope.
+        """
+        pass
+
+    @abstractmethod
+    def bump(self, scope: str):
+        """
+        Method to invalidate every key built with the current generation of the scope.
+        """
+        pass
+
+    def key(self, scope: str, *parts) -> str:
+        return ":".join([scope, str(self.generation(scope)), *map(str, parts)])
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class MemoryCache(Cache):
+    """In-process LRU cache with TTL"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # scope -> [generation, forgotten after]
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def generation(self, scope):
+        entry = self._generations.get(scope)
+        if entry is None or entry[1] < time.monotonic():
+            return 0
+        return entry[0]
+
+    def bump(self, scope):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._generations) > self.max_entries:
+                self._generations = {
+                    scope: entry for scope, entry in self._generations.items() if entry[1] >= now
+                }
+            self._generations[scope] = [self.generation(scope) + 1, now + 2 * self.ttl]
+            self.invalidations += 1
+
+    def stats(self):
+        stats = super().stats()
+        stats["size"] = len(self._entries)
+        return stats
+
+
+class RedisCache(Cache):
+    """Cache shared by every store worker, Redis evicts expired keys itself"""
+
+    def __init__(self, host: str, port: int, ttl: float):
+        super().__init__()
+        from redis import Redis
+
+        self.redis = Redis(host=host, port=port)
+        self.ttl = max(int(ttl), 1)
+
+    def get(self, key):
+        value = self.redis.get(f"cache:{key}")
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    def set(self, key, value):
+        self.redis.setex(f"cache:{key}", self.ttl, json.dumps(value))
+
+    def generation(self, scope):
+        return int(self.redis.get(f"cache_generation:{scope}") or 0)
+
+    def bump(self, scope):
+        with self.redis.pipeline() as pipeline:
+            pipeline.incr(f"cache_generation:{scope}")
+            pipeline.expire(f"cache_generation:{scope}", 2 * self.ttl)
+            pipeline.execute()
+        self.invalidations += 1
+
+
+class NoCache(Cache):
+    """Disabled cache, every lookup is a miss"""
+
+    def get(self, key):
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def generation(self, scope):
+        return 0
+
+    def bump(self, scope):
+        pass
+
+
+def create_cache() -> Cache:
+    if CACHE_BACKEND == "redis":
+        return RedisCache(REDIS_HOST, REDIS_PORT, CACHE_TTL_SECONDS)
+    if CACHE_BACKEND == "none":
+        return NoCache()
+    return MemoryCache(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS)
@@ -0,0 +1,101 @@
+import asyncio
+import json
+from datetime import datetime
+from typing import Iterable, List, Optional, Set
+from fastapi import WebSocket
+from sqlalchemy import func
+from sqlalchemy.sql import select
+from starlette.concurrency import run_in_threadpool
+from database import processed_agent_data, SessionLocal, row_to_dict
+from config import CATCHUP_CHUNK_SIZE, CATCHUP_DEDUPE_WINDOW, CATCHUP_MAX_CONCURRENT
+
+# Limits database load when many clients reconnect at the same time
+catchup_semaphore = asyncio.Semaphore(CATCHUP_MAX_CONCURRENT)
+
+
+class ReplayedIds:
+    """
+    Rows of one user the client already has, after the catch-up.
+    SERIAL ids can commit out of order, a row with a lower id than the last
+    replayed one may commit later and arrive in a live frame. So the ids
+    within `window` of the last one are kept as a set, only older ids are
+    assumed to be sent. A row committed more than `window` ids late and
+    before the subscription was made is lost.
+    """
+
+    def __init__(self, last_id: Optional[int], window: int = CATCHUP_DEDUPE_WINDOW):
+        self.last_id = last_id
+        self.window = window
+        self._ids: Set[int] = set()
+
+    def add(self, ids: Iterable[int]):
+        ids = list(ids)
+        if not ids:
+            return
+        self._ids.update(ids)
+        last_id = max(ids)
+        self.last_id = last_id if self.last_id is None else max(self.last_id, last_id)
+        if len(self._ids) > 2 * self.window:
+            self._ids = {row_id for row_id in self._ids if row_id > self.last_id - self.window}
+
+    def __contains__(self, row_id: int) -> bool:
+        if self.last_id is None:
+            return False
+        return row_id <= self.last_id - self.window or row_id in self._ids
+
+
+def first_id_since(user_id: int, since_ts: datetime) -> Optional[int]:
+    """Id before the first row of the user newer than since_ts"""
+    with SessionLocal() as session:
+        query = select(func.min(processed_agent_data.c.id)).where(
+            processed_agent_data.c.user_id == user_id,
+            processed_agent_data.c.timestamp > since_ts,
+        )
+        first_id = session.execute(query).scalar()
+        return None if first_id is None else first_id - 1
+
+
+def read_chunk(user_id: int, after_id: int, limit: int) -> List[dict]:
+    """Next rows of the user after the id, uses the (user_id, id) index"""
+    with SessionLocal() as session:
+        query = (
+            select(processed_agent_data)
+            .where(
+                processed_agent_data.c.user_id == user_id,
+                processed_agent_data.c.id > after_id,
+            )
+            .order_by(processed_agent_data.c.id)
+            .limit(limit)
+        )
+        return [row_to_dict(row) for row in session.execute(query)]
+
+
+async def replay(
+    websocket: WebSocket,
+    user_id: int,
+    since_id: Optional[int] = None,
+    since_ts: Optional[datetime] = None,
+) -> ReplayedIds:
+    """
+    Send rows the client missed in frames of CATCHUP_CHUNK_SIZE rows.
+    Returns the rows the client has: the ones sent and those up to since_id.
+    """
+    async with catchup_semaphore:
+        last_id = since_id
+        if since_ts is not None:
+            ts_id = await run_in_threadpool(first_id_since, user_id, since_ts)
+            if ts_id is None:
+                return ReplayedIds(last_id)
+            last_id = ts_id if last_id is None else max(last_id, ts_id)
+        replayed = ReplayedIds(last_id)
+        if last_id is None:
+            return replayed
+        while True:
+            rows = await run_in_threadpool(read_chunk, user_id, last_id, CATCHUP_CHUNK_SIZE)
+            if not rows:
+                return replayed
+            await websocket.send_text(json.dumps(rows))
+            replayed.add(row["id"] for row in rows)
+            last_id = rows[-1]["id"]
+            if len(rows) < CATCHUP_CHUNK_SIZE:
+                return replayed
@@ -11,4 +11,83 @@ POSTGRES_HOST = os.environ.get("POSTGRES_HOST") or "localhost"
 POSTGRES_PORT = try_parse(int, os.environ.get("POSTGRES_PORT")) or 5432
 POSTGRES_USER = os.environ.get("POSTGRES_USER") or "user"
 POSTGRES_PASSWORD = os.environ.get("POSTGRES_PASS") or "pass"
-POSTGRES_DB = os.environ.get("POSTGRES_DB") or "test_db"
\ No newline at end of file
+POSTGRES_DB = os.environ.get("POSTGRES_DB") or "test_db"
+
+# Configuration for road quality rollups
+# Tiles are kept at this zoom level, coarser zoom levels are merged on query
+ROLLUP_ZOOM = try_parse(int, os.environ.get("ROLLUP_ZOOM")) or 17
+# Size of the rollup time bucket in seconds
+ROLLUP_BUCKET_SECONDS = try_parse(int, os.environ.get("ROLLUP_BUCKET_SECONDS")) or 3600
+
+# Configuration for WebSocket subscribers
+# Frames queued per connection before the slow consumer policy applies
+WS_SEND_QUEUE_SIZE = try_parse(int, os.environ.get("WS_SEND_QUEUE_SIZE")) or 64
+# "drop" discards the oldest queued frame, "disconnect" closes the connection
+WS_SLOW_CONSUMER_POLICY = os.environ.get("WS_SLOW_CONSUMER_POLICY") or "drop"
+# Most users one multiplexed WebSocket may subscribe to
+WS_MAX_USER_IDS = try_parse(int, os.environ.get("WS_MAX_USER_IDS")) or 1000
+
+# Configuration for broadcasting inserts between store workers
+# "memory" (single worker), "postgres" (LISTEN/NOTIFY) or "redis" (pub/sub)
+BROADCAST_BACKEND = os.environ.get("BROADCAST_BACKEND") or "memory"
+BROADCAST_CHANNEL_PREFIX = os.environ.get("BROADCAST_CHANNEL_PREFIX") or "processed_agent_data"
+REDIS_HOST = os.environ.get("REDIS_HOST") or "localhost"
+REDIS_PORT = try_parse(int, os.environ.get("REDIS_PORT")) or 6379
+
+# Configuration for WebSocket catch-up after reconnect
+# Rows per catch-up frame
+CATCHUP_CHUNK_SIZE = try_parse(int, os.environ.get("CATCHUP_CHUNK_SIZE")) or 500
+# Catch-ups running at once, the others wait (protects against reconnect storms)
+CATCHUP_MAX_CONCURRENT = try_parse(int, os.environ.get("CATCHUP_MAX_CONCURRENT")) or 4
+# Ids below the last replayed one that may still commit, SERIAL ids are
+# taken at insert and can commit out of order
+CATCHUP_DEDUPE_WINDOW = try_parse(int, os.environ.get("CATCHUP_DEDUPE_WINDOW")) or 10000
+
+# Configuration for the read-through cache
+# "memory" (per worker LRU), "redis" (shared by workers) or "none"
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND") or "memory"
+CACHE_MAX_ENTRIES = try_parse(int, os.environ.get("CACHE_MAX_ENTRIES")) or 1024
+CACHE_TTL_SECONDS = try_parse(float, os.environ.get("CACHE_TTL_SECONDS")) or 5
+
+# Configuration for time partitioning of processed agent data
+# Daily partitions created ahead of time
+PARTITION_DAYS_AHEAD = try_parse(int, os.environ.get("PARTITION_DAYS_AHEAD")) or 3
+# Raw partitions older than this are rolled up into per-minute summaries
+DOWNSAMPLE_AFTER_DAYS = try_parse(int, os.environ.get("DOWNSAMPLE_AFTER_DAYS")) or 1
+# Raw partitions older than this are dropped
+RETENTION_DAYS = try_parse(int, os.environ.get("RETENTION_DAYS")) or 30
+if DOWNSAMPLE_AFTER_DAYS >= RETENTION_DAYS:
+    # Partitions would be dropped before they are downsampled
+    raise ValueError("DOWNSAMPLE_AFTER_DAYS must be less than RETENTION_DAYS")
+# Seconds between partition maintenance runs
+PARTITION_JOB_INTERVAL = try_parse(float, os.environ.get("PARTITION_JOB_INTERVAL")) or 3600
+
+# Configuration for columnar export
+# Rows per Arrow record batch / Parquet row group
+EXPORT_BATCH_SIZE = try_parse(int, os.environ.get("EXPORT_BATCH_SIZE")) or 50000
+
+# Configuration for the analytical archive
+# Ingested rows are also appended to Parquet files when enabled
+ARCHIVE_ENABLED = (os.environ.get("ARCHIVE_ENABLED") or "false").lower() == "true"
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR") or "archive"
+ARCHIVE_FLUSH_ROWS = try_parse(int, os.environ.get("ARCHIVE_FLUSH_ROWS")) or 10000
+ARCHIVE_FLUSH_SECONDS = try_parse(float, os.environ.get("ARCHIVE_FLUSH_SECONDS")) or 60
+ARCHIVE_QUEUE_SIZE = try_parse(int, os.environ.get("ARCHIVE_QUEUE_SIZE")) or 1000
+
+# Configuration for latency tracing
+# Stages of traced samples are appended to TRACE_FILE when enabled
+TRACE_ENABLED = (os.environ.get("TRACE_ENABLED") or "false").lower() == "true"
+TRACE_FILE = os.environ.get("TRACE_FILE") or "trace.jsonl"
+
+# Configuration for profiling
+# Adds handler timings and GET /debug/profile when enabled, nothing otherwise
+PROFILING_ENABLED = (os.environ.get("PROFILING_ENABLED") or "false").lower() == "true"
+# Longest profile a request may ask for
+PROFILE_MAX_SECONDS = try_parse(int, os.environ.get("PROFILE_MAX_SECONDS")) or 60
+PROFILE_SAMPLE_INTERVAL_MS = try_parse(int, os.environ.get("PROFILE_SAMPLE_INTERVAL_MS")) or 5
+
+# Configuration for road defect clustering
+# Pit detections closer than DEFECT_RADIUS_M to a known defect are merged into it
+DEFECT_RADIUS_M = try_parse(float, os.environ.get("DEFECT_RADIUS_M")) or 10
+# Chance that a single detection is a real defect, every detection raises the confidence
+DEFECT_HIT_CONFIDENCE = try_parse(float, os.environ.get("DEFECT_HIT_CONFIDENCE")) or 0.3
@@ -0,0 +1,54 @@
+from sqlalchemy import (
+    create_engine,
+    MetaData,
+    Table,
+    Column,
+    Integer,
+    String,
+    Float,
+    DateTime,
+    Index,
+)
+from sqlalchemy.orm import sessionmaker
+from config import (
+    POSTGRES_HOST,
+    POSTGRES_PORT,
+    POSTGRES_DB,
+    POSTGRES_USER,
+    POSTGRES_PASSWORD,
+)
+
+# SQLAlchemy setup
+DATABASE_URL = f"postgresql+psycopg2://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+engine = create_engine(DATABASE_URL)
+metadata = MetaData()
+# Define the ProcessedAgentData table
+# Partitioned by day, the partitions are managed by partitions.py
+processed_agent_data = Table(
+    "processed_agent_data",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True, index=True),
+    Column("road_state", String),
+    Column("user_id", Integer),
+    Column("x", Float),
+    Column("y", Float),
+    Column("z", Float),
+    Column("latitude", Float),
+    Column("longitude", Float),
+    # Partition key has to be a part of the primary key
+    Column("timestamp", DateTime, primary_key=True),
+    # Keyset pagination of a user's rows (WebSocket catch-up, history)
+    Index("ix_processed_agent_data_user_id_id", "user_id", "id"),
+    Index("ix_processed_agent_data_user_id_timestamp", "user_id", "timestamp"),
+    postgresql_partition_by="RANGE (timestamp)",
+)
+
+SessionLocal = sessionmaker(bind=engine)
+
+
+def row_to_dict(row) -> dict:
+    """Convert processed agent data row to JSON compatible dict"""
+    data = dict(row._mapping)
+    if data["timestamp"] is not None:
+        data["timestamp"] = data["timestamp"].isoformat()
+    return data
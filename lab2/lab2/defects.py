@@ -0,0 +1,263 @@
+from datetime import datetime
+from math import cos, floor, hypot, radians
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import (
+    Table,
+    Column,
+    Integer,
+    Float,
+    DateTime,
+    Index,
+    bindparam,
+    text,
+    tuple_,
+)
+from sqlalchemy.sql import select, insert, update, delete
+from database import metadata
+from config import DEFECT_RADIUS_M, DEFECT_HIT_CONFIDENCE
+
+# Road states that are defects, counted per defect
+DEFECT_STATE_COLUMNS = {
+    "small pits": "small_pits_count",
+    "large pits": "large_pits_count",
+}
+METERS_PER_DEGREE = 111_320
+
+# Deduplicated road defects, every pit detection is merged into the
+# nearest defect within DEFECT_RADIUS_M or starts a new one
+road_defects = Table(
+    "road_defects",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    # Grid cell of the centroid, cells are DEFECT_RADIUS_M wide
+    Column("cell_x", Integer, nullable=False),
+    Column("cell_y", Integer, nullable=False),
+    # Centroid of the detections
+    Column("latitude", Float, nullable=False),
+    Column("longitude", Float, nullable=False),
+    Column("hit_count", Integer, nullable=False),
+    Column("small_pits_count", Integer, nullable=False),
+    Column("large_pits_count", Integer, nullable=False),
+    # Probability that the defect is real, grows with every detection
+    Column("confidence", Float, nullable=False),
+    Column("first_seen", DateTime, nullable=False),
+    Column("last_seen", DateTime, nullable=False),
+    Index("ix_road_defects_cell_x_cell_y", "cell_x", "cell_y"),
+    Index("ix_road_defects_last_seen", "last_seen"),
+)
+
+# Columns written when a detection is merged into a defect
+MERGED_COLUMNS = (
+    "cell_x",
+    "cell_y",
+    "latitude",
+    "longitude",
+    "hit_count",
+    "small_pits_count",
+    "large_pits_count",
+    "confidence",
+    "first_seen",
+    "last_seen",
+)
+
+
+def cell_xy(latitude: float, longitude: float) -> Tuple[int, int]:
+    """Grid cell of the coordinates, about DEFECT_RADIUS_M by DEFECT_RADIUS_M metres"""
+    x = longitude * METERS_PER_DEGREE * cos(radians(latitude))
+    y = latitude * METERS_PER_DEGREE
+    return floor(x / DEFECT_RADIUS_M), floor(y / DEFECT_RADIUS_M)
+
+
+def neighbour_cells(cell: Tuple[int, int]) -> List[Tuple[int, int]]:
+    """The cell and the 8 around it, they hold every point within DEFECT_RADIUS_M"""
+    x, y = cell
+    return [(x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+
+
+def distance_m(latitude1: float, longitude1: float, latitude2: float, longitude2: float) -> float:
+    """Equirectangular approximation, accurate for distances of a few cells"""
+    x = radians(longitude2 - longitude1) * cos(radians((latitude1 + latitude2) / 2))
+    y = radians(latitude2 - latitude1)
+    return 6_371_000 * hypot(x, y)
+
+
+def cluster_detections(defects: List[dict], rows: Iterable) -> Tuple[List[dict], List[dict]]:
+    """
+    Merge pit detections into the defects around them, oldest detection first.
+    Rows are anything with road_state, latitude, longitude and timestamp
+    attributes, rows of other road states are skipped. `defects` are dicts
+    of road_defects rows and are updated in place.
+    Returns (merged defects that have an id, new defects).
+    """
+    grid: Dict[Tuple[int, int], List[dict]] = {}
+    for defect in defects:
+        grid.setdefault((defect["cell_x"], defect["cell_y"]), []).append(defect)
+    merged: Dict[int, dict] = {}
+    created: List[dict] = []
+    for row in sorted(rows, key=lambda row: row.timestamp):
+        state_column = DEFECT_STATE_COLUMNS.get(row.road_state)
+        if state_column is None:
+            continue
+        cell = (cell_x, cell_y) = cell_xy(row.latitude, row.longitude)
+        nearest, nearest_distance = None, DEFECT_RADIUS_M
+        for neighbour in neighbour_cells(cell):
+            for defect in grid.get(neighbour, ()):
+                distance = distance_m(defect["latitude"], defect["longitude"], row.latitude, row.longitude)
+                if distance <= nearest_distance:
+                    nearest, nearest_distance = defect, distance
+        if nearest is None:
+            defect = dict.fromkeys(DEFECT_STATE_COLUMNS.values(), 0)
+            defect.update(
+                cell_x=cell_x,
+                cell_y=cell_y,
+                latitude=row.latitude,
+                longitude=row.longitude,
+                hit_count=1,
+                confidence=DEFECT_HIT_CONFIDENCE,
+                first_seen=row.timestamp,
+                last_seen=row.timestamp,
+            )
+            defect[state_column] = 1
+            grid.setdefault(cell, []).append(defect)
+            created.append(defect)
+            continue
+        # Running mean of the detections, the centroid may move to another cell
+        hits = nearest["hit_count"] + 1
+        nearest["latitude"] += (row.latitude - nearest["latitude"]) / hits
+        nearest["longitude"] += (row.longitude - nearest["longitude"]) / hits
+        nearest["hit_count"] = hits
+        nearest[state_column] += 1
+        nearest["confidence"] = 1 - (1 - nearest["confidence"]) * (1 - DEFECT_HIT_CONFIDENCE)
+        nearest["first_seen"] = min(nearest["first_seen"], row.timestamp)
+        nearest["last_seen"] = max(nearest["last_seen"], row.timestamp)
+        moved_to = cell_xy(nearest["latitude"], nearest["longitude"])
+        if moved_to != (nearest["cell_x"], nearest["cell_y"]):
+            grid[nearest["cell_x"], nearest["cell_y"]].remove(nearest)
+            grid.setdefault(moved_to, []).append(nearest)
+            nearest["cell_x"], nearest["cell_y"] = moved_to
+        if "id" in nearest:
+            merged[nearest["id"]] = nearest
+    return list(merged.values()), created
+
+
+def remove_detections(defects: List[dict], rows: Iterable) -> Tuple[List[dict], List[dict]]:
+    """
+    Take pit detections out of the defects they were merged into, the
+    nearest defect within DEFECT_RADIUS_M that counted their road state.
+    `defects` are updated in place like in cluster_detections; first_seen
+    and last_seen are kept, they are not tracked per detection.
+    Returns (changed defects, defects without detections left).
+    """
+    grid: Dict[Tuple[int, int], List[dict]] = {}
+    for defect in defects:
+        grid.setdefault((defect["cell_x"], defect["cell_y"]), []).append(defect)
+    changed: Dict[int, dict] = {}
+    emptied: List[dict] = []
+    for row in rows:
+        state_column = DEFECT_STATE_COLUMNS.get(row.road_state)
+        if state_column is None:
+            continue
+        nearest, nearest_distance = None, DEFECT_RADIUS_M
+        for neighbour in neighbour_cells(cell_xy(row.latitude, row.longitude)):
+            for defect in grid.get(neighbour, ()):
+                if defect[state_column] == 0:
+                    continue
+                distance = distance_m(defect["latitude"], defect["longitude"], row.latitude, row.longitude)
+                if distance <= nearest_distance:
+                    nearest, nearest_distance = defect, distance
+        if nearest is None:
+            continue
+        hits = nearest["hit_count"] - 1
+        nearest[state_column] -= 1
+        if hits == 0:
+            grid[nearest["cell_x"], nearest["cell_y"]].remove(nearest)
+            changed.pop(nearest["id"], None)
+            emptied.append(nearest)
+            continue
+        # Inverse of the running mean in cluster_detections
+        nearest["latitude"] += (nearest["latitude"] - row.latitude) / hits
+        nearest["longitude"] += (nearest["longitude"] - row.longitude) / hits
+        nearest["hit_count"] = hits
+        nearest["confidence"] = 1 - (1 - DEFECT_HIT_CONFIDENCE) ** hits
+        moved_to = cell_xy(nearest["latitude"], nearest["longitude"])
+        if moved_to != (nearest["cell_x"], nearest["cell_y"]):
+            grid[nearest["cell_x"], nearest["cell_y"]].remove(nearest)
+            grid.setdefault(moved_to, []).append(nearest)
+            nearest["cell_x"], nearest["cell_y"] = moved_to
+        changed[nearest["id"]] = nearest
+    return list(changed.values()), emptied
+
+
+def apply_defects(session, rows: Iterable, sign: int = 1) -> bool:
+    """
+    Merge the pit detections of inserted rows into road_defects, or with
+    sign=-1 take the detections of deleted rows (and of the old versions
+    of updated rows) out of them.
+    The cells around the detections are locked for the transaction, so
+    store workers inserting detections of the same defect do not create
+    it twice. Returns True if road_defects changed.
+    """
+    detections = [row for row in rows if row.road_state in DEFECT_STATE_COLUMNS]
+    if not detections:
+        return False
+    cells = sorted(
+        {cell for row in detections for cell in neighbour_cells(cell_xy(row.latitude, row.longitude))}
+    )
+    # Two key advisory locks, they don't clash with the single key maintenance lock
+    session.execute(
+        text(
+            "SELECT pg_advisory_xact_lock(x, y)"
+            " FROM unnest(CAST(:xs AS integer[]), CAST(:ys AS integer[])) AS cell(x, y)"
+        ),
+        {"xs": [x for x, _ in cells], "ys": [y for _, y in cells]},
+    )
+    c = road_defects.c
+    # Row locks too, a centroid may have moved to a cell another worker locks
+    query = select(road_defects).where(tuple_(c.cell_x, c.cell_y).in_(cells)).with_for_update()
+    defects = [dict(row._mapping) for row in session.execute(query)]
+    created, emptied = [], []
+    if sign < 0:
+        merged, emptied = remove_detections(defects, detections)
+    else:
+        merged, created = cluster_detections(defects, detections)
+    if merged:
+        # Executemany, SET gets the columns of the parameters
+        session.execute(
+            update(road_defects).where(c.id == bindparam("defect_id")),
+            [{"defect_id": defect["id"], **{column: defect[column] for column in MERGED_COLUMNS}} for defect in merged],
+        )
+    if created:
+        session.execute(insert(road_defects), created)
+    if emptied:
+        session.execute(delete(road_defects).where(c.id.in_([defect["id"] for defect in emptied])))
+    return bool(merged or created or emptied)
+
+
+def query_defects(
+    session,
+    min_confidence: float = 0.0,
+    since: Optional[datetime] = None,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    limit: Optional[int] = None,
+) -> List[dict]:
+    """Road defects, most confident first, from road_defects only"""
+    c = road_defects.c
+    query = select(road_defects).where(c.confidence >= min_confidence)
+    if since is not None:
+        query = query.where(c.last_seen >= since)
+    if bbox is not None:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        query = query.where(c.latitude.between(min_lat, max_lat), c.longitude.between(min_lon, max_lon))
+    query = query.order_by(c.confidence.desc(), c.id).limit(limit)
+    defects = []
+    for row in session.execute(query):
+        defect = dict(row._mapping)
+        del defect["cell_x"], defect["cell_y"]
+        # The worse state wins once it was detected at least as often
+        defect["road_state"] = (
+            "large pits" if defect["large_pits_count"] >= defect["small_pits_count"] else "small pits"
+        )
+        defect["first_seen"] = defect["first_seen"].isoformat()
+        defect["last_seen"] = defect["last_seen"].isoformat()
+        defects.append(defect)
+    return defects
@@ -0,0 +1,105 @@
+import io
+from datetime import datetime
+from typing import Iterator, Optional, Tuple
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy.sql import select
+from database import engine, processed_agent_data
+from config import EXPORT_BATCH_SIZE
+
+EXPORT_FORMATS = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+EXPORT_SCHEMA = pa.schema(
+    [
+        ("id", pa.int64()),
+        ("road_state", pa.string()),
+        ("user_id", pa.int64()),
+        ("x", pa.float64()),
+        ("y", pa.float64()),
+        ("z", pa.float64()),
+        ("latitude", pa.float64()),
+        ("longitude", pa.float64()),
+        ("timestamp", pa.timestamp("us")),
+    ]
+)
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file that hands out what was written since the last take()"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def build_export_query(
+    user_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+):
+    c = processed_agent_data.c
+    query = select(*(c[field.name] for field in EXPORT_SCHEMA))
+    if user_id is not None:
+        query = query.where(c.user_id == user_id)
+    if since is not None:
+        query = query.where(c.timestamp >= since)
+    if until is not None:
+        query = query.where(c.timestamp <= until)
+    if bbox is not None:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        query = query.where(c.longitude.between(min_lon, max_lon), c.latitude.between(min_lat, max_lat))
+    return query.order_by(c.timestamp)
+
+
+def iter_record_batches(query, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[pa.RecordBatch]:
+    """Read the query through a server-side cursor, batch_size rows at a time"""
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(query)
+        for rows in result.partitions():
+            columns = list(zip(*rows))
+            yield pa.RecordBatch.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, EXPORT_SCHEMA)],
+                schema=EXPORT_SCHEMA,
+            )
+
+
+def stream_export(query, export_format: str, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """
+    Encode query results as an Arrow IPC stream or a Parquet file.
+    Every batch is yielded as soon as it is encoded, so memory use depends on
+    batch_size and not on the number of exported rows.
+    """
+    sink = ChunkSink()
+    if export_format == "parquet":
+        writer = pq.ParquetWriter(sink, EXPORT_SCHEMA, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(sink, EXPORT_SCHEMA)
+    for batch in iter_record_batches(query, batch_size):
+        writer.write_batch(batch)
+        chunk = sink.take()
+        if chunk:
+            yield chunk
+    writer.close()
+    yield sink.take()
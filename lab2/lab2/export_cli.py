@@ -0,0 +1,35 @@
+import argparse
+from datetime import datetime
+from export import EXPORT_FORMATS, build_export_query, stream_export
+from config import EXPORT_BATCH_SIZE
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export processed agent data as Arrow IPC or Parquet")
+    parser.add_argument("output", help="Output file")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="parquet")
+    parser.add_argument("--user-id", type=int)
+    parser.add_argument("--since", type=datetime.fromisoformat, help="ISO 8601 timestamp")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="ISO 8601 timestamp")
+    parser.add_argument(
+        "--bbox",
+        type=lambda value: tuple(float(part) for part in value.split(",")),
+        help="min_lon,min_lat,max_lon,max_lat",
+    )
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    return parser.parse_args()
+
+
+def run():
+    args = parse_args()
+    query = build_export_query(user_id=args.user_id, since=args.since, until=args.until, bbox=args.bbox)
+    size = 0
+    with open(args.output, "wb") as output:
+        for chunk in stream_export(query, args.format, args.batch_size):
+            output.write(chunk)
+            size += len(chunk)
+    print(f"Exported {size} bytes to {args.output}")
+
+
+if __name__ == "__main__":
+    run()
@@ -1,127 +1,204 @@
 import asyncio
-import json
-from typing import Set, Dict, List, Any
+import time
+from typing import Dict, List, Optional
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Body
-from sqlalchemy import (
-    create_engine,
-    MetaData,
-    Table,
-    Column,
-    Integer,
-    String,
-    Float,
-    DateTime,
-)
-from sqlalchemy.orm import sessionmaker
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.sql import select, update, delete
 from datetime import datetime
-from pydantic import BaseModel, field_validator
-from config import (
-    POSTGRES_HOST,
-    POSTGRES_PORT,
-    POSTGRES_DB,
-    POSTGRES_USER,
-    POSTGRES_PASSWORD,
+from types import SimpleNamespace
+from database import engine, metadata, processed_agent_data, SessionLocal, row_to_dict
+from schemas import (
+    ProcessedAgentDataInDB,
+    ProcessedAgentData,
+    ProcessedAgentDataFilter,
+    ProcessedAgentDataBulkUpdate,
 )
+from serialization import json_response, rows_to_dicts
+from rollups import apply_rollups, query_grid
+from defects import apply_defects, query_defects
+from subscriptions import SubscriptionManager, group_by_user
+from broadcast import create_broadcast
+from catchup import replay
+from cache import create_cache
+from partitions import prepare_partitions, run_partition_job
+from export import EXPORT_FORMATS, build_export_query, stream_export
+from archive import ArchiveSink, ArchiveQuery
+from tracing import record
+import metrics
+import profiling
+from config import ARCHIVE_ENABLED, PROFILING_ENABLED, WS_MAX_USER_IDS
 
 # FastAPI app setup
 app = FastAPI()
-# SQLAlchemy setup
-DATABASE_URL = f"postgresql+psycopg2://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
-engine = create_engine(DATABASE_URL)
-metadata = MetaData()
-# Define the ProcessedAgentData table
-processed_agent_data = Table(
-    "processed_agent_data",
-    metadata,
-    Column("id", Integer, primary_key=True, index=True),
-    Column("road_state", String),
-    Column("user_id", Integer),
-    Column("x", Float),
-    Column("y", Float),
-    Column("z", Float),
-    Column("latitude", Float),
-    Column("longitude", Float),
-    Column("timestamp", DateTime),
-)
+if PROFILING_ENABLED:
+    profiling.install(app)
 
 metadata.create_all(engine)
+prepare_partitions()
 
-SessionLocal = sessionmaker(bind=engine)
 
+# WebSocket subscriptions
+subscriptions = SubscriptionManager()
+# Delivers inserts to the subscribers of every store worker
+broadcast = create_broadcast(engine)
 
-# SQLAlchemy model
-class ProcessedAgentDataInDB(BaseModel):
-    id: int
-    road_state: str
-    user_id: int
-    x: float
-    y: float
-    z: float
-    latitude: float
-    longitude: float
-    timestamp: datetime
 
+@app.on_event("startup")
+async def start_broadcast():
+    await broadcast.start(subscriptions.send)
 
-# FastAPI models
-class AccelerometerData(BaseModel):
-    x: float
-    y: float
-    z: float
 
+@app.on_event("startup")
+async def start_partition_job():
+    # Creates partitions ahead, downsamples and drops old ones
+    app.state.partition_job = asyncio.create_task(run_partition_job())
 
-class GpsData(BaseModel):
-    latitude: float
-    longitude: float
 
+@app.on_event("shutdown")
+async def stop_broadcast():
+    await broadcast.stop()
 
-class AgentData(BaseModel):
-    user_id: int
-    accelerometer: AccelerometerData
-    gps: GpsData
-    timestamp: datetime
 
-    @classmethod
-    @field_validator("timestamp", mode="before")
-    def check_timestamp(cls, value):
-        if isinstance(value, datetime):
-            return value
-        try:
-            return datetime.fromisoformat(value)
-        except (TypeError, ValueError):
-            raise ValueError(
-                "Invalid timestamp format. Expected ISO 8601 format (YYYY-MM-DDTHH:MM:SSZ)."
-            )
+# Parquet copy of ingested rows for analytical queries, off the PostgreSQL path
+archive = ArchiveSink() if ARCHIVE_ENABLED else None
+archive_query = ArchiveQuery()
 
 
-class ProcessedAgentData(BaseModel):
-    road_state: str
-    agent_data: AgentData
+@app.on_event("startup")
+def start_archive():
+    if archive is not None:
+        archive.start()
 
 
-# WebSocket subscriptions
-subscriptions: Dict[int, Set[WebSocket]] = {}
+@app.on_event("shutdown")
+def stop_archive():
+    if archive is not None:
+        archive.stop()
 
 
-# FastAPI WebSocket endpoint
-@app.websocket("/ws/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: int):
-    await websocket.accept()
-    if user_id not in subscriptions:
-        subscriptions[user_id] = set()
-    subscriptions[user_id].add(websocket)
+async def serve_subscriber(
+    websocket: WebSocket,
+    user_ids: List[int],
+    since_ids: Dict[int, Optional[int]],
+    since_ts: Optional[datetime],
+):
+    # Live frames are held while missed rows are replayed, so the client
+    # gets no gaps and no duplicates
+    resume = since_ts is not None or any(since_id is not None for since_id in since_ids.values())
+    subscriber = subscriptions.connect(websocket, user_ids, paused=resume)
     try:
+        # Inside try, a subscribe fails if the listener connection drops
+        for user_id in user_ids:
+            if user_id not in broadcast.channels:
+                await broadcast.subscribe(user_id)
+        if resume:
+            replayed = {}
+            for user_id in user_ids:
+                replayed[user_id] = await replay(websocket, user_id, since_ids.get(user_id), since_ts)
+            subscriber.resume(replayed)
         while True:
             await websocket.receive_text()
     except WebSocketDisconnect:
-        subscriptions[user_id].remove(websocket)
+        pass
+    finally:
+        subscriptions.disconnect(subscriber)
+        for user_id in user_ids:
+            if not subscriptions.has_subscribers(user_id) and user_id in broadcast.channels:
+                await broadcast.unsubscribe(user_id)
+
+
+# FastAPI WebSocket endpoint
+@app.websocket("/ws/{user_id}")
+async def websocket_endpoint(
+    websocket: WebSocket,
+    user_id: int,
+    since_id: Optional[int] = None,
+    since_ts: Optional[datetime] = None,
+):
+    await websocket.accept()
+    await serve_subscriber(websocket, [user_id], {user_id: since_id}, since_ts)
+
+
+def parse_ids(value: Optional[str]) -> List[Optional[int]]:
+    """Parse a comma separated list of ids, empty items stand for None"""
+    if not value:
+        return []
+    return [int(item) if item.strip() else None for item in value.split(",")]
+
+
+# Several users over one WebSocket, e.g. /ws?user_ids=1,2&since_ids=10,
+@app.websocket("/ws")
+async def multi_user_websocket_endpoint(
+    websocket: WebSocket,
+    user_ids: str,
+    since_ids: Optional[str] = None,
+    since_id: Optional[int] = None,
+    since_ts: Optional[datetime] = None,
+):
+    await websocket.accept()
+    try:
+        ids = parse_ids(user_ids)
+        resume_ids = parse_ids(since_ids) if since_ids is not None else [since_id] * len(ids)
+    except ValueError:
+        ids, resume_ids = [], []
+    if not ids or None in ids or len(ids) > WS_MAX_USER_IDS or len(resume_ids) != len(ids):
+        # 1008: policy violation
+        await websocket.close(code=1008)
+        return
+    resume_from = dict(zip(ids, resume_ids))
+    await serve_subscriber(websocket, list(resume_from), resume_from, since_ts)
 
 
 # Function to send data to subscribed users
-async def send_data_to_subscribers(user_id: int, data):
-    if user_id in subscriptions:
-        for websocket in subscriptions[user_id]:
-            await websocket.send_json(json.dumps(data))
+async def send_data_to_subscribers(data: List[dict]):
+    # One frame per user, fanned out by every worker to its own subscribers
+    for user_id, payloads in group_by_user(data).items():
+        await broadcast.publish(user_id, payloads)
+
+
+# Read-through cache of by-id lookups, list windows and the road quality grid
+cache = create_cache()
+
+
+# Metrics, counts kept by other objects are read on scrape
+INSERT_SECONDS = metrics.histogram("store_insert_seconds", "Duration of inserting a batch with its rollups")
+INSERT_BATCH_SIZE = metrics.histogram(
+    "store_insert_batch_size", "Rows per inserted batch", buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+)
+INSERTED_ROWS = metrics.counter("store_inserted_rows_total", "Rows inserted into processed_agent_data")
+metrics.gauge("store_websocket_subscribers", "Connected WebSocket subscribers", function=subscriptions.count)
+for name in ("hits", "misses", "evictions", "invalidations"):
+    metrics.counter(
+        f"store_cache_{name}_total", f"Read-through cache {name}", function=lambda name=name: getattr(cache, name)
+    )
+if archive is not None:
+    metrics.counter(
+        "store_archive_dropped_rows_total", "Rows not archived because of a full queue", function=lambda: archive.dropped
+    )
+
+
+@app.get("/metrics")
+def read_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+def invalidate_cache(rows, changed: bool = True, defects_changed: bool = False):
+    # Drop every cached query that could contain the rows. Changed (updated or
+    # deleted) rows bump their own generation instead of deleting their keys: a
+    # read that fetched the old row before the commit sets it under the old
+    # generation, where it is never read again
+    scopes = {"all", "grid", *(f"user:{row.user_id}" for row in rows)}
+    if changed:
+        scopes.update(f"row:{row.id}" for row in rows)
+    if defects_changed:
+        scopes.add("defects")
+    for scope in scopes:
+        cache.bump(scope)
+
+
+@app.get("/cache/stats")
+def read_cache_stats():
+    return cache.stats()
 
 
 # FastAPI CRUDL endpoints
@@ -131,39 +208,53 @@ async def send_data_to_subscribers(user_id: int, data):
 async def create_processed_agent_data(data: List[ProcessedAgentData]):
     # Insert data to database
     # Send data to subscribers
+    if not data:
+        return
+    received = time.monotonic_ns()
+    for item in data:
+        record(item.agent_data.trace, "store.receive", received)
+    started = time.perf_counter()
     with SessionLocal() as db:
-        for item in data:
-            try:
-                query = processed_agent_data.insert().values(
-                    road_state=item.road_state,
-                    user_id=item.agent_data.user_id,
-                    x=item.agent_data.accelerometer.x,
-                    y=item.agent_data.accelerometer.y,
-                    z=item.agent_data.accelerometer.z,
-                    latitude=item.agent_data.gps.latitude,
-                    longitude=item.agent_data.gps.longitude,
-                    timestamp=item.agent_data.timestamp
-                )
-
-                result = db.execute(query)
-                db.commit()
-
-                # Формуємо те, що хочемо надіслати
-                payload = {
-                    "road_state": item.road_state,
-                    "user_id": item.agent_data.user_id,
-                    "x": item.agent_data.accelerometer.x,
-                    "y": item.agent_data.accelerometer.y,
-                    "z": item.agent_data.accelerometer.z,
-                    "latitude": item.agent_data.gps.latitude,
-                    "longitude": item.agent_data.gps.longitude,
-                    "timestamp": item.agent_data.timestamp.isoformat(),
-                }
-
-                await send_data_to_subscribers(item.agent_data.user_id, [payload])
-            except Exception as e:
-                db.rollback()
-                raise e
+        try:
+            query = processed_agent_data.insert().values(
+                [
+                    dict(
+                        road_state=item.road_state,
+                        user_id=item.agent_data.user_id,
+                        x=item.agent_data.accelerometer.x,
+                        y=item.agent_data.accelerometer.y,
+                        z=item.agent_data.accelerometer.z,
+                        latitude=item.agent_data.gps.latitude,
+                        longitude=item.agent_data.gps.longitude,
+                        timestamp=item.agent_data.timestamp,
+                    )
+                    for item in data
+                ]
+            ).returning(processed_agent_data)
+            rows = db.execute(query).fetchall()
+            apply_rollups(db, rows)
+            defects_changed = apply_defects(db, rows)
+            db.commit()
+            inserted = time.monotonic_ns()
+        except Exception as e:
+            db.rollback()
+            raise e
+    INSERT_SECONDS.observe(time.perf_counter() - started)
+    INSERT_BATCH_SIZE.observe(len(rows))
+    INSERTED_ROWS.inc(len(rows))
+    # New ids, no cached row to invalidate
+    invalidate_cache(rows, changed=False, defects_changed=defects_changed)
+    if archive is not None:
+        archive.append([dict(row._mapping) for row in rows])
+
+    # Формуємо те, що хочемо надіслати
+    payloads = [row_to_dict(row) for row in rows]
+    # RETURNING keeps the order of the inserted values
+    for item, payload in zip(data, payloads):
+        if item.agent_data.trace is not None:
+            record(item.agent_data.trace, "store.insert", inserted)
+            payload["trace"] = item.agent_data.trace.model_dump()
+    await send_data_to_subscribers(payloads)
 
 
 @app.get(
@@ -172,21 +263,102 @@ async def create_processed_agent_data(data: List[ProcessedAgentData]):
 )
 def read_processed_agent_data(processed_agent_data_id: int):
     # Get data by id
+    key = cache.key(f"row:{processed_agent_data_id}")
+    cached = cache.get(key)
+    if cached is not None:
+        return json_response(cached)
     with SessionLocal() as session:
         query = select(processed_agent_data).where(processed_agent_data.c.id == processed_agent_data_id)
         result = session.execute(query).first()
         if not result:
             raise HTTPException(status_code=404, detail="Data not found")
-        return result
+        result = row_to_dict(result)
+        cache.set(key, result)
+        return json_response(result)
 
 
 @app.get("/processed_agent_data/", response_model=list[ProcessedAgentDataInDB])
-def list_processed_agent_data():
+def list_processed_agent_data(
+    user_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None,
+):
     # Get list of data
+    # Only bounded windows are cached, a full listing would not fit the cache
+    key = None
+    if limit is not None:
+        scope = "all" if user_id is None else f"user:{user_id}"
+        key = cache.key(scope, "list", since, until, after_id, limit)
+        cached = cache.get(key)
+        if cached is not None:
+            return json_response(cached)
     with SessionLocal() as session:
         query = select(processed_agent_data)
+        if user_id is not None:
+            query = query.where(processed_agent_data.c.user_id == user_id)
+        if since is not None:
+            query = query.where(processed_agent_data.c.timestamp >= since)
+        if until is not None:
+            query = query.where(processed_agent_data.c.timestamp <= until)
+        if after_id is not None:
+            query = query.where(processed_agent_data.c.id > after_id)
+        if after_id is not None or limit is not None:
+            query = query.order_by(processed_agent_data.c.id).limit(limit)
         result = session.execute(query).fetchall()
-        return result
+        if key is None:
+            return json_response(rows_to_dicts(result))
+        result = [row_to_dict(row) for row in result]
+        cache.set(key, result)
+        return json_response(result)
+
+
+# Columns of the old row returned by UPDATE, enough for rollups and the cache
+OLD_COLUMNS = ("id", "user_id", "road_state", "z", "latitude", "longitude", "timestamp")
+
+
+def filter_conditions(data_filter: ProcessedAgentDataFilter) -> list:
+    c = processed_agent_data.c
+    conditions = []
+    if data_filter.ids is not None:
+        conditions.append(c.id.in_(data_filter.ids))
+    if data_filter.user_id is not None:
+        conditions.append(c.user_id == data_filter.user_id)
+    if data_filter.since is not None:
+        conditions.append(c.timestamp >= data_filter.since)
+    if data_filter.until is not None:
+        conditions.append(c.timestamp <= data_filter.until)
+    if not conditions:
+        raise HTTPException(status_code=422, detail="Filter must not be empty")
+    return conditions
+
+
+def update_returning(session, conditions: list, values: dict):
+    """
+    Update matching rows in one UPDATE ... FROM ... RETURNING statement.
+    Returns (old rows, new rows), the old values come from the locked
+    subquery so no extra SELECT is needed for the rollups.
+    """
+    c = processed_agent_data.c
+    old = (
+        select(*(c[name] for name in OLD_COLUMNS))
+        .where(*conditions)
+        .with_for_update()
+        .subquery("old")
+    )
+    query = (
+        update(processed_agent_data)
+        .where(c.id == old.c.id, c.timestamp == old.c.timestamp)
+        .values(**values)
+        .returning(*c, *(old.c[name].label(f"old_{name}") for name in OLD_COLUMNS))
+    )
+    old_rows, new_rows = [], []
+    for row in session.execute(query):
+        mapping = row._mapping
+        old_rows.append(SimpleNamespace(**{name: mapping[f"old_{name}"] for name in OLD_COLUMNS}))
+        new_rows.append(SimpleNamespace(**{column.name: mapping[column] for column in c}))
+    return old_rows, new_rows
 
 
 @app.put(
@@ -196,22 +368,28 @@ def list_processed_agent_data():
 def update_processed_agent_data(processed_agent_data_id: int, data: ProcessedAgentData):
     # Update data
     with SessionLocal() as session:
-        query = update(processed_agent_data).where(processed_agent_data.c.id == processed_agent_data_id).values(
-            road_state=data.road_state,
-            user_id=data.agent_data.user_id,
-            x=data.agent_data.accelerometer.x,
-            y=data.agent_data.accelerometer.y,
-            z=data.agent_data.accelerometer.z,
-            latitude=data.agent_data.gps.latitude,
-            longitude=data.agent_data.gps.longitude,
-            timestamp=data.agent_data.timestamp
+        old_rows, new_rows = update_returning(
+            session,
+            [processed_agent_data.c.id == processed_agent_data_id],
+            dict(
+                road_state=data.road_state,
+                user_id=data.agent_data.user_id,
+                x=data.agent_data.accelerometer.x,
+                y=data.agent_data.accelerometer.y,
+                z=data.agent_data.accelerometer.z,
+                latitude=data.agent_data.gps.latitude,
+                longitude=data.agent_data.gps.longitude,
+                timestamp=data.agent_data.timestamp,
+            ),
         )
-        result = session.execute(query)
-        if not result:
+        if not new_rows:
             raise HTTPException(status_code=404, detail="Data not found")
+        apply_rollups(session, old_rows, sign=-1)
+        apply_rollups(session, new_rows)
+        defects_changed = apply_defects(session, old_rows, sign=-1) | apply_defects(session, new_rows)
         session.commit()
-        updated = select(processed_agent_data).where(processed_agent_data.c.id == processed_agent_data_id)
-        return session.execute(updated).first()
+        invalidate_cache(old_rows + new_rows, defects_changed=defects_changed)
+        return json_response(vars(new_rows[0]))
 
 
 @app.delete(
@@ -221,14 +399,150 @@ def update_processed_agent_data(processed_agent_data_id: int, data: ProcessedAge
 def delete_processed_agent_data(processed_agent_data_id: int):
     # Delete by id
     with SessionLocal() as session:
-        to_delete = select(processed_agent_data).where(processed_agent_data.c.id == processed_agent_data_id)
-        obj_to_delete = session.execute(to_delete).first()
-        query = delete(processed_agent_data).where(processed_agent_data.c.id == processed_agent_data_id)
-        result = session.execute(query)
-        if not result:
+        query = (
+            delete(processed_agent_data)
+            .where(processed_agent_data.c.id == processed_agent_data_id)
+            .returning(processed_agent_data)
+        )
+        deleted = session.execute(query).fetchall()
+        if not deleted:
             raise HTTPException(status_code=404, detail="Data not found")
+        apply_rollups(session, deleted, sign=-1)
+        defects_changed = apply_defects(session, deleted, sign=-1)
+        session.commit()
+        invalidate_cache(deleted, defects_changed=defects_changed)
+        return json_response(rows_to_dicts(deleted)[0])
+
+
+@app.patch("/processed_agent_data/", response_model=list[ProcessedAgentDataInDB])
+def bulk_update_processed_agent_data(data: ProcessedAgentDataBulkUpdate):
+    # Update every row matching the filter in one statement
+    values = data.values.model_dump(exclude_none=True)
+    if not values:
+        raise HTTPException(status_code=422, detail="Values must not be empty")
+    with SessionLocal() as session:
+        old_rows, new_rows = update_returning(session, filter_conditions(data.filter), values)
+        apply_rollups(session, old_rows, sign=-1)
+        apply_rollups(session, new_rows)
+        defects_changed = apply_defects(session, old_rows, sign=-1) | apply_defects(session, new_rows)
         session.commit()
-        return obj_to_delete
+    invalidate_cache(old_rows + new_rows, defects_changed=defects_changed)
+    return json_response([vars(row) for row in new_rows])
+
+
+@app.delete("/processed_agent_data/", response_model=list[ProcessedAgentDataInDB])
+def bulk_delete_processed_agent_data(data_filter: ProcessedAgentDataFilter = Body(...)):
+    # Delete every row matching the filter in one statement
+    with SessionLocal() as session:
+        query = delete(processed_agent_data).where(*filter_conditions(data_filter)).returning(processed_agent_data)
+        deleted = session.execute(query).fetchall()
+        apply_rollups(session, deleted, sign=-1)
+        defects_changed = apply_defects(session, deleted, sign=-1)
+        session.commit()
+    invalidate_cache(deleted, defects_changed=defects_changed)
+    return json_response(rows_to_dicts(deleted))
+
+
+def parse_bbox(bbox: Optional[str]):
+    """Parse `min_lon,min_lat,max_lon,max_lat` query parameter"""
+    if bbox is None:
+        return None
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(
+            status_code=422,
+            detail="Invalid bbox format. Expected min_lon,min_lat,max_lon,max_lat.",
+        )
+    return min_lon, min_lat, max_lon, max_lat
+
+
+@app.get("/road_quality/grid")
+def read_road_quality_grid(
+    zoom: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    bbox: Optional[str] = None,
+):
+    # Heat map of road quality from the rollups
+    if zoom < 0:
+        raise HTTPException(status_code=422, detail="Zoom must not be negative")
+    key = cache.key("grid", zoom, since, until, bbox)
+    cached = cache.get(key)
+    if cached is not None:
+        return json_response(cached)
+    with SessionLocal() as session:
+        grid = query_grid(session, zoom, since=since, until=until, bbox=parse_bbox(bbox))
+    cache.set(key, grid)
+    return json_response(grid)
+
+
+@app.get("/road_defects")
+def read_road_defects(
+    min_confidence: float = 0.0,
+    since: Optional[datetime] = None,
+    bbox: Optional[str] = None,
+    limit: Optional[int] = None,
+):
+    # Deduplicated potholes from road_defects, raw detections are not scanned
+    key = cache.key("defects", min_confidence, since, bbox, limit)
+    cached = cache.get(key)
+    if cached is not None:
+        return json_response(cached)
+    with SessionLocal() as session:
+        defects = query_defects(session, min_confidence, since=since, bbox=parse_bbox(bbox), limit=limit)
+    cache.set(key, defects)
+    return json_response(defects)
+
+
+@app.get("/export/processed_agent_data")
+def export_processed_agent_data(
+    format: str = "parquet",
+    user_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    bbox: Optional[str] = None,
+):
+    # Stream rows as Arrow IPC or Parquet, batch by batch
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=422, detail=f"Format must be one of: {', '.join(EXPORT_FORMATS)}")
+    query = build_export_query(user_id=user_id, since=since, until=until, bbox=parse_bbox(bbox))
+    return StreamingResponse(
+        stream_export(query, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f"attachment; filename=processed_agent_data.{format}"},
+    )
+
+
+def require_archive():
+    if not ARCHIVE_ENABLED:
+        raise HTTPException(status_code=404, detail="Archive is disabled")
+
+
+@app.get("/archive/road_quality")
+def read_archive_road_quality(
+    zoom: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    bbox: Optional[str] = None,
+):
+    # Road quality per tile over the whole archive, computed by DuckDB
+    require_archive()
+    if zoom < 0:
+        raise HTTPException(status_code=422, detail="Zoom must not be negative")
+    return archive_query.road_quality(zoom, since=since, until=until, bbox=parse_bbox(bbox))
+
+
+@app.get("/archive/daily")
+def read_archive_daily(
+    user_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    bbox: Optional[str] = None,
+):
+    # Samples and road states per user and day from the archive
+    require_archive()
+    return archive_query.daily(user_id=user_id, since=since, until=until, bbox=parse_bbox(bbox))
 
 
 if __name__ == "__main__":
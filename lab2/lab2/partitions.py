@@ -0,0 +1,303 @@
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from typing import List
+from sqlalchemy import (
+    Table,
+    Column,
+    Integer,
+    Float,
+    String,
+    DateTime,
+    PrimaryKeyConstraint,
+    text,
+)
+from sqlalchemy.sql import select
+from starlette.concurrency import run_in_threadpool
+from database import engine, metadata
+from config import (
+    ROLLUP_ZOOM,
+    PARTITION_DAYS_AHEAD,
+    DOWNSAMPLE_AFTER_DAYS,
+    RETENTION_DAYS,
+    PARTITION_JOB_INTERVAL,
+)
+
+PARENT_TABLE = "processed_agent_data"
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+# Advisory lock id of the maintenance job
+MAINTENANCE_LOCK = 310001
+
+# Per-minute summaries of raw partitions, kept after the raw rows are dropped
+processed_agent_data_minutely = Table(
+    "processed_agent_data_minutely",
+    metadata,
+    Column("user_id", Integer, nullable=False),
+    Column("tile_x", Integer, nullable=False),
+    Column("tile_y", Integer, nullable=False),
+    Column("minute", DateTime, nullable=False),
+    Column("count", Integer, nullable=False),
+    Column("normal_count", Integer, nullable=False),
+    Column("small_pits_count", Integer, nullable=False),
+    Column("large_pits_count", Integer, nullable=False),
+    Column("z_sum", Float, nullable=False),
+    Column("z_sq_sum", Float, nullable=False),
+    Column("latitude", Float, nullable=False),
+    Column("longitude", Float, nullable=False),
+    PrimaryKeyConstraint("user_id", "tile_x", "tile_y", "minute"),
+)
+
+# Partitions already rolled up into processed_agent_data_minutely
+downsampled_partitions = Table(
+    "downsampled_partitions",
+    metadata,
+    Column("partition_name", String, primary_key=True),
+    Column("downsampled_at", DateTime, nullable=False),
+    # Rows and highest id of the partition when it was downsampled, the
+    # partition is downsampled again if late rows change them
+    Column("row_count", Integer),
+    Column("max_id", Integer),
+)
+
+DOWNSAMPLE_QUERY = """
+INSERT INTO processed_agent_data_minutely AS m
+SELECT
+    user_id,
+    floor((longitude + 180.0) / 360.0 * :n)::int AS tile_x,
+    floor((1.0 - ln(tan(radians(lat)) + 1.0 / cos(radians(lat))) / pi()) / 2.0 * :n)::int AS tile_y,
+    date_trunc('minute', timestamp) AS minute,
+    count(*),
+    count(*) FILTER (WHERE road_state = 'normal'),
+    count(*) FILTER (WHERE road_state = 'small pits'),
+    count(*) FILTER (WHERE road_state = 'large pits'),
+    coalesce(sum(z), 0),
+    coalesce(sum(z * z), 0),
+    avg(latitude),
+    avg(longitude)
+FROM (
+    SELECT *, greatest(-85.0511, least(85.0511, latitude)) AS lat FROM {partition}
+    WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+) AS raw
+GROUP BY 1, 2, 3, 4
+ON CONFLICT (user_id, tile_x, tile_y, minute) DO UPDATE SET
+    count = m.count + excluded.count,
+    normal_count = m.normal_count + excluded.normal_count,
+    small_pits_count = m.small_pits_count + excluded.small_pits_count,
+    large_pits_count = m.large_pits_count + excluded.large_pits_count,
+    z_sum = m.z_sum + excluded.z_sum,
+    z_sq_sum = m.z_sq_sum + excluded.z_sq_sum,
+    latitude = (m.latitude * m.count + excluded.latitude * excluded.count) / (m.count + excluded.count),
+    longitude = (m.longitude * m.count + excluded.longitude * excluded.count) / (m.count + excluded.count)
+"""
+
+
+def partition_name(day: date) -> str:
+    return f"{PARENT_TABLE}_{day:%Y%m%d}"
+
+
+def partition_day(name: str):
+    try:
+        return datetime.strptime(name.rsplit("_", 1)[1], "%Y%m%d").date()
+    except (IndexError, ValueError):
+        # Default partition
+        return None
+
+
+def is_partitioned(connection) -> bool:
+    query = text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :table"
+    )
+    return connection.execute(query, {"table": PARENT_TABLE}).first() is not None
+
+
+def list_partitions(connection) -> List[str]:
+    query = text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table"
+    )
+    return [row[0] for row in connection.execute(query, {"table": PARENT_TABLE})]
+
+
+def default_partition_days(connection, until: date) -> List[date]:
+    """Days before `until` that have rows in the default partition"""
+    query = text(
+        f"SELECT DISTINCT CAST(date_trunc('day', timestamp) AS date) FROM {DEFAULT_PARTITION} "
+        "WHERE timestamp < :until"
+    )
+    return [row[0] for row in connection.execute(query, {"until": until})]
+
+
+def create_partition(connection, day: date, move_default: bool = False):
+    """
+    Create the partition of the day. With move_default, the rows of the day
+    are moved out of the default partition first, PostgreSQL refuses to
+    create a partition whose rows are in the default partition.
+    """
+    name = partition_name(day)
+    bounds = f"FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+    if not move_default:
+        connection.execute(text(f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} FOR VALUES {bounds}"))
+        return
+    connection.execute(text(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    moved = connection.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+            "WHERE timestamp >= :start AND timestamp < :end RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ),
+        {"start": day, "end": day + timedelta(days=1)},
+    ).rowcount
+    connection.execute(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES {bounds}"))
+    logging.info(f"Moved {moved} rows from {DEFAULT_PARTITION} to {name}")
+
+
+def fold_default_rows(connection, day: date):
+    """
+    Add the rows of a day whose partition was already dropped from the
+    default partition to the per-minute summaries and delete them.
+    """
+    bounds = {"start": day, "end": day + timedelta(days=1)}
+    late = f"(SELECT * FROM {DEFAULT_PARTITION} WHERE timestamp >= :start AND timestamp < :end) AS late"
+    connection.execute(text(DOWNSAMPLE_QUERY.format(partition=late)), {"n": 1 << ROLLUP_ZOOM, **bounds})
+    deleted = connection.execute(
+        text(f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp >= :start AND timestamp < :end"), bounds
+    ).rowcount
+    logging.info(f"Downsampled {deleted} late rows of dropped partition {partition_name(day)}")
+
+
+def ensure_partitions(connection, today: date):
+    """
+    Create the default partition and daily partitions up to PARTITION_DAYS_AHEAD.
+    Rows of earlier days in the default partition get a partition too, so
+    they are downsampled and dropped like all others; rows that arrived after
+    the partition of their day was dropped are downsampled right away. Rows
+    further ahead stay in the default partition until their day is in range.
+    """
+    connection.execute(
+        text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT")
+    )
+    existing = set(list_partitions(connection))
+    until = today + timedelta(days=PARTITION_DAYS_AHEAD + 1)
+    in_default = set(default_partition_days(connection, until))
+    days = in_default | {today + timedelta(days=offset) for offset in range(PARTITION_DAYS_AHEAD + 1)}
+    downsampled = {
+        row[0]
+        for row in connection.execute(
+            select(downsampled_partitions.c.partition_name).where(
+                downsampled_partitions.c.partition_name.in_([partition_name(day) for day in in_default])
+            )
+        )
+    }
+    for day in sorted(days):
+        name = partition_name(day)
+        if name in existing:
+            continue
+        try:
+            with connection.begin_nested():
+                if name in downsampled:
+                    # Dropped already, its summaries are all that is kept of the day
+                    fold_default_rows(connection, day)
+                    continue
+                create_partition(connection, day, move_default=day in in_default)
+            logging.info(f"Created partition {name}")
+        except Exception as e:
+            logging.error(f"Failed to create partition {name}: {e}")
+
+
+def prepare_partitions(today: date = None):
+    """
+    Create the default partition and the partitions ahead before the first
+    insert, a partitioned table without partitions rejects every row.
+    """
+    today = today or datetime.utcnow().date()
+    with engine.begin() as connection:
+        if not is_partitioned(connection):
+            return
+        # Waits for a store worker that is maintaining partitions
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MAINTENANCE_LOCK})
+        ensure_partitions(connection, today)
+
+
+def downsample_partition(connection, name: str):
+    """
+    Roll the partition up into per-minute summaries. Summary minutes never
+    span two partitions, so the summaries of the day are replaced; that
+    runs again whenever late rows were inserted into (or rows deleted from)
+    the partition since.
+    """
+    row_count, max_id = connection.execute(text(f"SELECT count(*), max(id) FROM {name}")).one()
+    done = connection.execute(
+        downsampled_partitions.select().where(downsampled_partitions.c.partition_name == name)
+    ).first()
+    if done and (done.row_count, done.max_id) == (row_count, max_id):
+        return
+    day = partition_day(name)
+    minutely = processed_agent_data_minutely.c
+    connection.execute(
+        processed_agent_data_minutely.delete().where(
+            minutely.minute >= day, minutely.minute < day + timedelta(days=1)
+        )
+    )
+    connection.execute(text(DOWNSAMPLE_QUERY.format(partition=name)), {"n": 1 << ROLLUP_ZOOM})
+    values = dict(downsampled_at=datetime.utcnow(), row_count=row_count, max_id=max_id)
+    if done:
+        connection.execute(
+            downsampled_partitions.update()
+            .where(downsampled_partitions.c.partition_name == name)
+            .values(**values)
+        )
+    else:
+        connection.execute(downsampled_partitions.insert().values(partition_name=name, **values))
+    logging.info(f"Downsampled partition {name}")
+
+
+def drop_partition(connection, name: str):
+    """Detach and drop the whole partition, no per-row deletes or vacuum"""
+    connection.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+    connection.execute(text(f"DROP TABLE {name}"))
+    logging.info(f"Dropped partition {name}")
+
+
+def maintain_partitions(today: date = None):
+    today = today or datetime.utcnow().date()
+    with engine.connect() as lock_connection:
+        # Only one store worker maintains partitions at a time
+        locked = lock_connection.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": MAINTENANCE_LOCK}
+        ).scalar()
+        if not locked:
+            return
+        try:
+            with engine.begin() as connection:
+                if not is_partitioned(connection):
+                    logging.warning(f"{PARENT_TABLE} is not partitioned, skip partition maintenance")
+                    return
+                ensure_partitions(connection, today)
+                partitions = sorted(list_partitions(connection))
+            for name in partitions:
+                day = partition_day(name)
+                if day is None:
+                    continue
+                age = (today - day).days
+                # Every partition gets its own transaction, a failure keeps the others
+                with engine.begin() as connection:
+                    # Also right before the drop, for rows that came late
+                    if age > DOWNSAMPLE_AFTER_DAYS:
+                        downsample_partition(connection, name)
+                    if age > RETENTION_DAYS:
+                        drop_partition(connection, name)
+        finally:
+            lock_connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MAINTENANCE_LOCK})
+
+
+async def run_partition_job():
+    """Background partition maintenance, runs until cancelled"""
+    while True:
+        try:
+            await run_in_threadpool(maintain_partitions)
+        except Exception as e:
+            logging.error(f"Partition maintenance failed: {e}")
+        await asyncio.sleep(PARTITION_JOB_INTERVAL)
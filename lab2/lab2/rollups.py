@@ -0,0 +1,157 @@
+from datetime import datetime, timedelta, timezone
+from math import radians, log, tan, cos, pi, sqrt
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import (
+    Table,
+    Column,
+    Integer,
+    Float,
+    DateTime,
+    PrimaryKeyConstraint,
+    func,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql import select
+from database import metadata
+from config import ROLLUP_ZOOM, ROLLUP_BUCKET_SECONDS
+
+# Road states produced by the edge, every other state only goes to `count`
+ROAD_STATE_COLUMNS = {
+    "normal": "normal_count",
+    "small pits": "small_pits_count",
+    "large pits": "large_pits_count",
+}
+COUNTER_COLUMNS = ["count", *ROAD_STATE_COLUMNS.values(), "z_sum", "z_sq_sum"]
+
+# Rollups per (tile at ROLLUP_ZOOM, time bucket)
+road_quality_rollups = Table(
+    "road_quality_rollups",
+    metadata,
+    Column("tile_x", Integer, nullable=False),
+    Column("tile_y", Integer, nullable=False),
+    Column("bucket", DateTime, nullable=False),
+    Column("count", Integer, nullable=False, default=0),
+    Column("normal_count", Integer, nullable=False, default=0),
+    Column("small_pits_count", Integer, nullable=False, default=0),
+    Column("large_pits_count", Integer, nullable=False, default=0),
+    Column("z_sum", Float, nullable=False, default=0),
+    Column("z_sq_sum", Float, nullable=False, default=0),
+    PrimaryKeyConstraint("tile_x", "tile_y", "bucket"),
+)
+
+MAX_LATITUDE = 85.0511287798
+EPOCH = datetime(1970, 1, 1)
+
+
+def tile_xy(latitude: float, longitude: float, zoom: int = ROLLUP_ZOOM) -> Tuple[int, int]:
+    """Convert WGS84 coordinates to slippy map tile numbers"""
+    n = 1 << zoom
+    lat = radians(max(-MAX_LATITUDE, min(MAX_LATITUDE, latitude)))
+    x = int((longitude + 180.0) / 360.0 * n)
+    y = int((1.0 - log(tan(lat) + 1.0 / cos(lat)) / pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def time_bucket(timestamp: datetime) -> datetime:
+    """Floor timestamp to the start of its rollup bucket (naive UTC)"""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    seconds = int((timestamp - EPOCH).total_seconds())
+    return EPOCH + timedelta(seconds=seconds - seconds % ROLLUP_BUCKET_SECONDS)
+
+
+def rollup_deltas(rows: Iterable, sign: int = 1) -> List[dict]:
+    """
+    Group processed agent data rows by (tile, bucket).
+    Rows are anything with road_state, z, latitude, longitude and timestamp
+    attributes. Use sign=-1 to get deltas that remove rows from the rollups.
+    """
+    deltas: Dict[Tuple[int, int, datetime], dict] = {}
+    for row in rows:
+        tile_x, tile_y = tile_xy(row.latitude, row.longitude)
+        key = (tile_x, tile_y, time_bucket(row.timestamp))
+        delta = deltas.get(key)
+        if delta is None:
+            delta = dict.fromkeys(COUNTER_COLUMNS, 0)
+            delta.update(tile_x=tile_x, tile_y=tile_y, bucket=key[2])
+            deltas[key] = delta
+        delta["count"] += sign
+        state_column = ROAD_STATE_COLUMNS.get(row.road_state)
+        if state_column:
+            delta[state_column] += sign
+        delta["z_sum"] += sign * row.z
+        delta["z_sq_sum"] += sign * row.z * row.z
+    return list(deltas.values())
+
+
+def apply_rollups(session, rows: Iterable, sign: int = 1):
+    """Add (or with sign=-1 subtract) rows to the rollups in one upsert"""
+    deltas = rollup_deltas(rows, sign)
+    if not deltas:
+        return
+    # Conflicting rows are locked in VALUES order, one global order keeps
+    # store workers with overlapping batches from deadlocking
+    deltas.sort(key=lambda delta: (delta["tile_x"], delta["tile_y"], delta["bucket"]))
+    query = insert(road_quality_rollups).values(deltas)
+    query = query.on_conflict_do_update(
+        index_elements=["tile_x", "tile_y", "bucket"],
+        set_={
+            column: road_quality_rollups.c[column] + query.excluded[column]
+            for column in COUNTER_COLUMNS
+        },
+    )
+    session.execute(query)
+
+
+def query_grid(
+    session,
+    zoom: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+) -> dict:
+    """
+    Road quality grid for the zoom level.
+    Tiles are merged in the database, so the cost depends on the number of
+    rollup cells in the range and never on the number of raw rows.
+    """
+    zoom = min(zoom, ROLLUP_ZOOM)
+    shift = ROLLUP_ZOOM - zoom
+    c = road_quality_rollups.c
+    cell_x = c.tile_x.op(">>")(shift).label("cell_x")
+    cell_y = c.tile_y.op(">>")(shift).label("cell_y")
+    query = select(
+        cell_x,
+        cell_y,
+        func.sum(c.count),
+        func.sum(c.normal_count),
+        func.sum(c.small_pits_count),
+        func.sum(c.large_pits_count),
+        func.sum(c.z_sum),
+        func.sum(c.z_sq_sum),
+    ).group_by(cell_x, cell_y)
+    # Both bounds are floored to their bucket, a bucket the range only
+    # partly covers is included at either end
+    if since is not None:
+        query = query.where(c.bucket >= time_bucket(since))
+    if until is not None:
+        query = query.where(c.bucket <= time_bucket(until))
+    if bbox is not None:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        # Tile y grows to the south
+        min_x, min_y = tile_xy(max_lat, min_lon)
+        max_x, max_y = tile_xy(min_lat, max_lon)
+        query = query.where(c.tile_x.between(min_x, max_x), c.tile_y.between(min_y, max_y))
+
+    cells = []
+    for x, y, count, normal, small_pits, large_pits, z_sum, z_sq_sum in session.execute(query):
+        if not count:
+            continue
+        z_mean = z_sum / count
+        z_std = sqrt(max(z_sq_sum / count - z_mean * z_mean, 0.0))
+        cells.append([x, y, count, normal, small_pits, large_pits, round(z_mean, 3), round(z_std, 3)])
+    return {
+        "zoom": zoom,
+        "columns": ["x", "y", "count", "normal", "small_pits", "large_pits", "z_mean", "z_std"],
+        "cells": cells,
+    }
@@ -0,0 +1,82 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+from pydantic import BaseModel, field_validator
+
+
+# SQLAlchemy model
+class ProcessedAgentDataInDB(BaseModel):
+    id: int
+    road_state: str
+    user_id: int
+    x: float
+    y: float
+    z: float
+    latitude: float
+    longitude: float
+    timestamp: datetime
+
+
+# FastAPI models
+class AccelerometerData(BaseModel):
+    x: float
+    y: float
+    z: float
+
+
+class GpsData(BaseModel):
+    latitude: float
+    longitude: float
+
+
+class Trace(BaseModel):
+    sample_id: str
+    # Stage name -> time.monotonic_ns() when the sample passed it
+    stages: Dict[str, int] = {}
+
+
+class AgentData(BaseModel):
+    user_id: int
+    accelerometer: AccelerometerData
+    gps: GpsData
+    timestamp: datetime
+    # Only set on samples picked for latency tracing, not stored
+    trace: Optional[Trace] = None
+
+    @classmethod
+    @field_validator("timestamp", mode="before")
+    def check_timestamp(cls, value):
+        if isinstance(value, datetime):
+            return value
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise ValueError(
+                "Invalid timestamp format. Expected ISO 8601 format (YYYY-MM-DDTHH:MM:SSZ)."
+            )
+
+
+class ProcessedAgentData(BaseModel):
+    road_state: str
+    agent_data: AgentData
+
+
+# Bulk update and delete models
+class ProcessedAgentDataFilter(BaseModel):
+    ids: Optional[List[int]] = None
+    user_id: Optional[int] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+
+
+class ProcessedAgentDataPatch(BaseModel):
+    road_state: Optional[str] = None
+    x: Optional[float] = None
+    y: Optional[float] = None
+    z: Optional[float] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+
+class ProcessedAgentDataBulkUpdate(BaseModel):
+    filter: ProcessedAgentDataFilter
+    values: ProcessedAgentDataPatch
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import logging
+import re
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Set, Tuple
+from fastapi import WebSocket
+from catchup import ReplayedIds
+from config import WS_SEND_QUEUE_SIZE, WS_SLOW_CONSUMER_POLICY
+from metrics import counter
+
+FRAMES_SENT = counter("store_websocket_frames_total", "Frames sent to WebSocket subscribers")
+FRAMES_DROPPED = counter("store_websocket_frames_dropped_total", "Frames dropped for slow WebSocket subscribers")
+SLOW_DISCONNECTS = counter("store_websocket_slow_disconnects_total", "Slow WebSocket subscribers disconnected")
+
+# Ids of the rows in a frame, row_to_dict puts the id column first
+ROW_ID = re.compile(r'\{"id": (\d+)')
+
+
+class Subscriber:
+    """
+    WebSocket connection with its own bounded send queue.
+    A writer task drains the queue, so a slow client never blocks the
+    publisher; when the queue is full the slow consumer policy applies:
+    "drop" discards the oldest pending frame, "disconnect" closes the socket.
+    """
+
+    def __init__(self, websocket: WebSocket, user_ids: Tuple[int, ...], paused: bool = False):
+        self.websocket = websocket
+        self.user_ids = user_ids
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+        self.dropped = 0
+        self.closed = False
+        # Frames published while paused are held until resume(), bounded
+        # like the queue
+        self.paused = paused
+        self._held: Deque[Tuple[int, str]] = deque()
+        self._writer = asyncio.create_task(self._write())
+
+    def offer(self, user_id: int, message: str):
+        if self.closed:
+            return
+        if self.paused:
+            if len(self._held) >= WS_SEND_QUEUE_SIZE:
+                if not self._overflow():
+                    return
+                self._held.popleft()
+            self._held.append((user_id, message))
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            if not self._overflow():
+                return
+            self.queue.get_nowait()
+            self.queue.put_nowait(message)
+
+    def _overflow(self) -> bool:
+        """
+        Apply the slow consumer policy to a full queue.
+        Returns:
+            True if the oldest pending frame is to be dropped, False if the socket was closed.
+        """
+        if WS_SLOW_CONSUMER_POLICY == "disconnect":
+            SLOW_DISCONNECTS.inc()
+            logging.warning(f"Disconnect slow WebSocket subscriber of users {self.user_ids}")
+            self.close()
+            return False
+        self.dropped += 1
+        FRAMES_DROPPED.inc()
+        return True
+
+    def resume(self, replayed: Dict[int, ReplayedIds]):
+        """
+        Release held frames without the rows already sent by the catch-up.
+        Only frames with replayed rows are decoded, the ids of the others
+        are matched in the encoded frame.
+        Parameters:
+            replayed: Rows sent by the catch-up per user.
+        """
+        held, self._held = self._held, deque()
+        self.paused = False
+        for user_id, message in held:
+            sent = replayed.get(user_id)
+            if sent is None or not any(int(row_id) in sent for row_id in ROW_ID.findall(message)):
+                self.offer(user_id, message)
+                continue
+            payloads = [payload for payload in json.loads(message) if payload["id"] not in sent]
+            if payloads:
+                self.offer(user_id, json.dumps(payloads))
+
+    async def _write(self):
+        try:
+            while True:
+                message = await self.queue.get()
+                await self.websocket.send_text(message)
+                FRAMES_SENT.inc()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logging.info(f"WebSocket subscriber of users {self.user_ids} failed: {e}")
+        finally:
+            self.closed = True
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._writer.cancel()
+        asyncio.ensure_future(self._close_socket())
+
+    async def _close_socket(self):
+        try:
+            # 1013: try again later
+            await self.websocket.close(code=1013)
+        except Exception:
+            pass
+
+
+class SubscriptionManager:
+    """Local WebSocket subscribers grouped by user id, a subscriber may follow several users"""
+
+    def __init__(self):
+        self.subscriptions: Dict[int, Set[Subscriber]] = {}
+
+    def connect(self, websocket: WebSocket, user_ids: Iterable[int], paused: bool = False) -> Subscriber:
+        subscriber = Subscriber(websocket, tuple(user_ids), paused)
+        for user_id in subscriber.user_ids:
+            self.subscriptions.setdefault(user_id, set()).add(subscriber)
+        return subscriber
+
+    def disconnect(self, subscriber: Subscriber):
+        for user_id in subscriber.user_ids:
+            subscribers = self.subscriptions.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.subscriptions[user_id]
+        subscriber.close()
+
+    def count(self) -> int:
+        """Number of connected subscribers, each counted once however many users it follows"""
+        return len(set().union(*self.subscriptions.values()))
+
+    def has_subscribers(self, user_id: int) -> bool:
+        return user_id in self.subscriptions
+
+    def send(self, user_id: int, message: str):
+        """Queue an already encoded frame for every subscriber of the user"""
+        # Copy, the set can change while subscribers disconnect
+        for subscriber in tuple(self.subscriptions.get(user_id, ())):
+            subscriber.offer(user_id, message)
+
+
+def group_by_user(payloads: Iterable[dict]) -> Dict[int, List[dict]]:
+    """Coalesce payloads of one request into one frame per user"""
+    by_user: Dict[int, List[dict]] = {}
+    for payload in payloads:
+        by_user.setdefault(payload["user_id"], []).append(payload)
+    return by_user
@@ -0,0 +1,21 @@
+from collections import deque
+from typing import List
+from app.entities.processed_agent_data import ProcessedAgentData
+from app.interfaces.processed_data_queue import ProcessedDataQueue
+
+
+class MemoryQueueAdapter(ProcessedDataQueue):
+    """Queue in the process memory, for running the pipeline without Redis"""
+
+    def __init__(self):
+        self.items = deque()
+
+    def push(self, processed_agent_data: ProcessedAgentData):
+        # Same order as LPUSH/LPOP of the Redis queue
+        self.items.appendleft(processed_agent_data)
+
+    def length(self) -> int:
+        return len(self.items)
+
+    def pop(self, count: int) -> List[ProcessedAgentData]:
+        return [self.items.popleft() for _ in range(min(count, len(self.items)))]
@@ -0,0 +1,24 @@
+from typing import List
+from redis import Redis
+from app.entities.processed_agent_data import ProcessedAgentData
+from app.interfaces.processed_data_queue import ProcessedDataQueue
+
+
+class RedisQueueAdapter(ProcessedDataQueue):
+    def __init__(self, redis_client: Redis, key: str = "processed_agent_data"):
+        self.redis_client = redis_client
+        self.key = key
+
+    def push(self, processed_agent_data: ProcessedAgentData):
+        self.redis_client.lpush(self.key, processed_agent_data.model_dump_json())
+
+    def length(self) -> int:
+        return self.redis_client.llen(self.key)
+
+    def pop(self, count: int) -> List[ProcessedAgentData]:
+        batch: List[ProcessedAgentData] = []
+        for _ in range(count):
+            item = self.redis_client.lpop(self.key)
+            if item:
+                batch.append(ProcessedAgentData.model_validate_json(item))
+        return batch
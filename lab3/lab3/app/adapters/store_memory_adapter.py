@@ -0,0 +1,24 @@
+import logging
+from collections import deque
+from typing import List
+from app.entities.processed_agent_data import ProcessedAgentData
+from app.interfaces.store_api_gateway import StoreGateway
+
+
+class StoreMemoryAdapter(StoreGateway):
+    """
+    Keeps the request bodies the Store API would get in memory,
+    for running the pipeline without the Store.
+    """
+
+    def __init__(self):
+        # JSON compatible batches, oldest first
+        self.batches = deque()
+        self.logger = logging.getLogger(__name__)
+
+    def save_data(self, processed_agent_data_batch: List[ProcessedAgentData]) -> bool:
+        if not processed_agent_data_batch:
+            self.logger.info("No data to send to Store API.")
+            return False
+        self.batches.append([item.model_dump(mode="json") for item in processed_agent_data_batch])
+        return True
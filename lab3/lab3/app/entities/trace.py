@@ -0,0 +1,8 @@
+from typing import Dict
+from pydantic import BaseModel
+
+
+class Trace(BaseModel):
+    sample_id: str
+    # Stage name -> time.monotonic_ns() when the sample passed it
+    stages: Dict[str, int] = {}
@@ -0,0 +1,44 @@
+from abc import ABC, abstractmethod
+from typing import List
+from app.entities.processed_agent_data import ProcessedAgentData
+
+
+class ProcessedDataQueue(ABC):
+    """
+    Abstract class representing the queue of processed agent data waiting
+    to be sent to the Store in batches.
+    All queue adapters must implement these methods.
+    """
+
+    @abstractmethod
+    def push(self, processed_agent_data: ProcessedAgentData):
+        """
+        Method to add the processed agent data to the queue.
+
+        Parameters:
+            processed_agent_data (ProcessedAgentData): The processed agent data to be queued.
+        """
+        pass
+
+    @abstractmethod
+    def length(self) -> int:
+        """
+        Method to get the number of queued items.
+
+        Returns:
+            int: Number of items in the queue.
+        """
+        pass
+
+    @abstractmethod
+    def pop(self, count: int) -> List[ProcessedAgentData]:
+        """
+        Method to take items from the queue.
+
+        Parameters:
+            count (int): Most items to take.
+
+        Returns:
+            List[ProcessedAgentData]: The taken items, fewer if the queue had less.
+        """
+        pass
@@ -0,0 +1,41 @@
+import time
+from app.entities.processed_agent_data import ProcessedAgentData
+from app.interfaces.processed_data_queue import ProcessedDataQueue
+from app.interfaces.store_api_gateway import StoreGateway
+from metrics import counter, histogram
+from tracing import record
+
+BATCH_SIZES = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+FLUSH_SIZE = histogram("hub_flush_size", "Items sent to the store per batch", buckets=BATCH_SIZES)
+STORE_SECONDS = histogram("hub_store_save_seconds", "Duration of sending a batch to the store")
+STORE_FAILED = counter("hub_store_save_failures_total", "Batches the store did not accept")
+
+
+def queue_processed_agent_data(
+        processed_agent_data: ProcessedAgentData,
+        queue: ProcessedDataQueue,
+        store_gateway: StoreGateway,
+        batch_size: int,
+) -> bool:
+    """
+    Queue processed agent data and send a batch to the store once the queue has batch_size items.
+    Parameters:
+        processed_agent_data (ProcessedAgentData): Processed agent data received by the hub.
+        queue (ProcessedDataQueue): Queue of data waiting for the store.
+        store_gateway (StoreGateway): Store to send the batch to.
+        batch_size (int): Items sent to the store at once.
+    Returns:
+        bool: True if a batch was sent to the store.
+    """
+    queue.push(processed_agent_data)
+    if queue.length() < batch_size:
+        return False
+    processed_agent_data_batch = queue.pop(batch_size)
+    for item in processed_agent_data_batch:
+        record(item.agent_data.trace, "hub.flush")
+    FLUSH_SIZE.observe(len(processed_agent_data_batch))
+    started = time.perf_counter()
+    if not store_gateway.save_data(processed_agent_data_batch=processed_agent_data_batch):
+        STORE_FAILED.inc()
+    STORE_SECONDS.observe(time.perf_counter() - started)
+    return True
@@ -0,0 +1,66 @@
+from datetime import timedelta
+from typing import Dict, Optional
+from app.entities.agent_data import AccelerometerData, AgentData, GpsData
+from app.entities.delta_agent_data import (
+    DELTA_PREFIX,
+    GPS_SCALE,
+    KEYFRAME_PREFIX,
+    DeltaAgentData,
+    KeyframeAgentData,
+)
+from app.entities.processed_agent_data import ProcessedAgentData
+import metrics
+
+KEYFRAMES = metrics.counter("hub_delta_keyframes_total", "Keyframes received from the edge")
+DELTAS = metrics.counter("hub_delta_frames_total", "Deltas received from the edge")
+MISSING_KEYFRAME = metrics.counter(
+    "hub_delta_missing_keyframe_total", "Deltas dropped because their keyframe was not received"
+)
+
+
+class DeltaDecoder:
+    """
+    Restores processed data from the messages of the edge's DeltaEncoder.
+    Messages with full processed data pass through unchanged, so the hub
+    reads edges with and without delta encoding.
+    """
+
+    def __init__(self):
+        # user id -> last keyframe
+        self._keyframes: Dict[int, KeyframeAgentData] = {}
+
+    def decode(self, payload: str) -> Optional[ProcessedAgentData]:
+        """
+        Parse a message of the edge.
+        Returns None for a delta to a keyframe that was not received,
+        e.g. after a restart, until the next keyframe arrives.
+        """
+        if payload.startswith(DELTA_PREFIX):
+            DELTAS.inc()
+            delta = DeltaAgentData.model_validate_json(payload, strict=True)
+            keyframe = self._keyframes.get(delta.user_id)
+            if keyframe is None or keyframe.keyframe != delta.delta_of:
+                MISSING_KEYFRAME.inc()
+                return None
+            base = keyframe.agent_data
+            agent_data = AgentData(
+                user_id=delta.user_id,
+                accelerometer=AccelerometerData(
+                    x=base.accelerometer.x + delta.accelerometer[0],
+                    y=base.accelerometer.y + delta.accelerometer[1],
+                    z=base.accelerometer.z + delta.accelerometer[2],
+                ),
+                gps=GpsData(
+                    latitude=base.gps.latitude + delta.gps[0] / GPS_SCALE,
+                    longitude=base.gps.longitude + delta.gps[1] / GPS_SCALE,
+                ),
+                timestamp=base.timestamp + timedelta(microseconds=delta.timestamp),
+                trace=delta.trace,
+            )
+            return ProcessedAgentData(road_state=delta.road_state, agent_data=agent_data)
+        if payload.startswith(KEYFRAME_PREFIX):
+            KEYFRAMES.inc()
+            keyframe = KeyframeAgentData.model_validate_json(payload, strict=True)
+            self._keyframes[keyframe.agent_data.user_id] = keyframe
+            return ProcessedAgentData(road_state=keyframe.road_state, agent_data=keyframe.agent_data)
+        return ProcessedAgentData.model_validate_json(payload, strict=True)
@@ -24,3 +24,15 @@ BATCH_SIZE = try_parse_int(os.environ.get("BATCH_SIZE")) or 20
 MQTT_BROKER_HOST = os.environ.get("MQTT_BROKER_HOST") or "localhost"
 MQTT_BROKER_PORT = try_parse_int(os.environ.get("MQTT_BROKER_PORT")) or 1883
 MQTT_TOPIC = os.environ.get("MQTT_TOPIC") or "processed_agent_data_topic"
+
+# Configuration for latency tracing
+# Stages of traced samples are appended to TRACE_FILE when enabled
+TRACE_ENABLED = (os.environ.get("TRACE_ENABLED") or "false").lower() == "true"
+TRACE_FILE = os.environ.get("TRACE_FILE") or "trace.jsonl"
+
+# Configuration for profiling
+# Adds handler timings and GET /debug/profile when enabled, nothing otherwise
+PROFILING_ENABLED = (os.environ.get("PROFILING_ENABLED") or "false").lower() == "true"
+# Longest profile a request may ask for
+PROFILE_MAX_SECONDS = try_parse_int(os.environ.get("PROFILE_MAX_SECONDS")) or 60
+PROFILE_SAMPLE_INTERVAL_MS = try_parse_int(os.environ.get("PROFILE_SAMPLE_INTERVAL_MS")) or 5
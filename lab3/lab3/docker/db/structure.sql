@@ -1,5 +1,5 @@
 CREATE TABLE processed_agent_data (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     road_state VARCHAR(255) NOT NULL,
     user_id INTEGER NOT NULL,
     x FLOAT,
@@ -7,5 +7,69 @@ CREATE TABLE processed_agent_data (
     z FLOAT,
     latitude FLOAT,
     longitude FLOAT,
-    timestamp TIMESTAMP
-);
\ No newline at end of file
+    timestamp TIMESTAMP NOT NULL,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+-- Daily partitions are created by the store, see partitions.py
+CREATE TABLE processed_agent_data_default PARTITION OF processed_agent_data DEFAULT;
+
+CREATE TABLE road_quality_rollups (
+    tile_x INTEGER NOT NULL,
+    tile_y INTEGER NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    normal_count INTEGER NOT NULL DEFAULT 0,
+    small_pits_count INTEGER NOT NULL DEFAULT 0,
+    large_pits_count INTEGER NOT NULL DEFAULT 0,
+    z_sum FLOAT NOT NULL DEFAULT 0,
+    z_sq_sum FLOAT NOT NULL DEFAULT 0,
+    PRIMARY KEY (tile_x, tile_y, bucket)
+);
+
+-- Deduplicated road defects, maintained by the store, see defects.py
+CREATE TABLE road_defects (
+    id SERIAL PRIMARY KEY,
+    cell_x INTEGER NOT NULL,
+    cell_y INTEGER NOT NULL,
+    latitude FLOAT NOT NULL,
+    longitude FLOAT NOT NULL,
+    hit_count INTEGER NOT NULL,
+    small_pits_count INTEGER NOT NULL,
+    large_pits_count INTEGER NOT NULL,
+    confidence FLOAT NOT NULL,
+    first_seen TIMESTAMP NOT NULL,
+    last_seen TIMESTAMP NOT NULL
+);
+
+CREATE INDEX ix_road_defects_cell_x_cell_y ON road_defects (cell_x, cell_y);
+CREATE INDEX ix_road_defects_last_seen ON road_defects (last_seen);
+
+
+CREATE INDEX ix_processed_agent_data_id ON processed_agent_data (id);
+CREATE INDEX ix_processed_agent_data_user_id_id ON processed_agent_data (user_id, id);
+CREATE INDEX ix_processed_agent_data_user_id_timestamp ON processed_agent_data (user_id, timestamp);
+
+
+CREATE TABLE processed_agent_data_minutely (
+    user_id INTEGER NOT NULL,
+    tile_x INTEGER NOT NULL,
+    tile_y INTEGER NOT NULL,
+    minute TIMESTAMP NOT NULL,
+    count INTEGER NOT NULL,
+    normal_count INTEGER NOT NULL,
+    small_pits_count INTEGER NOT NULL,
+    large_pits_count INTEGER NOT NULL,
+    z_sum FLOAT NOT NULL,
+    z_sq_sum FLOAT NOT NULL,
+    latitude FLOAT NOT NULL,
+    longitude FLOAT NOT NULL,
+    PRIMARY KEY (user_id, tile_x, tile_y, minute)
+);
+
+CREATE TABLE downsampled_partitions (
+    partition_name VARCHAR PRIMARY KEY,
+    downsampled_at TIMESTAMP NOT NULL,
+    row_count INTEGER,
+    max_id INTEGER
+);
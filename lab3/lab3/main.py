@@ -1,11 +1,18 @@
 import logging
-from typing import List
+import time
 from fastapi import FastAPI
+from fastapi.responses import Response
 from redis import Redis
 import paho.mqtt.client as mqtt
 
+from app.adapters.redis_queue_adapter import RedisQueueAdapter
 from app.adapters.store_api_adapter import StoreApiAdapter
 from app.entities.processed_agent_data import ProcessedAgentData
+from app.usecases.batching import queue_processed_agent_data
+from app.usecases.delta_decoding import DeltaDecoder
+from tracing import record
+import metrics
+import profiling
 from config import (
     STORE_API_BASE_URL,
     REDIS_HOST,
@@ -14,6 +21,7 @@ from config import (
     MQTT_TOPIC,
     MQTT_BROKER_HOST,
     MQTT_BROKER_PORT,
+    PROFILING_ENABLED,
 )
 
 # Configure logging settings
@@ -28,34 +36,45 @@ logging.basicConfig(
 
 # Create Redis client
 redis_client = Redis(host=REDIS_HOST, port=REDIS_PORT)
+# Data waiting to be sent to the store in batches
+queue = RedisQueueAdapter(redis_client)
+
+# Metrics, the queue depth is read from Redis on scrape
+MESSAGES_RECEIVED = {
+    transport: metrics.counter("hub_messages_total", "Processed data received by the hub", {"transport": transport})
+    for transport in ("http", "mqtt")
+}
+MESSAGES_FAILED = metrics.counter("hub_messages_failed_total", "MQTT messages that could not be processed")
+metrics.gauge("hub_queue_depth", "Items waiting in the processed_agent_data queue", function=queue.length)
 
 # Create StoreApiAdapter instance
 store_adapter = StoreApiAdapter(api_base_url=STORE_API_BASE_URL)
 
 # FastAPI app
 app = FastAPI()
+if PROFILING_ENABLED:
+    profiling.install(app)
+
+
+@app.get("/metrics")
+def read_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 
 @app.post("/processed_agent_data/")
 async def save_processed_agent_data(processed_agent_data: ProcessedAgentData):
     logging.info("Received data via HTTP POST")
-    redis_client.lpush("processed_agent_data", processed_agent_data.model_dump_json())
-
-    processed_agent_data_batch: List[ProcessedAgentData] = []
-    if redis_client.llen("processed_agent_data") >= BATCH_SIZE:
-        for _ in range(BATCH_SIZE):
-            item = redis_client.lpop("processed_agent_data")
-            if item:
-                parsed = ProcessedAgentData.model_validate_json(item)
-                processed_agent_data_batch.append(parsed)
-
-        store_adapter.save_data(processed_agent_data_batch=processed_agent_data_batch)
+    MESSAGES_RECEIVED["http"].inc()
+    record(processed_agent_data.agent_data.trace, "hub.receive")
+    queue_processed_agent_data(processed_agent_data, queue, store_adapter, BATCH_SIZE)
 
     return {"status": "ok"}
 
 
 # MQTT client
 client = mqtt.Client()
+# The edge may send deltas to the last keyframe of a user
+decoder = DeltaDecoder()
 
 
 def on_connect(client, userdata, flags, rc):
@@ -66,25 +85,22 @@ def on_connect(client, userdata, flags, rc):
         logging.error(f"Failed to connect to MQTT broker with code: {rc}")
 
 
+@profiling.timed("mqtt on_message")
 def on_message(client, userdata, msg):
     logging.info("Received data via MQTT")
+    received = time.monotonic_ns()
+    MESSAGES_RECEIVED["mqtt"].inc()
     try:
         payload: str = msg.payload.decode("utf-8")
-        processed_agent_data = ProcessedAgentData.model_validate_json(payload, strict=True)
+        processed_agent_data = decoder.decode(payload)
+        if processed_agent_data is None:
+            logging.warning("Dropped a delta without its keyframe")
+            return
         logging.info(f"Parsed data: {processed_agent_data}")
-        redis_client.lpush("processed_agent_data", processed_agent_data.model_dump_json())
-
-        processed_agent_data_batch: List[ProcessedAgentData] = []
-        if redis_client.llen("processed_agent_data") >= BATCH_SIZE:
-            for _ in range(BATCH_SIZE):
-                item = redis_client.lpop("processed_agent_data")
-                if item:
-                    parsed = ProcessedAgentData.model_validate_json(item)
-                    processed_agent_data_batch.append(parsed)
-
-            store_adapter.save_data(processed_agent_data_batch=processed_agent_data_batch)
-
+        record(processed_agent_data.agent_data.trace, "hub.receive", received)
+        queue_processed_agent_data(processed_agent_data, queue, store_adapter, BATCH_SIZE)
     except Exception as e:
+        MESSAGES_FAILED.inc()
         logging.error(f"Error processing MQTT message: {e}")
 
 
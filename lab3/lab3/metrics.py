@@ -0,0 +1,139 @@
+import math
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Default histogram buckets in seconds, from 100 us to 10 s
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        name + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonic count. Recording is a plain attribute update without a lock,
+    an increment racing with another thread may get lost, which is fine for metrics.
+    """
+
+    __slots__ = ("labels", "value", "function")
+
+    def __init__(self, labels: Dict[str, str], function: Optional[Callable[[], float]] = None):
+        self.labels = labels
+        self.value = 0
+        # Collected at scrape time instead, e.g. counts kept by another object
+        self.function = function
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def samples(self, name: str) -> List[Tuple[str, Dict[str, str], float]]:
+        return [(name, self.labels, self.function() if self.function else self.value)]
+
+
+class Gauge(Counter):
+    """Value that goes up and down, or is collected at scrape time"""
+
+    __slots__ = ()
+
+    def set(self, value: float):
+        self.value = value
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+
+class Histogram:
+    """Distribution of observed values in buckets allocated up front"""
+
+    __slots__ = ("labels", "bounds", "counts", "sum")
+
+    def __init__(self, labels: Dict[str, str], buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.labels = labels
+        self.bounds = tuple(sorted(buckets))
+        # One more for values above the last bound
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def samples(self, name: str) -> List[Tuple[str, Dict[str, str], float]]:
+        samples = []
+        total = 0
+        for bound, count in zip(self.bounds + (math.inf,), self.counts):
+            total += count
+            samples.append((f"{name}_bucket", {**self.labels, "le": _format_value(float(bound))}, total))
+        samples.append((f"{name}_sum", self.labels, self.sum))
+        samples.append((f"{name}_count", self.labels, total))
+        return samples
+
+
+class Registry:
+    """Metrics of the service, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        # name -> (type, help, {label values: metric})
+        self._families: Dict[str, Tuple[str, str, Dict[tuple, object]]] = {}
+
+    def _get(self, kind: str, name: str, help: str, labels: Optional[Dict[str, str]], create):
+        family = self._families.setdefault(name, (kind, help, {}))
+        if family[0] != kind:
+            raise ValueError(f"Metric {name} is already registered as a {family[0]}")
+        labels = labels or {}
+        key = tuple(sorted(labels.items()))
+        metric = family[2].get(key)
+        if metric is None:
+            metric = family[2][key] = create(labels)
+        return metric
+
+    def counter(self, name: str, help: str, labels: Dict[str, str] = None, function=None) -> Counter:
+        return self._get("counter", name, help, labels, lambda labels: Counter(labels, function))
+
+    def gauge(self, name: str, help: str, labels: Dict[str, str] = None, function=None) -> Gauge:
+        return self._get("gauge", name, help, labels, lambda labels: Gauge(labels, function))
+
+    def histogram(
+        self, name: str, help: str, labels: Dict[str, str] = None, buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._get("histogram", name, help, labels, lambda labels: Histogram(labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for name, (kind, help, metrics) in self._families.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for metric in metrics.values():
+                try:
+                    samples = metric.samples(name)
+                except Exception:
+                    # A failing collector (e.g. Redis is down) must not break the scrape
+                    continue
+                for sample_name, labels, value in samples:
+                    lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Content type of the Prometheus text format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+render = REGISTRY.render
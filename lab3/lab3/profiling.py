@@ -0,0 +1,224 @@
+import asyncio
+import cProfile
+import functools
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+import metrics
+from config import PROFILING_ENABLED, PROFILE_MAX_SECONDS, PROFILE_SAMPLE_INTERVAL_MS
+
+SERVICE = "hub"
+
+# Handler durations, only recorded when profiling is enabled
+_handler_seconds: Dict[str, metrics.Histogram] = {}
+# One profile at a time
+_busy = threading.Lock()
+# Running cProfile capture, checked by timed handlers
+_capture: Optional["CProfileCapture"] = None
+_labels: Dict[object, str] = {}
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def handler_seconds(handler: str) -> metrics.Histogram:
+    histogram = _handler_seconds.get(handler)
+    if histogram is None:
+        histogram = _handler_seconds[handler] = metrics.histogram(
+            f"{SERVICE}_handler_seconds", "Duration of HTTP endpoints and MQTT callbacks", {"handler": handler}
+        )
+    return histogram
+
+
+class CProfileCapture:
+    """
+    Deterministic profile of the threads that enter it. cProfile only
+    sees the thread it was enabled in, so every thread gets a profiler
+    of its own, merged into one pstats file at the end.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # thread id -> [profiler, nesting depth]
+        self._profilers: Dict[int, list] = {}
+
+    def enter(self):
+        ident = threading.get_ident()
+        entry = self._profilers.get(ident)
+        if entry is None:
+            with self._lock:
+                entry = self._profilers[ident] = [cProfile.Profile(), 0]
+        if entry[1] == 0:
+            entry[0].enable()
+        entry[1] += 1
+
+    def exit(self):
+        entry = self._profilers[threading.get_ident()]
+        entry[1] -= 1
+        if entry[1] == 0:
+            entry[0].disable()
+
+    def dump(self) -> bytes:
+        """Merged stats in the pstats file format"""
+        stats = pstats.Stats()
+        with self._lock:
+            profilers = [profiler for profiler, _ in self._profilers.values()]
+        for profiler in profilers:
+            # Not create_stats(), it would disable the profiler of the calling
+            # thread, a profiled call may still be running in its own thread
+            profiler.snapshot_stats()
+            part = pstats.Stats()
+            part.stats = profiler.stats
+            stats.add(part)
+        return marshal.dumps(stats.stats)
+
+
+def timed(handler: str):
+    """
+    Record the duration of a callback (e.g. an MQTT on_message) and profile
+    it during a cProfile capture. Returns the function unchanged when
+    profiling is disabled, so it costs nothing.
+    """
+
+    def decorator(function):
+        if not PROFILING_ENABLED:
+            return function
+        seconds = handler_seconds(handler)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            capture = _capture
+            if capture is not None:
+                capture.enter()
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                seconds.observe(time.perf_counter() - started)
+                if capture is not None:
+                    capture.exit()
+
+        return wrapper
+
+    return decorator
+
+
+def start_cprofile() -> CProfileCapture:
+    global _capture
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    _capture = CProfileCapture()
+    return _capture
+
+
+def stop_cprofile(capture: CProfileCapture) -> bytes:
+    global _capture
+    _capture = None
+    try:
+        return capture.dump()
+    finally:
+        _busy.release()
+
+
+def _frame_label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label
+
+
+def sample(seconds: float, interval: float = PROFILE_SAMPLE_INTERVAL_MS / 1000) -> str:
+    """
+    Wall clock sampling profile of all threads but the calling one, in the
+    collapsed stack format of flamegraph.pl and speedscope:
+    "thread;outer frame;...;inner frame count" per line.
+    """
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    try:
+        own = threading.get_ident()
+        counts = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                counts[ident, tuple(stack)] += 1
+            time.sleep(interval)
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        lines = [
+            ";".join([names.get(ident, str(ident))] + [_frame_label(code) for code in reversed(stack)]) + f" {count}"
+            for (ident, stack), count in counts.most_common()
+        ]
+        return "\n".join(lines) + "\n"
+    finally:
+        _busy.release()
+
+
+class TimingMiddleware:
+    """Records the duration of every HTTP request per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # The router stores the matched route, so paths with ids share a histogram
+            route = scope.get("route")
+            handler = f"{scope['method']} {route.path if route is not None else 'unmatched'}"
+            handler_seconds(handler).observe(time.perf_counter() - started)
+
+
+def install(app: FastAPI):
+    """Add the timing middleware and GET /debug/profile to the app"""
+    app.add_middleware(TimingMiddleware)
+
+    @app.get("/debug/profile")
+    async def read_profile(seconds: float = 10, mode: str = "sample"):
+        # mode=sample: collapsed stacks of all threads
+        # mode=cprofile: pstats of the event loop and timed callbacks
+        if not 0 < seconds <= PROFILE_MAX_SECONDS:
+            raise HTTPException(status_code=422, detail=f"Seconds must be in (0, {PROFILE_MAX_SECONDS}]")
+        try:
+            if mode == "sample":
+                body = await run_in_threadpool(sample, seconds)
+                return Response(body, media_type="text/plain")
+            if mode == "cprofile":
+                capture = start_cprofile()
+                try:
+                    # Async endpoints and background tasks run on the event loop thread
+                    capture.enter()
+                    try:
+                        await asyncio.sleep(seconds)
+                    finally:
+                        # Also on cancellation, or the loop thread stays profiled
+                        capture.exit()
+                finally:
+                    body = stop_cprofile(capture)
+                return Response(
+                    body,
+                    media_type="application/octet-stream",
+                    headers={"Content-Disposition": f"attachment; filename={SERVICE}.pstats"},
+                )
+        except ProfilerBusy as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        raise HTTPException(status_code=422, detail="Mode must be one of: sample, cprofile")
@@ -0,0 +1,64 @@
+import logging
+import time
+from collections import deque
+from types import SimpleNamespace
+from app.interfaces.agent_gateway import AgentGateway
+from app.interfaces.hub_gateway import HubGateway
+from app.usecases.data_processing import handle_agent_message
+from app.usecases.reduction import EdgeReducer
+
+
+class AgentMemoryAdapter(AgentGateway):
+    """
+    Agent messages passed in memory instead of MQTT, for running the
+    pipeline in one process. The agent publishes to the adapter like to
+    an MQTT client, queued messages are handled on drain().
+    """
+
+    def __init__(self, hub_gateway: HubGateway, topic="agent_data_topic", reducer: EdgeReducer = None):
+        self.topic = topic
+        self.hub_gateway = hub_gateway
+        self.reducer = reducer
+        # Payloads of the queued messages, oldest first
+        self.messages = deque()
+        self.running = False
+
+    def publish(self, topic, payload):
+        """Queue the message, same result format as paho's publish: (status, message id)"""
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        self.messages.append(payload)
+        return 0, len(self.messages)
+
+    def on_message(self, client, userdata, msg):
+        """Processing agent data and sent it to hub gateway"""
+        received = time.monotonic_ns()
+        try:
+            if not handle_agent_message(msg.payload.decode("utf-8"), self.hub_gateway, received, self.reducer):
+                logging.error("Hub is not available")
+        except Exception as e:
+            logging.info(f"Error processing agent message: {e}")
+
+    def drain(self, limit: int = None) -> int:
+        """
+        Method to handle queued messages, oldest first.
+        Parameters:
+            limit (int): Most messages to handle, all of them by default.
+        Returns:
+            int: Number of handled messages.
+        """
+        if not self.running:
+            return 0
+        count = len(self.messages) if limit is None else min(limit, len(self.messages))
+        for _ in range(count):
+            self.on_message(None, None, SimpleNamespace(topic=self.topic, payload=self.messages.popleft()))
+        return count
+
+    def connect(self):
+        pass
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
@@ -1,9 +1,18 @@
 import logging
+import time
 import paho.mqtt.client as mqtt
 from app.interfaces.agent_gateway import AgentGateway
-from app.entities.agent_data import AgentData, GpsData
-from app.usecases.data_processing import process_agent_data
+from app.usecases.data_processing import handle_agent_message
 from app.interfaces.hub_gateway import HubGateway
+from app.usecases.reduction import EdgeReducer
+from metrics import counter, histogram
+from profiling import timed
+
+MESSAGES_RECEIVED = counter("edge_agent_messages_total", "Agent messages received over MQTT")
+MESSAGES_FAILED = counter("edge_agent_messages_failed_total", "Agent messages that could not be processed")
+MESSAGE_SECONDS = histogram(
+    "edge_agent_message_seconds", "Time to validate and process an agent message and send it to the hub"
+)
 
 
 class AgentMQTTAdapter(AgentGateway):
@@ -14,6 +23,7 @@ class AgentMQTTAdapter(AgentGateway):
         topic,
         hub_gateway: HubGateway,
         batch_size=10,
+        reducer: EdgeReducer = None,
     ):
         self.batch_size = batch_size
         # MQTT
@@ -23,6 +33,8 @@ class AgentMQTTAdapter(AgentGateway):
         self.client = mqtt.Client()
         # Hub
         self.hub_gateway = hub_gateway
+        # Drops normal samples not worth sending, if set
+        self.reducer = reducer
 
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
@@ -31,19 +43,20 @@ class AgentMQTTAdapter(AgentGateway):
         else:
             logging.info(f"Failed to connect to MQTT broker with code: {rc}")
 
+    @timed("mqtt on_message")
     def on_message(self, client, userdata, msg):
         """Processing agent data and sent it to hub gateway"""
+        received = time.monotonic_ns()
+        MESSAGES_RECEIVED.inc()
         try:
             payload: str = msg.payload.decode("utf-8")
-            # Create AgentData instance with the received data
-            agent_data = AgentData.model_validate_json(payload, strict=True)
-            # Process the received data (you can call a use case here if needed)
-            processed_data = process_agent_data(agent_data)
-            # Store the agent_data in the database (you can send it to the data processing module)
-            if not self.hub_gateway.save_data(processed_data):
+            # Validate and process the received data, then send it to the hub
+            if not handle_agent_message(payload, self.hub_gateway, received, self.reducer):
                 logging.error("Hub is not available")
         except Exception as e:
+            MESSAGES_FAILED.inc()
             logging.info(f"Error processing MQTT message: {e}")
+        MESSAGE_SECONDS.observe((time.monotonic_ns() - received) / 1e9)
 
     def connect(self):
         self.client.on_connect = self.on_connect
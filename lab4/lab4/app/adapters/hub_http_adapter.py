@@ -1,9 +1,15 @@
 import logging
+import time
 
 import requests as requests
 
 from app.entities.processed_agent_data import ProcessedAgentData
 from app.interfaces.hub_gateway import HubGateway
+from metrics import counter, histogram
+
+HUB_SENT = counter("edge_hub_messages_total", "Processed data sent to the hub", {"transport": "http"})
+HUB_FAILED = counter("edge_hub_failures_total", "Processed data not accepted by the hub", {"transport": "http"})
+HUB_SECONDS = histogram("edge_hub_request_seconds", "Duration of requests to the hub", {"transport": "http"})
 
 
 class HubHttpAdapter(HubGateway):
@@ -20,10 +26,14 @@ class HubHttpAdapter(HubGateway):
         """
         url = f"{self.api_base_url}/processed_agent_data/"
 
+        started = time.perf_counter()
         response = requests.post(url, data=processed_data.model_dump_json())
+        HUB_SECONDS.observe(time.perf_counter() - started)
         if response.status_code != 200:
+            HUB_FAILED.inc()
             logging.info(
                 f"Invalid Hub response\nData: {processed_data.model_dump_json()}\nResponse: {response}"
             )
             return False
+        HUB_SENT.inc()
         return True
\ No newline at end of file
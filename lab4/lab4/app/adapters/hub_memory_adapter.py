@@ -0,0 +1,28 @@
+from collections import deque
+from app.entities.processed_agent_data import ProcessedAgentData
+from app.interfaces.hub_gateway import HubGateway
+from app.usecases.delta_encoding import DeltaEncoder
+
+
+class HubMemoryAdapter(HubGateway):
+    """Keeps the messages the hub would get in memory, for running the pipeline in one process"""
+
+    def __init__(self, encoder: DeltaEncoder = None):
+        # JSON of the processed data, oldest first
+        self.messages = deque()
+        self.encoder = encoder
+
+    def save_data(self, processed_data: ProcessedAgentData):
+        """
+        Save the processed road data for the Hub.
+        Parameters:
+            processed_data (ProcessedAgentData): Processed road data to be saved.
+        Returns:
+            bool: Always True, memory is always available.
+        """
+        # Serialized like HubMqttAdapter, so the hub side parses it as usual
+        if self.encoder is not None:
+            self.messages.append(self.encoder.encode(processed_data))
+        else:
+            self.messages.append(processed_data.model_dump_json())
+        return True
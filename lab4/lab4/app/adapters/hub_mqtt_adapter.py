@@ -5,13 +5,20 @@ from paho.mqtt import client as mqtt_client
 
 from app.entities.processed_agent_data import ProcessedAgentData
 from app.interfaces.hub_gateway import HubGateway
+from app.usecases.delta_encoding import DeltaEncoder
+from metrics import counter
+
+HUB_SENT = counter("edge_hub_messages_total", "Processed data sent to the hub", {"transport": "mqtt"})
+HUB_FAILED = counter("edge_hub_failures_total", "Processed data not accepted by the hub", {"transport": "mqtt"})
 
 
 class HubMqttAdapter(HubGateway):
-    def __init__(self, broker, port, topic):
+    def __init__(self, broker, port, topic, encoder: DeltaEncoder = None):
         self.broker = broker
         self.port = port
         self.topic = topic
+        # Sends deltas to the last keyframe instead of the full data, if set
+        self.encoder = encoder
         self.mqtt_client = self._connect_mqtt(broker, port)
 
     def save_data(self, processed_data: ProcessedAgentData):
@@ -22,12 +29,17 @@ class HubMqttAdapter(HubGateway):
         Returns:
             bool: True if the data is successfully saved, False otherwise.
         """
-        msg = processed_data.model_dump_json()
+        if self.encoder is not None:
+            msg = self.encoder.encode(processed_data)
+        else:
+            msg = processed_data.model_dump_json()
         result = self.mqtt_client.publish(self.topic, msg)
         status = result[0]
         if status == 0:
+            HUB_SENT.inc()
             return True
         else:
+            HUB_FAILED.inc()
             print(f"Failed to send message to topic {self.topic}")
             return False
 
@@ -1,5 +1,7 @@
 from datetime import datetime
+from typing import Optional
 from pydantic import BaseModel, field_validator
+from app.entities.trace import Trace
 
 
 class AccelerometerData(BaseModel):
@@ -18,6 +20,8 @@ class AgentData(BaseModel):
     accelerometer: AccelerometerData
     gps: GpsData
     timestamp: datetime
+    # Only set on samples picked for latency tracing
+    trace: Optional[Trace] = None
 
     @classmethod
     @field_validator("timestamp", mode="before")
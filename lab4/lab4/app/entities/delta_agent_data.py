@@ -0,0 +1,33 @@
+from typing import Optional, Tuple
+from pydantic import BaseModel
+from app.entities.agent_data import AgentData
+from app.entities.trace import Trace
+
+# Delta units: whole accelerometer units, 1e-7 degrees (about 1 cm) and microseconds
+GPS_SCALE = 10_000_000
+# Messages are told apart by their first field, model_dump_json keeps the field order
+KEYFRAME_PREFIX = '{"keyframe":'
+DELTA_PREFIX = '{"delta_of":'
+
+
+class KeyframeAgentData(BaseModel):
+    # Sequence number of the keyframe, per user
+    keyframe: int
+    road_state: str
+    agent_data: AgentData
+
+
+class DeltaAgentData(BaseModel):
+    """Processed agent data as the difference to the last keyframe of the user"""
+
+    # Sequence number of the keyframe the delta applies to
+    delta_of: int
+    user_id: int
+    road_state: str
+    # x, y, z
+    accelerometer: Tuple[int, int, int]
+    # latitude, longitude
+    gps: Tuple[int, int]
+    # Microseconds since the keyframe
+    timestamp: int
+    trace: Optional[Trace] = None
@@ -1,5 +1,9 @@
+import time
 from app.entities.agent_data import AgentData
 from app.entities.processed_agent_data import ProcessedAgentData
+from app.interfaces.hub_gateway import HubGateway
+from app.usecases.reduction import EdgeReducer
+from tracing import record
 
 
 def process_agent_data(
@@ -15,10 +19,32 @@ def process_agent_data(
 
     z_acceleration = agent_data.accelerometer.z
 
-    if 14000 > z_acceleration < 18000:
+    if 14000 < z_acceleration < 18000:
         road_state = "normal"
-    elif 12000 > z_acceleration < 14000 or 18000 > z_acceleration < 20000:
+    elif 12000 < z_acceleration <= 14000 or 18000 <= z_acceleration < 20000:
         road_state = "small pits"
     else:
         road_state = "large pits"
-    return ProcessedAgentData(road_state=road_state, agent_data=agent_data)
\ No newline at end of file
+    return ProcessedAgentData(road_state=road_state, agent_data=agent_data)
+
+
+def handle_agent_message(
+    payload: str, hub_gateway: HubGateway, received: int = None, reducer: EdgeReducer = None
+) -> bool:
+    """
+    Validate an agent message, process it and send the result to the hub.
+    Parameters:
+        payload (str): JSON of the agent data, as published by the agent.
+        hub_gateway (HubGateway): Hub to send the processed data to.
+        received (int): time.monotonic_ns() when the message arrived, for latency tracing.
+        reducer (EdgeReducer): Drops normal samples not worth sending, all samples are sent without it.
+    Returns:
+        bool: True if the hub accepted the processed data or the reducer dropped it.
+    """
+    agent_data = AgentData.model_validate_json(payload, strict=True)
+    record(agent_data.trace, "edge.receive", received or time.monotonic_ns())
+    processed_data = process_agent_data(agent_data)
+    if reducer is not None and not reducer.accept(processed_data):
+        return True
+    record(processed_data.agent_data.trace, "edge.send")
+    return hub_gateway.save_data(processed_data)
@@ -0,0 +1,73 @@
+from datetime import timedelta
+from typing import Dict
+from app.entities.delta_agent_data import GPS_SCALE, DeltaAgentData, KeyframeAgentData
+from app.entities.processed_agent_data import ProcessedAgentData
+from metrics import counter
+
+KEYFRAMES = counter("edge_delta_keyframes_total", "Processed data sent to the hub as a keyframe")
+DELTAS = counter("edge_delta_frames_total", "Processed data sent to the hub as a delta to the keyframe")
+PLAIN = counter("edge_delta_plain_total", "Processed data sent to the hub in full, a delta would lose precision")
+
+MICROSECOND = timedelta(microseconds=1)
+
+
+class DeltaEncoder:
+    """
+    Serializes processed data as the difference to the last keyframe of
+    the user. Every keyframe_every-th message of a user is a full keyframe,
+    so a hub that missed one (or restarted) recovers after a few messages.
+    The hub decodes the messages with its DeltaDecoder.
+    Accelerometer deltas are whole units, the agent reads integer sensor
+    values; data with fractional values is sent in full instead. GPS
+    deltas are rounded to 1e-7 degrees (about 1 cm).
+    """
+
+    def __init__(self, keyframe_every: int):
+        self.keyframe_every = keyframe_every
+        # user id -> (keyframe, messages sent since it)
+        self._keyframes: Dict[int, list] = {}
+
+    def encode(self, processed_data: ProcessedAgentData) -> str:
+        """
+        Method to serialize processed data for the hub.
+        Parameters:
+            processed_data (ProcessedAgentData): Processed data to be sent.
+        Returns:
+            str: JSON of a KeyframeAgentData or a DeltaAgentData.
+        """
+        agent_data = processed_data.agent_data
+        accelerometer = agent_data.accelerometer
+        if not all(float(value).is_integer() for value in (accelerometer.x, accelerometer.y, accelerometer.z)):
+            # The hub passes plain messages through, the keyframe stays valid
+            PLAIN.inc()
+            return processed_data.model_dump_json()
+        entry = self._keyframes.get(agent_data.user_id)
+        if entry is None or entry[1] >= self.keyframe_every:
+            keyframe = KeyframeAgentData(
+                keyframe=entry[0].keyframe + 1 if entry is not None else 0,
+                road_state=processed_data.road_state,
+                agent_data=agent_data,
+            )
+            self._keyframes[agent_data.user_id] = [keyframe, 1]
+            KEYFRAMES.inc()
+            return keyframe.model_dump_json()
+        keyframe, base = entry[0], entry[0].agent_data
+        entry[1] += 1
+        delta = DeltaAgentData(
+            delta_of=keyframe.keyframe,
+            user_id=agent_data.user_id,
+            road_state=processed_data.road_state,
+            accelerometer=(
+                round(agent_data.accelerometer.x - base.accelerometer.x),
+                round(agent_data.accelerometer.y - base.accelerometer.y),
+                round(agent_data.accelerometer.z - base.accelerometer.z),
+            ),
+            gps=(
+                round((agent_data.gps.latitude - base.gps.latitude) * GPS_SCALE),
+                round((agent_data.gps.longitude - base.gps.longitude) * GPS_SCALE),
+            ),
+            timestamp=(agent_data.timestamp - base.timestamp) // MICROSECOND,
+            trace=agent_data.trace,
+        )
+        DELTAS.inc()
+        return delta.model_dump_json(exclude_none=True)
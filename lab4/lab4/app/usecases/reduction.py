@@ -0,0 +1,57 @@
+import math
+from typing import Dict, Tuple
+from app.entities.processed_agent_data import ProcessedAgentData
+from metrics import counter
+
+FORWARDED = counter("edge_reduction_forwarded_total", "Processed samples forwarded to the hub by the reducer")
+DROPPED = counter("edge_reduction_dropped_total", "Normal samples the reducer did not forward")
+
+EARTH_RADIUS_M = 6_371_000
+
+
+def distance_m(latitude1: float, longitude1: float, latitude2: float, longitude2: float) -> float:
+    """Equirectangular approximation, accurate for the short distances between samples"""
+    x = math.radians(longitude2 - longitude1) * math.cos(math.radians((latitude1 + latitude2) / 2))
+    y = math.radians(latitude2 - latitude1)
+    return EARTH_RADIUS_M * math.hypot(x, y)
+
+
+class EdgeReducer:
+    """
+    Decides which processed samples are worth sending to the hub. Every
+    sample with a road defect is forwarded, normal samples only every
+    normal_every-th one per user, or once the vehicle moved distance_m
+    from the last forwarded sample. Samples picked for latency tracing
+    are always forwarded, so their traces stay complete.
+    """
+
+    def __init__(self, normal_every: int, distance_m: float):
+        self.normal_every = normal_every
+        self.distance_m = distance_m
+        # user id -> (latitude, longitude of the last forwarded sample, normal samples dropped since)
+        self._users: Dict[int, Tuple[float, float, int]] = {}
+
+    def accept(self, processed_data: ProcessedAgentData) -> bool:
+        """
+        Method to decide whether the processed sample is sent to the hub.
+        Parameters:
+            processed_data (ProcessedAgentData): Processed sample of a user.
+        Returns:
+            bool: True if the sample has to be forwarded.
+        """
+        agent_data = processed_data.agent_data
+        gps = agent_data.gps
+        last = self._users.get(agent_data.user_id)
+        if (
+            last is not None
+            and processed_data.road_state == "normal"
+            and agent_data.trace is None
+            and last[2] + 1 < self.normal_every
+            and distance_m(last[0], last[1], gps.latitude, gps.longitude) < self.distance_m
+        ):
+            self._users[agent_data.user_id] = (last[0], last[1], last[2] + 1)
+            DROPPED.inc()
+            return False
+        self._users[agent_data.user_id] = (gps.latitude, gps.longitude, 0)
+        FORWARDED.inc()
+        return True
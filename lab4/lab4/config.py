@@ -21,4 +21,31 @@ HUB_MQTT_TOPIC = os.environ.get("HUB_MQTT_TOPIC") or "processed_agent_data_topic
 # Configuration for the Hub
 HUB_HOST = os.environ.get("HUB_HOST") or "localhost"
 HUB_PORT = try_parse_int(os.environ.get("HUB_PORT")) or 12000
-HUB_URL = f"http://{HUB_HOST}:{HUB_PORT}"
\ No newline at end of file
+HUB_URL = f"http://{HUB_HOST}:{HUB_PORT}"
+
+# Configuration for latency tracing
+# Stages of traced samples are appended to TRACE_FILE when enabled
+TRACE_ENABLED = (os.environ.get("TRACE_ENABLED") or "false").lower() == "true"
+TRACE_FILE = os.environ.get("TRACE_FILE") or "trace.jsonl"
+
+# Configuration for metrics
+# Port of the HTTP listener serving /metrics
+METRICS_PORT = try_parse_int(os.environ.get("METRICS_PORT")) or 9100
+
+# Configuration for profiling
+# Adds handler timings and GET /debug/profile on METRICS_PORT when enabled, nothing otherwise
+PROFILING_ENABLED = (os.environ.get("PROFILING_ENABLED") or "false").lower() == "true"
+# Longest profile a request may ask for
+PROFILE_MAX_SECONDS = try_parse_int(os.environ.get("PROFILE_MAX_SECONDS")) or 60
+PROFILE_SAMPLE_INTERVAL_MS = try_parse_int(os.environ.get("PROFILE_SAMPLE_INTERVAL_MS")) or 5
+
+# Configuration for reducing the data sent to the hub
+# Samples with road defects are always sent, normal samples every REDUCTION_NORMAL_EVERY-th
+# one per user or after moving REDUCTION_DISTANCE_M metres
+REDUCTION_ENABLED = (os.environ.get("REDUCTION_ENABLED") or "false").lower() == "true"
+REDUCTION_NORMAL_EVERY = try_parse_int(os.environ.get("REDUCTION_NORMAL_EVERY")) or 10
+REDUCTION_DISTANCE_M = try_parse_int(os.environ.get("REDUCTION_DISTANCE_M")) or 100
+# Messages over MQTT are deltas to the last keyframe of the user, a full keyframe
+# is sent every DELTA_KEYFRAME_EVERY messages
+DELTA_ENCODING_ENABLED = (os.environ.get("DELTA_ENCODING_ENABLED") or "false").lower() == "true"
+DELTA_KEYFRAME_EVERY = try_parse_int(os.environ.get("DELTA_KEYFRAME_EVERY")) or 50
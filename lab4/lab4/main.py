@@ -2,6 +2,10 @@ import logging
 from app.adapters.agent_mqtt_adapter import AgentMQTTAdapter
 from app.adapters.hub_http_adapter import HubHttpAdapter
 from app.adapters.hub_mqtt_adapter import HubMqttAdapter
+from app.usecases.delta_encoding import DeltaEncoder
+from app.usecases.reduction import EdgeReducer
+from metrics import start_http_server
+from profiling import handle_profile_request
 from config import (
     MQTT_BROKER_HOST,
     MQTT_BROKER_PORT,
@@ -10,6 +14,13 @@ from config import (
     HUB_MQTT_BROKER_HOST,
     HUB_MQTT_BROKER_PORT,
     HUB_MQTT_TOPIC,
+    METRICS_PORT,
+    PROFILING_ENABLED,
+    REDUCTION_ENABLED,
+    REDUCTION_NORMAL_EVERY,
+    REDUCTION_DISTANCE_M,
+    DELTA_ENCODING_ENABLED,
+    DELTA_KEYFRAME_EVERY,
 )
 
 if __name__ == "__main__":
@@ -22,6 +33,10 @@ if __name__ == "__main__":
             logging.FileHandler("app.log"),  # Save log messages to a file
         ],
     )
+    # Counters of the edge for Prometheus, and profiles on demand if enabled
+    start_http_server(
+        METRICS_PORT, routes={"/debug/profile": handle_profile_request} if PROFILING_ENABLED else None
+    )
     # Create an instance of the StoreApiAdapter using the configuration
     # hub_adapter = HubHttpAdapter(
     #     api_base_url=HUB_URL,
@@ -30,6 +45,7 @@ if __name__ == "__main__":
         broker=HUB_MQTT_BROKER_HOST,
         port=HUB_MQTT_BROKER_PORT,
         topic=HUB_MQTT_TOPIC,
+        encoder=DeltaEncoder(DELTA_KEYFRAME_EVERY) if DELTA_ENCODING_ENABLED else None,
     )
     # Create an instance of the AgentMQTTAdapter using the configuration
     agent_adapter = AgentMQTTAdapter(
@@ -37,6 +53,7 @@ if __name__ == "__main__":
         broker_port=MQTT_BROKER_PORT,
         topic=MQTT_TOPIC,
         hub_gateway=hub_adapter,
+        reducer=EdgeReducer(REDUCTION_NORMAL_EVERY, REDUCTION_DISTANCE_M) if REDUCTION_ENABLED else None,
     )
     try:
         # Connect to the MQTT broker and start listening for messages
@@ -0,0 +1,30 @@
+import json
+import threading
+import time
+from typing import Optional
+from app.entities.trace import Trace
+from config import TRACE_ENABLED, TRACE_FILE
+
+SERVICE = "edge"
+
+_lock = threading.Lock()
+_file = None
+
+
+def record(trace: Optional[Trace], stage: str, t: Optional[int] = None):
+    """
+    Stamp the stage on the envelope of a traced sample and append the stages
+    so far to TRACE_FILE. Untraced samples have no envelope and cost nothing.
+    Stages are time.monotonic_ns(), so all services must run on one host.
+    """
+    global _file
+    if trace is None:
+        return
+    trace.stages[stage] = time.monotonic_ns() if t is None else t
+    if not TRACE_ENABLED:
+        return
+    line = json.dumps({"sample_id": trace.sample_id, "service": SERVICE, "stages": trace.stages})
+    with _lock:
+        if _file is None:
+            _file = open(TRACE_FILE, "a", buffering=1)
+        _file.write(line + "\n")
@@ -0,0 +1,104 @@
+from kivy.clock import Clock
+from kivy.properties import NumericProperty
+from kivy.uix.label import Label
+from kivy_garden.mapview import MapMarker, MarkerMapLayer
+from lineMapLayer import LineMapLayer
+
+# Screen pixels covered by one cluster cell
+CLUSTER_CELL_SIZE = 64
+
+
+class ClusterMarker(MapMarker):
+    """Marker standing for every detection in its cell, shows their count"""
+
+    count = NumericProperty(1)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.label = Label(bold=True, font_size="12sp", outline_width=2)
+        self.add_widget(self.label)
+        self.bind(pos=self._update_label, size=self._update_label, count=self._update_label)
+        self._update_label()
+
+    def _update_label(self, *args):
+        self.label.text = str(self.count) if self.count > 1 else ""
+        self.label.size = (self.width, 20)
+        self.label.pos = (self.x, self.top)
+
+
+class ClusterMapLayer(MarkerMapLayer):
+    """
+    Detections clustered on a grid of CLUSTER_CELL_SIZE screen pixels.
+    Cells are kept per zoom level and updated with every new detection,
+    only clusters in the viewport get a marker widget.
+    """
+
+    def __init__(self, source, **kwargs):
+        super().__init__(**kwargs)
+        self.source = source
+        # (x, y) in zoom independent Mercator units of every detection
+        self._points = []
+        # zoom -> {(cell x, cell y): [count, sum of lat, sum of lon]}
+        self._cells = {}
+        # Marker widgets reused between updates
+        self._pool = []
+        # Many detections in one frame cause one update
+        self._trigger_update = Clock.create_trigger(self._update_markers)
+
+    def add_point(self, point):
+        self.add_points([point])
+
+    def add_points(self, points):
+        for point in points:
+            lat, lon = point[0], point[1]
+            x, y = LineMapLayer.get_mercator_x(lon), LineMapLayer.get_mercator_y(lat)
+            self._points.append((x, y, lat, lon))
+            for zoom, cells in self._cells.items():
+                self._add_to_cell(cells, zoom, x, y, lat, lon)
+        self._trigger_update()
+
+    @staticmethod
+    def _add_to_cell(cells, zoom, x, y, lat, lon):
+        cells_per_map = pow(2.0, zoom) * 256 / CLUSTER_CELL_SIZE
+        key = (int(x * cells_per_map), int(y * cells_per_map))
+        cell = cells.get(key)
+        if cell is None:
+            cells[key] = [1, lat, lon]
+        else:
+            cell[0] += 1
+            cell[1] += lat
+            cell[2] += lon
+
+    def get_cells(self, zoom):
+        """Clusters of the zoom level, computed once when it is first shown"""
+        cells = self._cells.get(zoom)
+        if cells is None:
+            cells = self._cells[zoom] = {}
+            for x, y, lat, lon in self._points:
+                self._add_to_cell(cells, zoom, x, y, lat, lon)
+        return cells
+
+    def reposition(self):
+        if self._points:
+            self._update_markers()
+
+    def _update_markers(self, *args):
+        map_view = self.parent
+        if map_view is None:
+            return
+        bbox = map_view.get_bbox(CLUSTER_CELL_SIZE)
+        visible = []
+        for count, sum_lat, sum_lon in self.get_cells(map_view.zoom).values():
+            lat, lon = sum_lat / count, sum_lon / count
+            if bbox.collide(lat, lon):
+                visible.append((count, lat, lon))
+        while len(self._pool) < len(visible):
+            self._pool.append(ClusterMarker(source=self.source, anchor_y=0.5))
+        for marker, (count, lat, lon) in zip(self._pool, visible):
+            marker.lat, marker.lon, marker.count = lat, lon, count
+            if marker not in self.markers:
+                self.add_widget(marker)
+        for marker in self._pool[len(visible) :]:
+            if marker in self.markers:
+                self.remove_widget(marker)
+        super().reposition()
@@ -2,3 +2,33 @@ import os
 
 STORE_HOST = os.environ.get("STORE_HOST") or "localhost"
 STORE_PORT = os.environ.get("STORE_PORT") or 8000
+# Seconds to wait before reconnecting to the store
+RECONNECT_DELAY = float(os.environ.get("RECONNECT_DELAY") or 1)
+# Tile cache limit and prefetching ahead of the car
+TILE_CACHE_DIR = os.environ.get("TILE_CACHE_DIR") or "cache"
+TILE_CACHE_MAX_MB = float(os.environ.get("TILE_CACHE_MAX_MB") or 200)
+TILE_PREFETCH_DISTANCE = int(os.environ.get("TILE_PREFETCH_DISTANCE") or 3)
+TILE_PREFETCH_WORKERS = int(os.environ.get("TILE_PREFETCH_WORKERS") or 2)
+# Directory ({z}/{x}/{y}.png) or MBTiles file with tiles for offline use
+TILE_OFFLINE_PACK = os.environ.get("TILE_OFFLINE_PACK") or None
+# Points buffered between the datasource thread and the UI
+POINTS_BUFFER_SIZE = int(os.environ.get("POINTS_BUFFER_SIZE") or 20000)
+# What to do with a full buffer: "drop" oldest points or "decimate" the buffer
+POINTS_OVERFLOW_POLICY = os.environ.get("POINTS_OVERFLOW_POLICY") or "decimate"
+# Track history loaded on start
+HISTORY_DAYS = float(os.environ.get("HISTORY_DAYS") or 7)
+HISTORY_PAGE_SIZE = int(os.environ.get("HISTORY_PAGE_SIZE") or 5000)
+# Pixels between history points at the start zoom, closer ones are skipped
+HISTORY_MIN_DISTANCE = float(os.environ.get("HISTORY_MIN_DISTANCE") or 2)
+# Ids below the highest received one that may still arrive, the store's
+# ids can commit out of order
+SEEN_IDS_WINDOW = int(os.environ.get("SEEN_IDS_WINDOW") or 10000)
+# Users shown on the map, e.g. "1,2,3"
+USER_IDS = [int(user_id) for user_id in (os.environ.get("USER_IDS") or "1").split(",")]
+# Seconds without new points before a vehicle is removed from the map
+VEHICLE_IDLE_SECONDS = float(os.environ.get("VEHICLE_IDLE_SECONDS") or 600)
+# Most points drawn per frame, the rest waits for the next frames
+FRAME_MAX_POINTS = int(os.environ.get("FRAME_MAX_POINTS") or 5000)
+# Stages of traced samples are appended to TRACE_FILE when enabled
+TRACE_ENABLED = (os.environ.get("TRACE_ENABLED") or "false").lower() == "true"
+TRACE_FILE = os.environ.get("TRACE_FILE") or "trace.jsonl"
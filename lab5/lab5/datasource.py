@@ -1,81 +1,213 @@
 import asyncio
 import json
-from datetime import datetime
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional
 import websockets
 from kivy import Logger
-from pydantic import BaseModel, field_validator
-from config import STORE_HOST, STORE_PORT
-
-
-# Pydantic models
-class ProcessedAgentData(BaseModel):
-    road_state: str
-    user_id: int
-    x: float
-    y: float
-    z: float
-    latitude: float
-    longitude: float
-    timestamp: datetime
-
-    @classmethod
-    @field_validator("timestamp", mode="before")
-    def check_timestamp(cls, value):
-        if isinstance(value, datetime):
-            return value
-        try:
-            return datetime.fromisoformat(value)
-        except (TypeError, ValueError):
-            raise ValueError(
-                "Invalid timestamp format. Expected ISO 8601 format (YYYY-MM-DDTHH:MM:SSZ)."
-            )
+from tracing import record
+from config import (
+    STORE_HOST,
+    STORE_PORT,
+    RECONNECT_DELAY,
+    POINTS_BUFFER_SIZE,
+    POINTS_OVERFLOW_POLICY,
+    SEEN_IDS_WINDOW,
+)
+
+
+class SeenIds:
+    """
+    Ids of the rows of one user already on the map. The store's SERIAL ids
+    can commit out of order, so a row may arrive after rows with higher ids.
+    Ids within `window` of the highest one are kept as a set, older ids
+    count as seen.
+    """
+
+    def __init__(self, last_id: Optional[int], window: int = SEEN_IDS_WINDOW):
+        self.last_id = last_id
+        self.window = window
+        self._ids = set()
+
+    def add(self, ids: Iterable[int]):
+        ids = list(ids)
+        if not ids:
+            return
+        self._ids.update(ids)
+        last_id = max(ids)
+        self.last_id = last_id if self.last_id is None else max(self.last_id, last_id)
+        if len(self._ids) > 2 * self.window:
+            self._ids = {row_id for row_id in self._ids if row_id > self.last_id - self.window}
+
+    def __contains__(self, row_id: int) -> bool:
+        if self.last_id is None:
+            return False
+        return row_id <= self.last_id - self.window or row_id in self._ids
 
 
 class Datasource:
-    def __init__(self, user_id: int):
+    """
+    Receives processed agent data of several users from the store over one
+    WebSocket in a background thread. Frames are decoded there and their
+    points are kept in a bounded buffer until the UI takes them with
+    get_new_points.
+    """
+
+    def __init__(self, user_ids: Iterable[int]):
         self.index = 0
-        self.user_id = user_id
+        self.user_ids = list(user_ids)
         self.connection_status = None
-        self._new_points = []
-        asyncio.ensure_future(self.connect_to_server())
+        # (user_id, point, trace) in arrival order, trace is None for untraced rows
+        self._new_points = deque()
+        # Traces of the points taken by the UI since the last take_traces
+        self._taken_traces = []
+        self._lock = threading.Lock()
+        # Points removed from a full buffer
+        self.dropped = 0
+        # Id of the last received row per user, used to resume after reconnect
+        self.last_ids: Dict[int, int] = {}
+        # Rows already received per user, replayed and live rows overlap
+        self._seen: Dict[int, SeenIds] = {}
+        self._loop = None
+        self._task = None
+        self._thread = None
+
+    def start(self, last_ids: Dict[int, int] = None):
+        """Start receiving live data, rows after last_ids are replayed first"""
+        for user_id, last_id in (last_ids or {}).items():
+            self._seen.setdefault(user_id, SeenIds(last_id))
+            self.last_ids[user_id] = self._seen[user_id].last_id
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
 
-    def get_new_points(self):
-        Logger.debug(self._new_points)
-        points = self._new_points
-        self._new_points = []
+    def get_new_points(self, limit: int = None) -> Dict[int, List[tuple]]:
+        """
+        Take up to limit of the oldest received points.
+        Returns:
+            Points grouped by user id, in arrival order.
+        """
+        points: Dict[int, List[tuple]] = {}
+        with self._lock:
+            count = len(self._new_points) if limit is None else min(limit, len(self._new_points))
+            for _ in range(count):
+                user_id, point, trace = self._new_points.popleft()
+                points.setdefault(user_id, []).append(point)
+                if trace is not None:
+                    self._taken_traces.append(trace)
         return points
 
+    def take_traces(self) -> List[dict]:
+        """Traces of the points returned by get_new_points since the last call"""
+        traces, self._taken_traces = self._taken_traces, []
+        return traces
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._new_points)
+
+    def stop(self):
+        if self._loop is not None and self._task is not None:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+
+    def _run(self):
+        # Own event loop, so receiving and decoding never block the UI
+        self._loop = asyncio.new_event_loop()
+        self._task = self._loop.create_task(self.connect_to_server())
+        try:
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    def uri(self) -> str:
+        uri = f"ws://{STORE_HOST}:{STORE_PORT}/ws?user_ids={','.join(map(str, self.user_ids))}"
+        if self.last_ids:
+            # Store replays everything missed since the last row of every user;
+            # users without rows yet start from the oldest known id
+            start = min(self.last_ids.values())
+            since_ids = (self.last_ids.get(user_id, start) for user_id in self.user_ids)
+            uri += f"&since_ids={','.join(map(str, since_ids))}"
+        return uri
+
     async def connect_to_server(self):
-        uri = f"ws://{STORE_HOST}:{STORE_PORT}/ws/{self.user_id}"
         while True:
             Logger.debug("CONNECT TO SERVER")
-            async with websockets.connect(uri) as websocket:
-                self.connection_status = "Connected"
-                try:
+            try:
+                async with websockets.connect(self.uri()) as websocket:
+                    self.connection_status = "Connected"
                     while True:
                         data = await websocket.recv()
-                        parsed_data = json.loads(data)
-                        self.handle_received_data(parsed_data)
-                except websockets.ConnectionClosedOK:
-                    self.connection_status = "Disconnected"
-                    Logger.debug("SERVER DISCONNECT")
+                        try:
+                            self.handle_received_data(data)
+                        except (ValueError, KeyError, TypeError) as e:
+                            Logger.warning(f"Skipped malformed frame: {e!r}")
+            except (websockets.WebSocketException, OSError) as e:
+                # Also failed handshakes, e.g. 503 while the store restarts
+                self.connection_status = "Disconnected"
+                Logger.debug(f"SERVER DISCONNECT: {e!r}")
+                await asyncio.sleep(RECONNECT_DELAY)
 
     def handle_received_data(self, data):
-        # Update your UI or perform actions with received data here
-        Logger.debug(f"Received data: {json.loads(data)}")
-        processed_agent_data_list = sorted(
-            [
-                ProcessedAgentData(**processed_data_json)
-                for processed_data_json in json.loads(data)
-            ],
-            key=lambda v: v.timestamp,
-        )
-        new_points = [
-            (
-                processed_agent_data.longitude,
-                processed_agent_data.latitude,
-                processed_agent_data.road_state,
-            )
-            for processed_agent_data in processed_agent_data_list
-        ]
-        self._new_points.extend(new_points)
+        # Store sends one JSON list of one user's rows per frame, rows are used as plain dicts
+        received_at = time.monotonic_ns()
+        received = json.loads(data)
+        Logger.debug(f"Received {len(received)} rows")
+        if not received:
+            return
+        user_id = received[0]["user_id"]
+        # Rows replayed after a reconnect may already be on the map
+        seen = self._seen.setdefault(user_id, SeenIds(self.last_ids.get(user_id)))
+        received = [item for item in received if item["id"] not in seen]
+        if not received:
+            return
+        # ISO 8601 timestamps of the store sort as strings
+        received.sort(key=lambda item: item["timestamp"])
+        # Read every field first, a malformed frame marks nothing as seen
+        points = [(item["longitude"], item["latitude"], item["road_state"]) for item in received]
+        traces = [item.get("trace") for item in received]
+        seen.add(item["id"] for item in received)
+        self.last_ids[user_id] = seen.last_id
+        for trace in traces:
+            record(trace, "dashboard.receive", received_at)
+        self.add_points(user_id, points, traces)
+
+    def mark_seen(self, user_id: int, ids: Iterable[int]):
+        """Mark rows loaded elsewhere (e.g. the history) as on the map"""
+        seen = self._seen.setdefault(user_id, SeenIds(self.last_ids.get(user_id)))
+        seen.add(ids)
+        self.last_ids[user_id] = seen.last_id
+
+    def add_points(self, user_id: int, points: List[tuple], traces: Optional[List[dict]] = None):
+        traces = traces or [None] * len(points)
+        with self._lock:
+            self._new_points.extend((user_id, point, trace) for point, trace in zip(points, traces))
+            overflow = len(self._new_points) - POINTS_BUFFER_SIZE
+            if overflow <= 0:
+                return
+            if POINTS_OVERFLOW_POLICY == "decimate":
+                # Every other normal point is kept, the tracks keep their whole
+                # length and every pit stays on the map
+                while len(self._new_points) > POINTS_BUFFER_SIZE:
+                    last = len(self._new_points) - 1
+                    normal = 0
+                    kept = deque()
+                    for i, point in enumerate(self._new_points):
+                        if point[1][2] != "normal" or i == last:
+                            kept.append(point)
+                            continue
+                        if normal % 2 == 0:
+                            kept.append(point)
+                        normal += 1
+                    if len(kept) == len(self._new_points):
+                        # Nothing left to thin, only pits are buffered
+                        break
+                    self.dropped += len(self._new_points) - len(kept)
+                    self._new_points = kept
+            overflow = len(self._new_points) - POINTS_BUFFER_SIZE
+            if overflow > 0:
+                # Oldest points are dropped
+                for _ in range(overflow):
+                    self._new_points.popleft()
+                self.dropped += overflow
@@ -0,0 +1,92 @@
+import threading
+from datetime import datetime, timedelta
+import requests
+from kivy import Logger
+from lineMapLayer import LineMapLayer
+from config import (
+    STORE_HOST,
+    STORE_PORT,
+    POINTS_BUFFER_SIZE,
+    HISTORY_DAYS,
+    HISTORY_PAGE_SIZE,
+    HISTORY_MIN_DISTANCE,
+)
+
+
+class HistoryLoader:
+    """
+    Loads the users' tracks of the last HISTORY_DAYS from the store page by
+    page in a background thread, thins them out for the map zoom and hands
+    the points to the datasource. Live data starts after the last loaded rows,
+    so the tracks have no gaps and no duplicates.
+    """
+
+    def __init__(self, datasource, zoom: int, tile_size: float = 256):
+        self.datasource = datasource
+        self.user_ids = list(datasource.user_ids)
+        # Points closer than HISTORY_MIN_DISTANCE pixels at this zoom are skipped
+        self.min_distance = HISTORY_MIN_DISTANCE / (pow(2.0, zoom) * tile_size)
+        self.loaded = 0
+        # Id of the last loaded row per user
+        self.last_ids = {}
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def cancel(self):
+        """Stop loading, live data starts after the rows loaded so far"""
+        self._cancelled.set()
+
+    def _run(self):
+        try:
+            self._load()
+        except (requests.RequestException, ValueError) as e:
+            Logger.warning(f"History load failed: {e}")
+        finally:
+            self.datasource.start(self.last_ids)
+
+    def _load(self):
+        since = datetime.utcnow() - timedelta(days=HISTORY_DAYS)
+        with requests.Session() as session:
+            for user_id in self.user_ids:
+                if self._cancelled.is_set():
+                    break
+                self._load_user(session, user_id, since)
+        Logger.info(f"History loaded: {self.loaded} rows")
+
+    def _load_user(self, session, user_id: int, since: datetime):
+        url = f"http://{STORE_HOST}:{STORE_PORT}/processed_agent_data/"
+        last_kept = None
+        while not self._cancelled.is_set():
+            params = {"user_id": user_id, "since": since.isoformat(), "limit": HISTORY_PAGE_SIZE}
+            if user_id in self.last_ids:
+                params["after_id"] = self.last_ids[user_id]
+            response = session.get(url, params=params, timeout=10)
+            response.raise_for_status()
+            page = response.json()
+            if not page:
+                break
+            points = []
+            for item in page:
+                point = (item["longitude"], item["latitude"], item["road_state"])
+                x, y = LineMapLayer.get_mercator_x(point[1]), LineMapLayer.get_mercator_y(point[0])
+                # Pits are always kept, they are what the map is for
+                if (
+                    last_kept is None
+                    or point[2] != "normal"
+                    or abs(x - last_kept[0]) + abs(y - last_kept[1]) >= self.min_distance
+                ):
+                    points.append(point)
+                    last_kept = (x, y)
+            # Pages are loaded as fast as the map draws them, so the
+            # datasource buffer does not overflow and thin them out
+            while self.datasource.pending() > POINTS_BUFFER_SIZE // 2 and not self._cancelled.is_set():
+                self._cancelled.wait(0.05)
+            self.datasource.add_points(user_id, points)
+            self.datasource.mark_seen(user_id, [item["id"] for item in page])
+            self.loaded += len(page)
+            self.last_ids[user_id] = page[-1]["id"]
+            if len(page) < HISTORY_PAGE_SIZE:
+                break
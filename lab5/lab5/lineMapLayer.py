@@ -1,5 +1,6 @@
+from array import array
 from kivy_garden.mapview import MapLayer, MapMarker
-from kivy.graphics import Color, Line
+from kivy.graphics import Color, Line, InstructionGroup
 from kivy.graphics.context_instructions import Translate, Scale, PushMatrix, PopMatrix
 from kivy_garden.mapview.utils import clamp
 from kivy_garden.mapview.constants import (
@@ -8,7 +9,132 @@ from kivy_garden.mapview.constants import (
     MIN_LATITUDE,
     MAX_LATITUDE,
 )
-from math import radians, log, tan, cos, pi
+from math import radians, log, tan, cos, pi, inf
+
+# Line points are stored in pixels of this zoom level (with 256 px tiles),
+# other zoom levels are drawn with a scale transform
+LINE_ZOOM = 17
+LINE_SIZE = pow(2.0, LINE_ZOOM) * 256
+# Points per Line instruction, appending rebuilds only the last one
+LINE_CHUNK_SIZE = 1000
+# Screen pixels a simplified track may deviate from the real one
+SIMPLIFY_TOLERANCE = 0.5
+# Road states in drawing order, worse roads are drawn on top
+ROAD_STATES = ("normal", "small pits", "large pits")
+ROAD_STATE_CODES = {state: code for code, state in enumerate(ROAD_STATES)}
+# Colors of the track segments with pits, normal road uses the layer color
+ROAD_STATE_COLORS = {
+    "small pits": (1, 0.8, 0, 1),
+    "large pits": (1, 0, 0, 1),
+}
+
+
+def simplify(points, tolerance):
+    """Douglas-Peucker simplification of interleaved x, y points"""
+    count = len(points) // 2
+    if count < 3:
+        return list(points)
+    keep = bytearray(count)
+    keep[0] = keep[-1] = 1
+    tolerance_sq = tolerance * tolerance
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = points[first * 2], points[first * 2 + 1]
+        dx, dy = points[last * 2] - ax, points[last * 2 + 1] - ay
+        length_sq = dx * dx + dy * dy
+        index, max_distance_sq = 0, tolerance_sq
+        for i in range(first + 1, last):
+            px, py = points[i * 2] - ax, points[i * 2 + 1] - ay
+            if length_sq:
+                cross = px * dy - py * dx
+                distance_sq = cross * cross / length_sq
+            else:
+                distance_sq = px * px + py * py
+            if distance_sq > max_distance_sq:
+                index, max_distance_sq = i, distance_sq
+        if index:
+            keep[index] = 1
+            stack.append((first, index))
+            stack.append((index, last))
+    result = []
+    for i in range(count):
+        if keep[i]:
+            result.append(points[i * 2])
+            result.append(points[i * 2 + 1])
+    return result
+
+
+class TrackChunk:
+    """Up to LINE_CHUNK_SIZE consecutive track points drawn by a few Lines"""
+
+    def __init__(self, first):
+        # Indices of the points in the layer's Mercator array, the first one
+        # is shared with the previous chunk so the track has no gaps
+        self.first = first
+        self.end = first
+        # min x, min y, max x, max y in Mercator units
+        self.bbox = [inf, inf, -inf, -inf]
+        # Simplified segments per zoom level, only for full chunks
+        self.simplified = {}
+        # Color and Line instructions of the chunk, grouped by road state
+        self.group = None
+        self.state_groups = {}
+        self.lines = []
+        # Lines a growing chunk appends to
+        self.base_line = None
+        self.open_line = None
+        self.open_state = 0
+        # What the lines currently show, they are rebuilt when this changes
+        self.drawn = None
+
+    @property
+    def full(self):
+        return self.end - self.first >= LINE_CHUNK_SIZE
+
+    def extend(self, mercator, end):
+        bbox = self.bbox
+        for i in range(self.end, end):
+            x, y = mercator[i * 2], mercator[i * 2 + 1]
+            bbox[0] = min(bbox[0], x)
+            bbox[1] = min(bbox[1], y)
+            bbox[2] = max(bbox[2], x)
+            bbox[3] = max(bbox[3], y)
+        self.end = end
+
+    def intersects(self, bbox):
+        return not (
+            self.bbox[2] < bbox[0] or self.bbox[0] > bbox[2] or self.bbox[3] < bbox[1] or self.bbox[1] > bbox[3]
+        )
+
+    def segments(self, mercator, states, zoom, tolerance):
+        """
+        Line points of the zoom level grouped by road state code.
+        The whole chunk is one normal road line, runs of pits are drawn over it.
+        A segment gets the state of the point it ends at.
+        Growing chunks are not simplified.
+        """
+        if self.full and zoom in self.simplified:
+            return self.simplified[zoom]
+        raw = [value * LINE_SIZE for value in mercator[self.first * 2 : self.end * 2]]
+        def reduce(points):
+            return simplify(points, tolerance) if self.full else points
+
+        segments = {0: [reduce(raw)]}
+        run_start, run_state = None, 0
+        for i in range(self.first + 1, self.end + 1):
+            state = states[i] if i < self.end else 0
+            if state == run_state:
+                continue
+            if run_state:
+                start = (run_start - 1 - self.first) * 2
+                stop = (i - self.first) * 2
+                segments.setdefault(run_state, []).append(reduce(raw[start:stop]))
+            run_start, run_state = i, state
+        if self.full:
+            # Computed once per zoom level when it is first shown
+            self.simplified[zoom] = segments
+        return segments
 
 
 class LineMapLayer(MapLayer):
@@ -18,13 +144,25 @@ class LineMapLayer(MapLayer):
         #     coordinates = [[0, 0], [0, 0]]
         self._coordinates = coordinates
         self.color = color
-        self._line_points = None
-        self._line_points_offset = (0, 0)
+        # Projected points in zoom independent Mercator units (0..1 across the map),
+        # x and y interleaved, relative to the first point
+        self._mercator = array("d")
+        self._mercator_offset = (0, 0)
+        # Road state code of every point
+        self._states = array("B")
+        self._chunks = []
+        # Visible part of the map in Mercator units relative to the first point
+        self._viewport = None
+        self._transforms = None
+        self._pop_matrix = None
         self.zoom = 0
         self.lon = 0
         self.lat = 0
         self.ms = 0
         self._width = width
+        self.opacity = 0.5
+        if coordinates:
+            self._project(coordinates)
 
     @property
     def coordinates(self):
@@ -33,70 +171,86 @@ class LineMapLayer(MapLayer):
     @coordinates.setter
     def coordinates(self, coordinates):
         self._coordinates = coordinates
-        self.invalidate_line_points()
+        self._mercator = array("d")
+        self._mercator_offset = (0, 0)
+        self._states = array("B")
+        if coordinates:
+            self._project(coordinates)
         self.clear_and_redraw()
 
     def add_point(self, point):
+        self.add_points([point])
+
+    def add_points(self, points):
+        """Append points to the track, only the new points are projected and drawn"""
+        if not points:
+            return
         if self._coordinates is None:
             # self._coordinates = [point]
             self._coordinates = []
-        self._coordinates.append(point)
-        # self._coordinates = [self._coordinates[-1], point]
-        self.invalidate_line_points()
-        self.clear_and_redraw()
+        self._coordinates.extend(points)
+        start = len(self._mercator) // 2
+        self._project(points)
+        if self._transforms is None:
+            self.clear_and_redraw()
+        else:
+            self._append_chunks(start)
 
     @property
     def line_points(self):
-        if self._line_points is None:
-            self.calc_line_points()
-        return self._line_points
+        return [value * LINE_SIZE for value in self._mercator]
 
     @property
     def line_points_offset(self):
-        if self._line_points is None:
-            self.calc_line_points()
-        return self._line_points_offset
+        return (
+            self._mercator_offset[0] * self.ms,
+            self._mercator_offset[1] * self.ms,
+        )
 
-    def calc_line_points(self):
+    def _project(self, points):
         # Offset all points by the coordinates of the first point,
         # to keep coordinates closer to zero.
         # (and therefore avoid some float precision issues when drawing lines)
-        self._line_points_offset = (
-            self.get_x(self.coordinates[0][1]),
-            self.get_y(self.coordinates[0][0]),
-        )
-        # Since lat is not a linear transform we must compute manually
-        self._line_points = [
-            (
-                self.get_x(lon) - self._line_points_offset[0],
-                self.get_y(lat) - self._line_points_offset[1],
-            )
-            for lat, lon, _ in self.coordinates
-        ]
-
-    def invalidate_line_points(self):
-        self._line_points = None
-        self._line_points_offset = (0, 0)
+        if not self._mercator:
+            first = points[0]
+            self._mercator_offset = (self.get_mercator_x(first[1]), self.get_mercator_y(first[0]))
+        offset_x, offset_y = self._mercator_offset
+        # Since lat is not a linear transform we must compute manually,
+        # but only once per point
+        for lat, lon, road_state in points:
+            self._mercator.append(self.get_mercator_x(lon) - offset_x)
+            self._mercator.append(self.get_mercator_y(lat) - offset_y)
+            self._states.append(ROAD_STATE_CODES.get(road_state, 0))
+
+    @staticmethod
+    def get_mercator_x(lon):
+        """Get the zoom independent x position, the map is 1.0 wide"""
+        return clamp(lon, MIN_LONGITUDE, MAX_LONGITUDE) / 360.0
+
+    @staticmethod
+    def get_mercator_y(lat):
+        """Get the zoom independent y position, the map is 1.0 high"""
+        lat = radians(clamp(-lat, MIN_LATITUDE, MAX_LATITUDE))
+        return (1.0 - log(tan(lat) + 1.0 / cos(lat)) / pi) / 2.0
 
     def get_x(self, lon):
         """Get the x position on the map using this map source's projection
         (0, 0) is located at the top left.
         """
-        return clamp(lon, MIN_LONGITUDE, MAX_LONGITUDE) * self.ms / 360.0
+        return self.get_mercator_x(lon) * self.ms
 
     def get_y(self, lat):
         """Get the y position on the map using this map source's projection
         (0, 0) is located at the top left.
         """
-        lat = radians(clamp(-lat, MIN_LATITUDE, MAX_LATITUDE))
-        return (1.0 - log(tan(lat) + 1.0 / cos(lat)) / pi) * self.ms / 2.0
+        return self.get_mercator_y(lat) * self.ms
 
     # Function called when the MapView is moved
     def reposition(self):
         map_view = self.parent
 
-        # Must redraw when the zoom changes
-        # as the scatter transform resets for the new tiles
+        # The scatter transform resets for the new tiles on zoom and moves on pan,
+        # only the transform instructions change, the lines stay as they are
         if (
             self.zoom != map_view.zoom
             or self.lon != round(map_view.lon, 7)
@@ -104,20 +258,24 @@ class LineMapLayer(MapLayer):
         ):
             map_source = map_view.map_source
             self.ms = pow(2.0, map_view.zoom) * map_source.dp_tile_size
-            self.invalidate_line_points()
-            self.clear_and_redraw()
+            if self._transforms is None:
+                self.clear_and_redraw()
+            else:
+                self._update_transforms()
 
     def clear_and_redraw(self, *args):
         with self.canvas:
             # Clear old line
             self.canvas.clear()
+        self._chunks = []
+        self._transforms = None
+        self._pop_matrix = None
 
         self._draw_line()
 
-    def _draw_line(self, *args):
-        if self._coordinates is None:
-            return
+    def _update_transforms(self):
         map_view = self.parent
+        zoom_changed = self.zoom != map_view.zoom
         self.zoom = map_view.zoom
         self.lon = map_view.lon
         self.lat = map_view.lat
@@ -130,31 +288,150 @@ class LineMapLayer(MapLayer):
         # Account for map source tile size and map view zoom
         vx, vy, vs = map_view.viewport_pos[0], map_view.viewport_pos[1], map_view.scale
 
+        transforms = self._transforms
+        # Offset by the MapView's position in the window (always 0,0 ?)
+        transforms["position"].xy = map_view.pos
+        # Undo the scatter animation transform
+        transforms["scatter_scale"].xyz = (1 / ss, 1 / ss, 1)
+        transforms["scatter_position"].xy = (-sx, -sy)
+        # Apply the get window xy from transforms
+        transforms["viewport_scale"].xyz = (vs, vs, 1)
+        transforms["viewport_position"].xy = (-vx, -vy)
+        # Apply what we can factor out of the mapsource long, lat to x, y conversion
+        # and translate by the offset of the line points
+        # (this keeps the points closer to the origin)
+        offset_x, offset_y = self.line_points_offset
+        transforms["offset"].xy = (self.ms / 2 + offset_x, offset_y)
+        # Line points are in LINE_ZOOM pixels, scale them to the current zoom
+        scale = self.ms / LINE_SIZE
+        transforms["zoom_scale"].xyz = (scale, scale, 1)
+        self._viewport = self._get_viewport()
+        for chunk in self._chunks:
+            if zoom_changed:
+                # Keep the line width in screen pixels
+                for line in chunk.lines:
+                    line.width = self._line_width()
+            self._draw_chunk(chunk)
+
+    def _get_viewport(self):
+        map_view = self.parent
+        # Chunks slightly outside of the view are kept, so panning does not
+        # add and remove them all the time
+        lat1, lon1, lat2, lon2 = map_view.get_bbox(margin=max(map_view.width, map_view.height) / 2)
+        offset_x, offset_y = self._mercator_offset
+        xs = (self.get_mercator_x(lon1) - offset_x, self.get_mercator_x(lon2) - offset_x)
+        ys = (self.get_mercator_y(lat1) - offset_y, self.get_mercator_y(lat2) - offset_y)
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def _line_width(self):
+        return self._width * LINE_SIZE / self.ms if self.ms else self._width
+
+    def _draw_line(self, *args):
+        map_view = self.parent
+        if self._coordinates is None or map_view is None or not self.ms:
+            return
+
         with self.canvas:
-            self.opacity = 0.5
             # Save the current coordinate space context
             PushMatrix()
+            self._transforms = {
+                "position": Translate(),
+                "scatter_scale": Scale(),
+                "scatter_position": Translate(),
+                "viewport_scale": Scale(),
+                "viewport_position": Translate(),
+                "offset": Translate(),
+                "zoom_scale": Scale(),
+            }
+            # Retrieve the last saved coordinate space context
+            self._pop_matrix = PopMatrix()
+        self._append_chunks(0)
+        self.zoom = None
+        self._update_transforms()
 
-            # Offset by the MapView's position in the window (always 0,0 ?)
-            Translate(*map_view.pos)
-
-            # Undo the scatter animation transform
-            Scale(1 / ss, 1 / ss, 1)
-            Translate(-sx, -sy)
-
-            # Apply the get window xy from transforms
-            Scale(vs, vs, 1)
-            Translate(-vx, -vy)
+    def _append_chunks(self, start):
+        """Add points from the start index on, filling up the last chunk first"""
+        mercator = self._mercator
+        count = len(mercator) // 2
+        while start < count:
+            if not self._chunks or self._chunks[-1].full:
+                # A new chunk starts at the last point of the previous one
+                self._chunks.append(TrackChunk(max(start - 1, 0)))
+            chunk = self._chunks[-1]
+            end = min(count, chunk.first + LINE_CHUNK_SIZE)
+            chunk.extend(mercator, end)
+            self._draw_chunk(chunk)
+            start = end
 
-            # Apply what we can factor out of the mapsource long, lat to x, y conversion
-            Translate(self.ms / 2, 0)
+    def _draw_chunk(self, chunk):
+        """Show the chunk's Lines only while it is in the viewport"""
+        if self._viewport is None:
+            return
+        if not chunk.intersects(self._viewport):
+            if chunk.group is not None:
+                self.canvas.remove(chunk.group)
+                chunk.group = None
+                chunk.lines = []
+                chunk.drawn = None
+            return
+        drawn = ("zoom", self.zoom) if chunk.full else ("raw", chunk.end)
+        if chunk.group is None:
+            chunk.group = InstructionGroup()
+            self.canvas.insert(self.canvas.indexof(self._pop_matrix), chunk.group)
+        if chunk.drawn == drawn:
+            return
+        if drawn[0] == "raw" and chunk.drawn is not None and chunk.drawn[0] == "raw":
+            self._extend_chunk(chunk, chunk.drawn[1])
+        else:
+            self._rebuild_chunk(chunk)
+        chunk.drawn = drawn
 
-            # Translate by the offset of the line points
-            # (this keeps the points closer to the origin)
-            Translate(*self.line_points_offset)
+    def _new_line(self, points):
+        return Line(points=points, width=self._line_width(), force_custom_drawing_method=True)
 
-            Color(*self.color)
-            Line(points=self.line_points, width=self._width)
+    def _rebuild_chunk(self, chunk):
+        segments = chunk.segments(self._mercator, self._states, self.zoom, SIMPLIFY_TOLERANCE * LINE_SIZE / self.ms)
+        chunk.group.clear()
+        chunk.lines = []
+        chunk.state_groups = {}
+        last_lines = {}
+        for code, state in enumerate(ROAD_STATES):
+            # One Color per road state, followed by all its lines
+            state_group = InstructionGroup()
+            state_group.add(Color(*ROAD_STATE_COLORS.get(state, self.color)))
+            for points in segments.get(code, []):
+                line = self._new_line(points)
+                state_group.add(line)
+                chunk.lines.append(line)
+                last_lines[code] = line
+            chunk.group.add(state_group)
+            chunk.state_groups[code] = state_group
+        chunk.base_line = last_lines[0]
+        # Run of pits reaching the end of a growing chunk, new points extend it
+        chunk.open_state = 0 if chunk.full else self._states[chunk.end - 1]
+        chunk.open_line = last_lines.get(chunk.open_state) if chunk.open_state else None
 
-            # Retrieve the last saved coordinate space context
-            PopMatrix()
+    def _extend_chunk(self, chunk, start):
+        """Append points from the start index on to the lines of a growing chunk"""
+        mercator, states = self._mercator, self._states
+        new_points = [value * LINE_SIZE for value in mercator[start * 2 : chunk.end * 2]]
+        chunk.base_line.points = chunk.base_line.points + new_points
+        open_points = []
+        for i in range(start, chunk.end):
+            state = states[i]
+            if state != chunk.open_state:
+                if chunk.open_line is not None:
+                    chunk.open_line.points = chunk.open_line.points + open_points
+                chunk.open_line, chunk.open_state, open_points = None, state, []
+                if state:
+                    # The run starts with the segment ending at this point
+                    chunk.open_line = self._new_line(
+                        [mercator[i * 2 - 2] * LINE_SIZE, mercator[i * 2 - 1] * LINE_SIZE]
+                    )
+                    chunk.state_groups[state].add(chunk.open_line)
+                    chunk.lines.append(chunk.open_line)
+            if chunk.open_line is not None:
+                open_points.append(new_points[(i - start) * 2])
+                open_points.append(new_points[(i - start) * 2 + 1])
+        if chunk.open_line is not None:
+            chunk.open_line.points = chunk.open_line.points + open_points
@@ -1,10 +1,15 @@
 import asyncio
 from logging import Logger
 from datasource import Datasource
+from history import HistoryLoader
 from kivy.app import App
-from kivy_garden.mapview import MapMarker, MapView
+from kivy_garden.mapview import MapView
 from kivy.clock import Clock
-from lineMapLayer import LineMapLayer
+from clusterMapLayer import ClusterMapLayer
+from tileCache import TileCache, TilePack, CachedMapSource, TilePrefetcher
+from vehicles import VehicleRegistry
+from tracing import record
+from config import TILE_OFFLINE_PACK, USER_IDS, FRAME_MAX_POINTS
 
 
 class MapViewApp(App):
@@ -16,62 +21,89 @@ class MapViewApp(App):
         """
         Встановлює необхідні маркери, викликає функцію для оновлення мапи
         """
-        self.datasource = Datasource(1)
-        Clock.schedule_interval(self.update, 1)
+        self.datasource = Datasource(USER_IDS)
+        # Earlier drives are loaded in the background, then live data follows
+        self.history = HistoryLoader(self.datasource, self.map_view.zoom, self.map_view.map_source.dp_tile_size)
+        self.history.start()
+        # Points received since the last frame are drawn as one batch
+        Clock.schedule_interval(self.update, 0)
+        Clock.schedule_interval(lambda dt: self.vehicles.evict_idle(), 10)
+
+    def on_stop(self):
+        self.history.cancel()
+        self.datasource.stop()
+        self.tile_prefetcher.stop()
+        self.tile_cache.save()
 
     def update(self, *args):
         """
         Викликається регулярно для оновлення мапи
         """
         # Logger.debug("Get new points")
-        points = self.datasource.get_new_points()
-        if len(points) == 0:
+        # Work per frame is bounded however many cars send data
+        points_by_user = self.datasource.get_new_points(FRAME_MAX_POINTS)
+        if not points_by_user:
             return
-        for point in points:
-            print(point)
-            self.map_layer.add_point(point)
-        self.update_car_marker(points[-1])
+        for user_id, points in points_by_user.items():
+            # All points of the batch are drawn at once
+            self.vehicles.get(user_id).add_points(points)
+            for point in points:
+                if point[2] == "large pits":
+                    self.set_pothole_marker(point)
+                elif point[2] == "small pits":
+                    self.set_bump_marker(point)
+            if user_id == USER_IDS[0]:
+                self.update_car_marker(points[-1])
+        self.vehicles.reposition_markers()
+        for trace in self.datasource.take_traces():
+            record(trace, "dashboard.render")
 
     def update_car_marker(self, point):
         """
         Оновлює відображення маркера машини на мапі
         :param point: GPS координати
         """
-        self.map_view.remove_marker(self.car_marker)
-        self.car_marker.lat = point[0]
-        self.car_marker.lon = point[1]
-        self.map_view.add_marker(self.car_marker)
+        # Markers of all cars are moved by the vehicles, tiles are
+        # loaded ahead of the first car before the map gets there
+        self.tile_prefetcher.update(point, self.map_view.zoom)
 
     def set_pothole_marker(self, point):
         """
         Встановлює маркер для ями
         :param point: GPS координати
         """
+        self.pothole_layer.add_point(point)
 
     def set_bump_marker(self, point):
         """
         Встановлює маркер для лежачого поліцейського
         :param point: GPS координати
         """
+        self.bump_layer.add_point(point)
 
     def build(self):
         """
         Ініціалізує мапу MapView(zoom, lat, lon)
         :return: мапу
         """
-        self.map_layer = LineMapLayer()
+        # Bounded tile cache, tiles come from the offline pack when it is set
+        self.tile_cache = TileCache()
+        tile_pack = TilePack(TILE_OFFLINE_PACK) if TILE_OFFLINE_PACK else None
+        map_source = CachedMapSource(self.tile_cache, tile_pack)
+        self.tile_prefetcher = TilePrefetcher(map_source)
         self.map_view = MapView(
             zoom=15,
             lat=50.4501,
             lon=30.5234,
+            map_source=map_source,
         )
-        self.map_view.add_layer(self.map_layer, mode="scatter")
-        self.car_marker = MapMarker(
-            lat=50.45034509664691,
-            lon=30.5246114730835,
-            source="images/car.png",
-        )
-        self.map_view.add_marker(self.car_marker)
+        # Detections are clustered, so thousands of them are a few markers
+        self.pothole_layer = ClusterMapLayer(source="images/pothole.png")
+        self.bump_layer = ClusterMapLayer(source="images/bump.png")
+        self.map_view.add_layer(self.pothole_layer, mode="window")
+        self.map_view.add_layer(self.bump_layer, mode="window")
+        # Track layer and car marker of every user, created on its first points
+        self.vehicles = VehicleRegistry(self.map_view)
         return self.map_view
 
 
@@ -0,0 +1,275 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from math import atan2, cos, sin
+from random import choice
+import requests
+from kivy import Logger
+from kivy_garden.mapview import MapSource
+from kivy_garden.mapview.downloader import Downloader, USER_AGENT
+from lineMapLayer import LineMapLayer
+from config import (
+    TILE_CACHE_DIR,
+    TILE_CACHE_MAX_MB,
+    TILE_PREFETCH_DISTANCE,
+    TILE_PREFETCH_WORKERS,
+)
+
+# Index of the cached tiles, kept next to them
+INDEX_FILE = "index.json"
+# Index changes written at once
+INDEX_SAVE_EVERY = 50
+
+
+class TileCache:
+    """
+    Tile files in a directory, limited to max_bytes.
+    An index file keeps size and last access of every tile, the least
+    recently used tiles are deleted when the cache is over the limit.
+    """
+
+    def __init__(self, directory: str = TILE_CACHE_DIR, max_bytes: int = TILE_CACHE_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # file name -> [size, last access]
+        self._entries = {}
+        self._size = 0
+        self._changes = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self):
+        try:
+            with open(self.path(INDEX_FILE)) as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            entries = {}
+        # Files are the source of truth, the index may be stale or missing
+        for name in os.listdir(self.directory):
+            if name == INDEX_FILE or name.endswith(".tmp"):
+                continue
+            entry = entries.get(name)
+            if entry is None:
+                stat = os.stat(self.path(name))
+                entry = [stat.st_size, stat.st_mtime]
+            self._entries[name] = entry
+            self._size += entry[0]
+        self._evict()
+
+    def contains(self, name: str) -> bool:
+        """Check for the tile and mark it as recently used"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                return False
+            # Not counted as a change, lookups run on the UI thread. Access
+            # times are written with the next change or on save()
+            entry[1] = time.time()
+            return True
+
+    def put(self, name: str, data: bytes):
+        # Readers never see half a tile
+        path = self.path(name)
+        with open(path + ".tmp", "wb") as file:
+            file.write(data)
+        os.replace(path + ".tmp", path)
+        with self._lock:
+            previous = self._entries.get(name)
+            if previous is not None:
+                self._size -= previous[0]
+            self._entries[name] = [len(data), time.time()]
+            self._size += len(data)
+            self._evict()
+            self._changed()
+
+    def _evict(self):
+        if self._size <= self.max_bytes:
+            return
+        for name, (size, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(self.path(name))
+            except OSError:
+                pass
+            del self._entries[name]
+            self._size -= size
+        self._changed()
+
+    def _changed(self):
+        self._changes += 1
+        if self._changes >= INDEX_SAVE_EVERY:
+            self._save()
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        path = self.path(INDEX_FILE)
+        with open(path + ".tmp", "w") as file:
+            json.dump(self._entries, file)
+        os.replace(path + ".tmp", path)
+        self._changes = 0
+
+
+class TilePack:
+    """
+    Pre-seeded tiles for offline use: a directory in {z}/{x}/{y}.png layout
+    or an MBTiles file.
+    """
+
+    def __init__(self, location: str):
+        self.location = location
+        self._connection = None
+        if os.path.isfile(location):
+            self._connection = sqlite3.connect(location, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def get(self, zoom: int, x: int, y: int, row_count: int):
+        """
+        Get the tile data, y is counted from the bottom like in mapview.
+        Returns:
+            Path of the tile file, or its bytes, or None if there is no such tile.
+        """
+        if self._connection is None:
+            # Directory packs count y from the top
+            path = os.path.join(self.location, str(zoom), str(x), f"{row_count - y - 1}.png")
+            return path if os.path.exists(path) else None
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (zoom, x, y),
+            ).fetchone()
+        return row[0] if row else None
+
+
+class CachedMapSource(MapSource):
+    """Map source loading tiles through the bounded cache or an offline tile pack"""
+
+    def __init__(self, cache: TileCache, pack: TilePack = None, **kwargs):
+        kwargs.setdefault("cache_dir", cache.directory)
+        super().__init__(**kwargs)
+        self.cache = cache
+        self.pack = pack
+
+    def tile_name(self, zoom: int, x: int, y: int) -> str:
+        return self.cache_fmt.format(
+            cache_key=self.cache_key, zoom=zoom, tile_x=x, tile_y=y, image_ext=self.image_ext
+        )
+
+    def tile_url(self, zoom: int, x: int, y: int) -> str:
+        return self.url.format(z=zoom, x=x, y=self.get_row_count(zoom) - y - 1, s=choice(self.subdomains))
+
+    def fill_tile(self, tile):
+        if tile.state == "done":
+            return
+        name = self.tile_name(tile.zoom, tile.tile_x, tile.tile_y)
+        if self.cache.contains(name):
+            tile.set_source(self.cache.path(name))
+            return
+        # Results are handed to the tile on the UI thread by the downloader
+        Downloader.instance(cache_dir=self.cache_dir).submit(self._load_tile, tile, name)
+
+    def _load_tile(self, tile, name):
+        if tile.state == "done":
+            return
+        path = self.load(tile.zoom, tile.tile_x, tile.tile_y, name)
+        if path is not None:
+            return tile.set_source, (path,)
+
+    def load(self, zoom: int, x: int, y: int, name: str = None):
+        """
+        Get the tile into the cache, from the pack when offline or from the network.
+        Returns:
+            Path of the tile file, or None if it is not available.
+        """
+        name = name or self.tile_name(zoom, x, y)
+        if self.cache.contains(name):
+            return self.cache.path(name)
+        if self.pack is not None:
+            tile = self.pack.get(zoom, x, y, self.get_row_count(zoom))
+            if isinstance(tile, str):
+                return tile
+            if tile is not None:
+                self.cache.put(name, tile)
+                return self.cache.path(name)
+            return None
+        try:
+            response = requests.get(self.tile_url(zoom, x, y), headers={"User-agent": USER_AGENT}, timeout=5)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            Logger.warning(f"Tile download failed: {e}")
+            return None
+        self.cache.put(name, response.content)
+        return self.cache.path(name)
+
+
+class TilePrefetcher:
+    """
+    Loads tiles ahead of the car in background threads: along its recent
+    heading at the current zoom, and around it at the next zoom level.
+    """
+
+    def __init__(self, map_source: CachedMapSource, distance: int = TILE_PREFETCH_DISTANCE):
+        self.map_source = map_source
+        self.distance = distance
+        self.executor = ThreadPoolExecutor(max_workers=TILE_PREFETCH_WORKERS)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._last = None
+
+    def update(self, point, zoom: int):
+        """
+        Method to prefetch tiles for the new car position.
+        Parameters:
+            point: (lat, lon, ...) of the car, like the track points.
+            zoom (int): Current map zoom.
+        """
+        x = LineMapLayer.get_mercator_x(point[1]) + 0.5
+        y = LineMapLayer.get_mercator_y(point[0])
+        last, self._last = self._last, (x, y)
+        tiles = set()
+        count = self.map_source.get_row_count(zoom)
+        if last is not None and (x, y) != last:
+            heading = atan2(y - last[1], x - last[0])
+            for step in range(1, self.distance + 1):
+                ahead_x = x + cos(heading) * step / count
+                ahead_y = y + sin(heading) * step / count
+                tiles.add((zoom, int(ahead_x * count), int(ahead_y * count)))
+        if zoom < self.map_source.get_max_zoom():
+            # Four tiles of the next zoom level cover the current one
+            next_x, next_y = int(x * count) * 2, int(y * count) * 2
+            for dx in (0, 1):
+                for dy in (0, 1):
+                    tiles.add((zoom + 1, next_x + dx, next_y + dy))
+        for tile in tiles:
+            self._submit(*tile)
+
+    def _submit(self, zoom: int, x: int, y: int):
+        count = self.map_source.get_row_count(zoom)
+        if not (0 <= x < count and 0 <= y < count):
+            return
+        name = self.map_source.tile_name(zoom, x, y)
+        with self._lock:
+            if name in self._pending:
+                return
+            self._pending.add(name)
+        self.executor.submit(self._load, zoom, x, y, name)
+
+    def _load(self, zoom: int, x: int, y: int, name: str):
+        try:
+            self.map_source.load(zoom, x, y, name)
+        finally:
+            with self._lock:
+                self._pending.discard(name)
+
+    def stop(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,29 @@
+import json
+import threading
+import time
+from typing import Optional
+from config import TRACE_ENABLED, TRACE_FILE
+
+SERVICE = "dashboard"
+
+_lock = threading.Lock()
+_file = None
+
+
+def record(trace: Optional[dict], stage: str, t: Optional[int] = None):
+    """
+    Stamp the stage on the envelope of a traced row ({"sample_id", "stages"})
+    and append the stages so far to TRACE_FILE.
+    Stages are time.monotonic_ns(), so all services must run on one host.
+    """
+    global _file
+    if trace is None:
+        return
+    trace["stages"][stage] = time.monotonic_ns() if t is None else t
+    if not TRACE_ENABLED:
+        return
+    line = json.dumps({"sample_id": trace["sample_id"], "service": SERVICE, "stages": trace["stages"]})
+    with _lock:
+        if _file is None:
+            _file = open(TRACE_FILE, "a", buffering=1)
+        _file.write(line + "\n")
@@ -0,0 +1,66 @@
+import time
+from typing import Dict
+from kivy_garden.mapview import MapMarker, MarkerMapLayer
+from lineMapLayer import LineMapLayer
+from config import VEHICLE_IDLE_SECONDS
+
+# Track colors of the vehicles, picked by user id
+TRACK_COLORS = (
+    (0, 0, 1, 1),
+    (0, 0.6, 0, 1),
+    (0.6, 0, 0.8, 1),
+    (0, 0.6, 0.8, 1),
+    (0.5, 0.3, 0, 1),
+)
+
+
+class Vehicle:
+    """Track layer and marker of one user, created when its first points arrive"""
+
+    def __init__(self, user_id: int, map_view, car_layer: MarkerMapLayer):
+        self.user_id = user_id
+        self.last_seen = time.monotonic()
+        self.layer = LineMapLayer(color=list(TRACK_COLORS[user_id % len(TRACK_COLORS)]))
+        map_view.add_layer(self.layer, mode="scatter")
+        self.marker = MapMarker(source="images/car.png")
+        car_layer.add_widget(self.marker)
+
+    def add_points(self, points):
+        self.last_seen = time.monotonic()
+        self.layer.add_points(points)
+        self.marker.lat = points[-1][0]
+        self.marker.lon = points[-1][1]
+
+    def remove(self, map_view, car_layer: MarkerMapLayer):
+        map_view.remove_layer(self.layer)
+        car_layer.remove_widget(self.marker)
+
+
+class VehicleRegistry:
+    """
+    Vehicles on the map by user id. Vehicles without new points for
+    VEHICLE_IDLE_SECONDS are removed with their tracks.
+    """
+
+    def __init__(self, map_view):
+        self.map_view = map_view
+        # One layer for all car markers, positioned once per frame
+        self.car_layer = MarkerMapLayer()
+        map_view.add_layer(self.car_layer, mode="window")
+        self.vehicles: Dict[int, Vehicle] = {}
+
+    def get(self, user_id: int) -> Vehicle:
+        vehicle = self.vehicles.get(user_id)
+        if vehicle is None:
+            vehicle = self.vehicles[user_id] = Vehicle(user_id, self.map_view, self.car_layer)
+        return vehicle
+
+    def reposition_markers(self):
+        self.car_layer.reposition()
+
+    def evict_idle(self):
+        now = time.monotonic()
+        for user_id, vehicle in list(self.vehicles.items()):
+            if now - vehicle.last_seen > VEHICLE_IDLE_SECONDS:
+                vehicle.remove(self.map_view, self.car_layer)
+                del self.vehicles[user_id]